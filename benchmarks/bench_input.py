@@ -0,0 +1,146 @@
+"""Key-to-redraw latency under NMEA burst
+
+Feeds `DeviceManagerImpl` with synthetic NMEA at 16000 lines/s, arriving in
+bursts (as it does after USB reconnect, when the whole buffer is read at
+once, or when a log is replayed at full speed), published to several
+streams. Meanwhile another thread "presses keys" at random times, writing
+them to a pipe, watched by urwid asyncio event loop, the same way terminal
+input is. Reports latency from writing
+the key until urwid runs its redraw callback for:
+
+* unlimited ingest (the device reader never yields within the burst);
+* ingest budget (device reader yields after a slice of messages);
+* ingest budget with input-first prioritisation (`notify_input()`).
+
+Run with:
+
+    python benchmarks/bench_input.py
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import urwid
+
+from ovshell import api, device
+from ovshell.device import DeviceManagerImpl, format_nmea
+
+SENTENCES = [
+    "GPRMC,121931.00,A,4801.86153,N,01056.69289,E,53.587,8.64,270520,,,A",
+    "GPGGA,121931.00,4801.86153,N,01056.69289,E,1,08,1.01,822.7,M,47.0,M,,",
+    "POV,E,-1.79,P,822.70,Q,439.81",
+    "PGRMZ,2699,f,3",
+    "PFLAU,3,1,2,1,0,,0,,",
+]
+LINE_RATE = 16000
+BURST_INTERVAL = 0.5
+# Key presses come at random, on average this often
+KEY_INTERVAL = 0.01
+DURATION = 5.0
+# Streams, each message is published to (e.g. NMEA server clients)
+STREAMS = 4
+
+
+class BurstDevice(api.Device):
+    """Device, that delivers all lines, accumulated since last read at once"""
+
+    def __init__(self) -> None:
+        self.id = "burst"
+        self.name = "Burst"
+        lines = [format_nmea(s).encode() + b"\r\n" for s in SENTENCES]
+        count = int(LINE_RATE * BURST_INTERVAL)
+        self._burst = [lines[n % len(lines)] for n in range(count)]
+
+    async def readlines(self) -> list[bytes]:
+        await asyncio.sleep(BURST_INTERVAL)
+        return list(self._burst)
+
+    async def readline(self) -> bytes:
+        raise NotImplementedError()
+
+    def write(self, data: bytes) -> None:
+        pass
+
+
+async def consume(devman: DeviceManagerImpl) -> None:
+    with devman.open_nmea(maxsize=LINE_RATE, trace_latency=True) as stream:
+        async for batch in stream.batches():
+            for nmea in batch:
+                nmea.fields
+
+
+async def run(evl: urwid.AsyncioEventLoop, input_first: bool) -> api.LatencyHistogram:
+    devman = DeviceManagerImpl()
+    latency = api.LatencyHistogram()
+    rfd, wfd = os.pipe()
+    sent: deque[float] = deque()
+    handled: list[float] = []
+
+    def on_input() -> None:
+        os.read(rfd, 4096)
+        if input_first:
+            devman.notify_input()
+        while sent:
+            handled.append(sent.popleft())
+
+    def on_redraw() -> None:
+        now = time.monotonic()
+        for started in handled:
+            latency.record(now - started)
+        handled.clear()
+
+    def type_keys() -> None:
+        # Keys are typed from outside of the event loop, like on a terminal
+        deadline = time.monotonic() + DURATION
+        while time.monotonic() < deadline:
+            time.sleep(random.uniform(0, 2 * KEY_INTERVAL))
+            sent.append(time.monotonic())
+            os.write(wfd, b"k")
+
+    evl.watch_file(rfd, on_input)
+    idle = evl.enter_idle(on_redraw)
+    consumers = [asyncio.create_task(consume(devman)) for _ in range(STREAMS)]
+    devman.register(BurstDevice())
+    await asyncio.get_running_loop().run_in_executor(None, type_keys)
+
+    for consumer in consumers:
+        consumer.cancel()
+    for task in devman._handlers.values():
+        task.cancel()
+    await asyncio.sleep(0)
+    evl.remove_enter_idle(idle)
+    evl.remove_watch_file(rfd)
+    os.close(rfd)
+    os.close(wfd)
+    return latency
+
+
+def main() -> None:
+    loop = asyncio.new_event_loop()
+    evl = urwid.AsyncioEventLoop(loop=loop)
+    unlimited = 1_000_000_000
+    modes = [
+        ("unlimited", unlimited, unlimited, False),
+        ("budget", device.INGEST_BUDGET_MESSAGES, device.INGEST_BUDGET_TIME, False),
+        (
+            "budget+input",
+            device.INGEST_BUDGET_MESSAGES,
+            device.INGEST_BUDGET_TIME,
+            True,
+        ),
+    ]
+    print(f"{LINE_RATE} lines/s in bursts every {BURST_INTERVAL}s, {DURATION}s")
+    for name, messages, budget_time, input_first in modes:
+        device.INGEST_BUDGET_MESSAGES = messages
+        device.INGEST_BUDGET_TIME = budget_time
+        latency = loop.run_until_complete(run(evl, input_first))
+        print(f"{name:<14} {latency}, max {latency.max * 1000:.1f}ms")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
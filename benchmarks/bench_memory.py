@@ -0,0 +1,121 @@
+"""Memory benchmark for queued NMEA messages
+
+Measures how many bytes each message occupies while it waits in the
+`open_nmea()` stream queues. Queues are filled up to their capacity of 100
+messages, and results are compared to the original dataclass-based NMEA
+message with eagerly split fields.
+
+Run with:
+
+    python benchmarks/bench_memory.py
+"""
+
+import asyncio
+import os
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+from typing import Sequence
+
+from ovshell import api
+from ovshell.device import DeviceManagerImpl, parse_nmea
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(
+    HERE, "..", "tests", "ovshell_core_tests", "samples", "sample.nmea"
+)
+QUEUE_SIZE = 100
+STREAMS = [1, 5, 20]
+
+
+@dataclass
+class LegacyNMEA:
+    device_id: str
+    raw_message: str
+    datatype: str
+    fields: Sequence[str]
+
+
+def legacy_parse_nmea(device_id: str, message: bytes) -> LegacyNMEA:
+    strmsg = message.decode().strip()
+    msg, chksum = strmsg.rsplit("*", 1)
+    parts = msg.split(",")
+    return LegacyNMEA(device_id, strmsg, parts[0][1:], parts[1:])
+
+
+class BenchDevice(api.Device):
+    id = "bench"
+    name = "Bench"
+
+    async def readline(self) -> bytes:
+        raise OSError()
+
+    def write(self, data: bytes) -> None:
+        pass
+
+
+def load_lines() -> list[bytes]:
+    # Each line is a separate object, as if it was read from the device.
+    with open(SAMPLE, "rb") as f:
+        lines = f.readlines()
+    return [bytes(bytearray(lines[n % len(lines)])) for n in range(QUEUE_SIZE)]
+
+
+def measure_legacy(nstreams: int) -> float:
+    queues: list[deque[LegacyNMEA]] = [deque() for _ in range(nstreams)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    lines = load_lines()
+    for line in lines:
+        nmea = legacy_parse_nmea("bench", line)
+        for q in queues:
+            q.append(nmea)
+    del lines, line
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / QUEUE_SIZE
+
+
+def measure_current(nstreams: int, readfields: bool) -> float:
+    async def run() -> float:
+        devman = DeviceManagerImpl()
+        dev = BenchDevice()
+        streams = [devman.open_nmea() for _ in range(nstreams)]
+        for s in streams:
+            s.__enter__()
+        # Warm up internal caches
+        for line in load_lines()[:2]:
+            parse_nmea(dev.id, line).fields
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        lines = load_lines()
+        for line in lines:
+            devman._publish(dev, line)
+        if readfields:
+            stream = next(iter(devman._subscribers[None]))
+            for nmea in stream._queue._queue:  # type: ignore
+                nmea.fields
+        del lines, line
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        for s in streams:
+            s.__exit__(None, None, None)
+        return (after - before) / QUEUE_SIZE
+
+    return asyncio.run(run())
+
+
+def main() -> None:
+    print(f"bytes per queued message ({QUEUE_SIZE}-message queues)")
+    print(f"{'streams':>8} {'legacy':>10} {'lazy':>10} {'lazy+fields':>12}")
+    for n in STREAMS:
+        legacy = measure_legacy(n)
+        lazy = measure_current(n, readfields=False)
+        lazyfields = measure_current(n, readfields=True)
+        print(f"{n:>8} {legacy:>10.0f} {lazy:>10.0f} {lazyfields:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
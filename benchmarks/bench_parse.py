@@ -0,0 +1,87 @@
+"""Micro-benchmark for NMEA parser
+
+Compares `ovshell.device.parse_nmea()` with the original str-based
+implementation on the `sample.nmea` test fixture, scaled up.
+
+Run with:
+
+    python benchmarks/bench_parse.py
+"""
+
+import os
+import timeit
+
+from ovshell import api
+from ovshell.device import parse_nmea
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(
+    HERE, "..", "tests", "ovshell_core_tests", "samples", "sample.nmea"
+)
+SCALE = 5000
+REPEAT = 20
+
+
+def legacy_parse_nmea(device_id: str, message: bytes) -> api.NMEA:
+    strmsg = message.decode().strip()
+    if not legacy_is_nmea_valid(strmsg):
+        raise ValueError()
+
+    msg, chksum = strmsg.rsplit("*", 1)
+    parts = msg.split(",")
+    datatype = parts[0][1:]
+
+    return api.NMEA(
+        device_id=device_id, raw_message=strmsg, datatype=datatype, fields=parts[1:]
+    )
+
+
+def legacy_is_nmea_valid(nmea_msg: str) -> bool:
+    if not nmea_msg.startswith("$"):
+        return False
+    parts = nmea_msg.rsplit("*", 1)
+    if len(parts) != 2:
+        return False
+    body, chksum = parts
+    chk = 0
+    for c in body[1:]:
+        chk ^= ord(c)
+    return f"{chk:2X}" == chksum
+
+
+def load_lines() -> list[bytes]:
+    with open(SAMPLE, "rb") as f:
+        lines = f.readlines()
+    return lines * SCALE
+
+
+def bench(name: str, fn, lines: list[bytes]) -> float:
+    def run() -> None:
+        for line in lines:
+            fn(line)
+
+    best = min(timeit.repeat(run, number=1, repeat=REPEAT))
+    usec = best / len(lines) * 1e6
+    print(f"{name:<32} {usec:6.2f} us/msg {len(lines) / best:10.0f} msg/s")
+    return usec
+
+
+def main() -> None:
+    lines = load_lines()
+    print(f"{len(lines)} messages, best of {REPEAT}")
+
+    old = bench("legacy parse", lambda ln: legacy_parse_nmea("sim", ln), lines)
+    new = bench("parse", lambda ln: parse_nmea("sim", ln), lines)
+    oldf = bench(
+        "legacy parse + fields",
+        lambda ln: legacy_parse_nmea("sim", ln).fields[0],
+        lines,
+    )
+    newf = bench("parse + fields", lambda ln: parse_nmea("sim", ln).fields[0], lines)
+
+    print(f"speedup (datatype only): {old / new:.2f}x")
+    print(f"speedup (fields read):   {oldf / newf:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""End-to-end serial ingest benchmark
+
+Streams recorded NMEA through simulated pseudo-terminal (the same one
+`OVSHELL_CORE_SIMULATE_PTY` sets up), opens it with baud rate detection and
+reads it through `DeviceManagerImpl`, measuring throughput, event loop CPU
+time per line and latency from reading the line to consumer at different
+line rates. Each rate is run with the port read on the event loop and by
+`IngestThread`.
+
+Run with:
+
+    python benchmarks/bench_pty.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from ovshell import api
+from ovshell.device import DeviceManagerImpl
+from ovshell_core import devsim
+from ovshell_core.serial import IngestThread, SerialDeviceImpl, ThreadedSerialDevice
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(
+    HERE, "..", "tests", "ovshell_core_tests", "samples", "sample.nmea"
+)
+# Bytes per second: 9600, 115200 and 921600 baud with 8N1 encoding
+RATES = [960, 11520, 92160]
+DURATION = 3.0
+
+
+async def run(
+    rate: int, threaded: bool
+) -> tuple[int, float, int, api.LatencyHistogram]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pty = devsim.SimulatedPty(SAMPLE, os.path.join(tmpdir, "ttyS1"), rate)
+        pty.open()
+        feeder = asyncio.create_task(pty.run())
+
+        dev: api.Device = await SerialDeviceImpl.open(pty.link_path)
+        ingest = None
+        if threaded:
+            assert isinstance(dev, SerialDeviceImpl)
+            dev._writer.close()
+            ingest = IngestThread()
+            ingest.start()
+            dev = ThreadedSerialDevice.open(pty.link_path, dev.baudrate, ingest)
+        devman = DeviceManagerImpl(trace_latency=True)
+        count = 0
+        with devman.open_nmea() as stream:
+            devman.register(dev)
+            # Skip the warm-up
+            await stream.read()
+            latency = stream.stats.latency = api.LatencyHistogram()
+            cpu_started = time.thread_time()
+            deadline = time.monotonic() + DURATION
+            while time.monotonic() < deadline:
+                batch = await stream.read_batch(max_latency=0.1)
+                count += len(batch)
+            cpu = time.thread_time() - cpu_started
+
+        feeder.cancel()
+        if ingest is not None:
+            ingest.stop()
+        else:
+            assert isinstance(dev, SerialDeviceImpl)
+            dev._writer.close()
+        pty.close()
+        return count, cpu, pty.dropped, latency
+
+
+def main() -> None:
+    print(f"{DURATION}s per run")
+    for rate in RATES:
+        for threaded in (False, True):
+            report(rate, threaded, *asyncio.run(run(rate, threaded)))
+
+
+def report(
+    rate: int,
+    threaded: bool,
+    count: int,
+    cpu: float,
+    dropped: int,
+    latency: api.LatencyHistogram,
+) -> None:
+    mode = "thread" if threaded else "loop"
+    print(
+        f"{rate:6} B/s {mode:>6}: {count / DURATION:8.0f} lines/s "
+        f"{cpu / max(count, 1) * 1e6:8.1f} us loop CPU/line "
+        f"{dropped:8} bytes dropped"
+    )
+    print(f"{'':14}  latency {latency}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Serial ingest benchmark
+
+Streams NMEA into a pseudo-terminal at 115200 baud and measures event loop
+CPU time spent per line, when serial device is read line by line (with
+`readline()`) and in chunks (with `readlines()`).
+
+Run with:
+
+    python benchmarks/bench_serial.py
+"""
+
+import asyncio
+import os
+import threading
+import time
+import tty
+
+from serial_asyncio import open_serial_connection
+
+from ovshell import api
+from ovshell.device import DeviceManagerImpl
+from ovshell_core.serial import SerialDeviceImpl
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(
+    HERE, "..", "tests", "ovshell_core_tests", "samples", "sample.nmea"
+)
+BAUDRATE = 115200
+# 8N1 encoding takes 10 bits per byte
+BYTES_PER_SEC = BAUDRATE // 10
+# Size of portions data arrives in. Small portions correspond to idle
+# system, large ones to data piling up in the kernel while the event loop is
+# busy with something else.
+WRITE_CHUNKS = [64, 1024]
+DURATION = 3.0
+
+
+class LineByLineDevice(api.Device):
+    """Serial device, that hides its `readlines()` method"""
+
+    def __init__(self, dev: SerialDeviceImpl) -> None:
+        self.id = dev.id
+        self.name = dev.name
+        self._dev = dev
+
+    async def readline(self) -> bytes:
+        return await self._dev.readline()
+
+    def write(self, data: bytes) -> None:
+        self._dev.write(data)
+
+
+def feed(master: int, chunksize: int, stop: threading.Event) -> None:
+    with open(SAMPLE, "rb") as f:
+        sample = f.read()
+    data = sample * (BYTES_PER_SEC * int(DURATION + 1) // len(sample) + 1)
+    interval = chunksize / BYTES_PER_SEC
+    started = time.monotonic()
+    pos = 0
+    while not stop.is_set() and pos < len(data):
+        os.write(master, data[pos : pos + chunksize])
+        pos += chunksize
+        delay = started + pos / BYTES_PER_SEC - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, interval))
+
+
+async def run(chunked: bool, chunksize: int) -> tuple[int, float]:
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    stop = threading.Event()
+    feeder = threading.Thread(target=feed, args=(master, chunksize, stop))
+    feeder.start()
+
+    reader, writer = await open_serial_connection(
+        url=os.ttyname(slave), baudrate=BAUDRATE
+    )
+    serialdev = SerialDeviceImpl(os.ttyname(slave), reader, writer, BAUDRATE)
+    dev: api.Device = serialdev if chunked else LineByLineDevice(serialdev)
+
+    devman = DeviceManagerImpl()
+    count = 0
+    with devman.open_nmea() as stream:
+        devman.register(dev)
+        # Skip the warm-up
+        await stream.read()
+        cpu_started = time.thread_time()
+        deadline = time.monotonic() + DURATION
+        while time.monotonic() < deadline:
+            batch = await stream.read_batch()
+            count += len(batch)
+        cpu = time.thread_time() - cpu_started
+
+    stop.set()
+    feeder.join()
+    writer.close()
+    os.close(master)
+    os.close(slave)
+    return count, cpu
+
+
+def main() -> None:
+    print(f"{BAUDRATE} baud, {DURATION}s per run")
+    for chunksize in WRITE_CHUNKS:
+        results = {}
+        for chunked in (False, True):
+            name = "readlines" if chunked else "readline"
+            count, cpu = asyncio.run(run(chunked, chunksize))
+            results[name] = cpu / count * 1e6
+            print(
+                f"{chunksize:5} byte chunks: {name:<10} {count:6} lines "
+                f"{results[name]:8.1f} us CPU/line"
+            )
+        ratio = results["readline"] / results["readlines"]
+        print(f"{chunksize:5} byte chunks: readline/readlines {ratio:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
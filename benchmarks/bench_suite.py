@@ -0,0 +1,275 @@
+"""NMEA pipeline benchmark suite
+
+Runs the hot path of NMEA processing on in-memory data, without any
+hardware, and reports messages per second, microseconds per message and
+peak memory allocated per message. Covered are:
+
+* `parse_nmea()`, `nmea_checksum()` and `is_nmea_valid()`;
+* `DeviceManagerImpl._publish()` with 0, 1, 5 and 20 subscribed streams;
+* reading devices with `DeviceManagerImpl._read_device()` all the way to
+  stream consumer, both line by line and in chunks.
+
+Results can be saved as a baseline and later runs compared to it:
+
+    python benchmarks/bench_suite.py --save benchmarks/baseline.json
+    python benchmarks/bench_suite.py --compare benchmarks/baseline.json
+
+When comparing, the run fails if any case got slower by more than
+`--threshold` (10% by default).
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, NamedTuple, Optional
+
+from ovshell import api
+from ovshell.device import DeviceManagerImpl, format_nmea, is_nmea_valid
+from ovshell.device import nmea_checksum, parse_nmea
+
+# Typical traffic from GPS, vario and FLARM
+SENTENCES = [
+    "GPRMC,121931.00,A,4801.86153,N,01056.69289,E,53.587,8.64,270520,,,A",
+    "GPGGA,121931.00,4801.86153,N,01056.69289,E,1,08,1.01,822.7,M,47.0,M,,",
+    "POV,E,-1.79,P,822.70,Q,439.81",
+    "PGRMZ,2699,f,3",
+    "LXWP0,Y,119.4,1717.6,0.02,0.02,0.02,0.02,0.02,0.02,,000,107.2",
+    "PFLAU,3,1,2,1,0,,0,,",
+    "PFLAA,0,-1234,1234,220,2,DD8F12,180,,30,-1.4,1",
+]
+MESSAGES = 10000
+REPEAT = 10
+SUBSCRIBERS = [0, 1, 5, 20]
+CHUNK_SIZE = 50
+DEFAULT_THRESHOLD = 0.1
+
+
+class Probe:
+    """Measures the code, running in `with` block"""
+
+    elapsed: float = 0
+    allocated: int = 0
+
+    def __init__(self, trace_alloc: bool) -> None:
+        self.trace_alloc = trace_alloc
+
+    def __enter__(self) -> None:
+        if self.trace_alloc:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.elapsed = time.perf_counter() - self._started
+        if self.trace_alloc:
+            self.allocated = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+class Result(NamedTuple):
+    usec: float
+    alloc: float
+
+    @property
+    def rate(self) -> float:
+        return 1e6 / self.usec
+
+
+Case = Callable[[list[bytes], Probe], None]
+
+
+class MemoryDevice(api.Device):
+    """Device, that reads given lines one by one"""
+
+    def __init__(self, lines: list[bytes]) -> None:
+        self.id = "bench"
+        self.name = "Bench"
+        self._lines = iter(lines)
+
+    async def readline(self) -> bytes:
+        for line in self._lines:
+            return line
+        raise OSError("No more data")
+
+    def write(self, data: bytes) -> None:
+        pass
+
+
+class ChunkedMemoryDevice(MemoryDevice):
+    """Device, that reads given lines in chunks"""
+
+    async def readlines(self) -> list[bytes]:
+        chunk = [line for _, line in zip(range(CHUNK_SIZE), self._lines)]
+        if not chunk:
+            raise OSError("No more data")
+        # Give the consumer a chance to run, as it would on a real device
+        await asyncio.sleep(0)
+        return chunk
+
+
+def make_lines() -> list[bytes]:
+    sentences = [format_nmea(s).encode() + b"\r\n" for s in SENTENCES]
+    # Each line is a separate object, as if it was read from the device.
+    return [bytes(bytearray(sentences[n % len(sentences)])) for n in range(MESSAGES)]
+
+
+def case_parse(lines: list[bytes], probe: Probe) -> None:
+    with probe:
+        # Results are kept, so their size is accounted for
+        parsed = [parse_nmea("bench", line) for line in lines]
+    del parsed
+
+
+def case_parse_fields(lines: list[bytes], probe: Probe) -> None:
+    with probe:
+        parsed = [parse_nmea("bench", line) for line in lines]
+        for nmea in parsed:
+            nmea.fields
+    del parsed
+
+
+def case_checksum(lines: list[bytes], probe: Probe) -> None:
+    bodies = [line.decode().strip()[1:-3] for line in lines]
+    with probe:
+        for body in bodies:
+            nmea_checksum(body)
+
+
+def case_is_valid(lines: list[bytes], probe: Probe) -> None:
+    strlines = [line.decode().strip() for line in lines]
+    with probe:
+        for line in strlines:
+            is_nmea_valid(line)
+
+
+def case_publish(nsubscribers: int) -> Case:
+    def case(lines: list[bytes], probe: Probe) -> None:
+        async def run() -> None:
+            devman = DeviceManagerImpl()
+            dev = MemoryDevice([])
+            streams = [
+                devman.open_nmea(maxsize=len(lines)) for _ in range(nsubscribers)
+            ]
+            for s in streams:
+                s.__enter__()
+            with probe:
+                for line in lines:
+                    devman._publish(dev, line)
+            for s in streams:
+                s.__exit__(None, None, None)
+
+        asyncio.run(run())
+
+    return case
+
+
+def case_read_device(chunked: bool) -> Case:
+    def case(lines: list[bytes], probe: Probe) -> None:
+        async def run() -> None:
+            devman = DeviceManagerImpl()
+            dev: api.Device
+            if chunked:
+                dev = ChunkedMemoryDevice(lines)
+            else:
+                dev = MemoryDevice(lines)
+            with devman.open_nmea(policy=api.BackpressurePolicy.BLOCK) as stream:
+                with probe:
+                    devman.register(dev)
+                    received = 0
+                    while received < len(lines):
+                        batch = await stream.read_batch()
+                        for nmea in batch:
+                            nmea.fields
+                        received += len(batch)
+            # Let device reader finish
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+
+    return case
+
+
+CASES: dict[str, Case] = {
+    "parse_nmea": case_parse,
+    "parse_nmea+fields": case_parse_fields,
+    "nmea_checksum": case_checksum,
+    "is_nmea_valid": case_is_valid,
+    **{f"publish/{n}": case_publish(n) for n in SUBSCRIBERS},
+    "read_device/readline": case_read_device(chunked=False),
+    "read_device/readlines": case_read_device(chunked=True),
+}
+
+
+def run_case(case: Case, lines: list[bytes], repeat: int) -> Result:
+    timings = []
+    for _ in range(repeat):
+        probe = Probe(trace_alloc=False)
+        case(lines, probe)
+        timings.append(probe.elapsed)
+
+    probe = Probe(trace_alloc=True)
+    case(lines, probe)
+    return Result(
+        usec=min(timings) / len(lines) * 1e6, alloc=probe.allocated / len(lines)
+    )
+
+
+def compare(
+    results: dict[str, Result], baseline: dict[str, dict], threshold: float
+) -> bool:
+    """Print comparison to the baseline. Return False on regressions."""
+    ok = True
+    print()
+    print(f"{'case':<24} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<24} {'-':>10} {result.usec:>10.2f}")
+            continue
+        base = baseline[name]["usec"]
+        change = result.usec / base - 1
+        mark = ""
+        if change > threshold:
+            mark = " REGRESSION"
+            ok = False
+        print(f"{name:<24} {base:>10.2f} {result.usec:>10.2f} {change:>+8.1%}{mark}")
+    return ok
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NMEA pipeline benchmarks")
+    parser.add_argument("--save", metavar="FILE", help="save results as baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare with baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("cases", nargs="*", help="cases to run (default: all)")
+    args = parser.parse_args(argv)
+
+    lines = make_lines()
+    names = args.cases or list(CASES)
+    print(f"{len(lines)} messages, best of {args.repeat}")
+    print(f"{'case':<24} {'msg/s':>10} {'us/msg':>8} {'alloc B/msg':>12}")
+    results = {}
+    for name in names:
+        result = run_case(CASES[name], lines, args.repeat)
+        results[name] = result
+        print(
+            f"{name:<24} {result.rate:>10.0f} {result.usec:>8.2f} "
+            f"{result.alloc:>12.0f}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({n: r._asdict() for n, r in results.items()}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,12 @@
 
 import asyncio
 import enum
+import math
+import sys
 from abc import abstractmethod
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Any, Callable, Coroutine, Generator, Iterable, Iterator, Optional
 from typing import Sequence, TypeVar, Union
 
@@ -108,6 +111,44 @@ class Device(Protocol):
         """
 
 
+@runtime_checkable
+class ChunkedDevice(Device, Protocol):
+    """Device, capable of reading several lines at once
+
+    Optional extension of `Device` protocol. `DeviceManager` reads chunked
+    devices with `readlines()`, and falls back to `readline()` for all other
+    devices.
+    """
+
+    async def readlines(self) -> list[bytes]:
+        """Read all complete lines, currently available from the device
+
+        Waits until at least one line is available. Returned lines may come
+        without line terminators. Can raise `IOError`, just like `readline()`.
+        """
+
+
+@runtime_checkable
+class ValidatingDevice(ChunkedDevice, Protocol):
+    """Chunked device, that validates NMEA sentences on its own
+
+    Optional extension of `ChunkedDevice` protocol, for devices that read
+    data outside of the event loop (e.g. in a separate thread). Lines,
+    returned by `readlines()` are NMEA sentences with verified checksums, so
+    `DeviceManager` doesn't check them again. Rejected lines are not returned,
+    only counted (see `take_rejected()`).
+    """
+
+    # Time (as in `time.monotonic()`), the oldest of the lines, returned by
+    # the last `readlines()` call, was read from the device.
+    received: float
+
+    def take_rejected(self) -> tuple[int, int, int]:
+        """Return numbers of invalid, non-ascii and dropped lines, rejected
+        since the last call.
+        """
+
+
 class SerialDevice(Device):
     """Serial device.
 
@@ -118,18 +159,184 @@ class SerialDevice(Device):
     baudrate: int
     path: str
 
+    async def close(self) -> None:
+        """Close the device and release the port"""
+
 
-@dataclass
 class NMEA:
     """Parsed NMEA message
 
     Each NMEA message are associated with the device that produced it.
+
+    NMEA messages are created in large numbers, so they are kept compact:
+    attributes are stored in slots and `datatype` strings are interned.
+    Subclasses may compute `raw_message` and `fields` lazily.
+
+    `received` is the time (as in `time.monotonic()`) the message was read
+    from the device, if known.
     """
 
+    __slots__ = ("device_id", "datatype", "received", "_raw_message", "_fields")
+
     device_id: str
-    raw_message: str
     datatype: str
-    fields: Sequence[str]
+    received: Optional[float]
+    _raw_message: Optional[str]
+    _fields: Optional[Sequence[str]]
+
+    def __init__(
+        self,
+        device_id: str,
+        raw_message: str,
+        datatype: str,
+        fields: Sequence[str],
+        received: Optional[float] = None,
+    ) -> None:
+        self.device_id = device_id
+        self.datatype = sys.intern(datatype)
+        self.received = received
+        self._raw_message = raw_message
+        self._fields = fields
+
+    @property
+    def raw_message(self) -> str:
+        assert self._raw_message is not None
+        return self._raw_message
+
+    @property
+    def fields(self) -> Sequence[str]:
+        assert self._fields is not None
+        return self._fields
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NMEA):
+            return NotImplemented
+        return (
+            self.device_id == other.device_id
+            and self.datatype == other.datatype
+            and self.raw_message == other.raw_message
+            and list(self.fields) == list(other.fields)
+        )
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(device_id={self.device_id!r}, "
+            f"raw_message={self.raw_message!r}, datatype={self.datatype!r}, "
+            f"fields={self.fields!r})"
+        )
+
+
+class BackpressurePolicy(enum.Enum):
+    """What to do when NMEA stream consumer can't keep up with incoming data.
+
+    * DROP_OLDEST - discard the oldest queued message to make room
+    * DROP_NEWEST - discard the incoming message
+    * BLOCK - stop reading the device until there is room in the stream (or
+      until timeout expires, in which case incoming message is discarded)
+    * COALESCE - keep only the latest queued message for each datatype of
+      each device
+    """
+
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+    BLOCK = "block"
+    COALESCE = "coalesce"
+
+
+class LatencyHistogram:
+    """Histogram of latencies (in seconds)
+
+    Buckets grow exponentially, several per octave, starting from
+    `MIN_LATENCY`. Recording is O(1), percentiles are approximate, reported
+    as upper bounds of the buckets.
+    """
+
+    MIN_LATENCY = 1e-5
+    BUCKETS_PER_OCTAVE = 4
+    # Covers latencies up to about 3 minutes
+    NBUCKETS = 1 + 24 * BUCKETS_PER_OCTAVE
+
+    def __init__(self) -> None:
+        self.counts = [0] * self.NBUCKETS
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, latency: float) -> None:
+        if latency <= self.MIN_LATENCY:
+            bucket = 0
+        else:
+            octaves = math.log2(latency / self.MIN_LATENCY)
+            bucket = min(
+                math.ceil(octaves * self.BUCKETS_PER_OCTAVE), self.NBUCKETS - 1
+            )
+        self.counts[bucket] += 1
+        self.count += 1
+        if latency > self.max:
+            self.max = latency
+
+    def percentile(self, pct: float) -> float:
+        """Return the latency, `pct` percent of recorded latencies fit in"""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * pct / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if bucket == self.NBUCKETS - 1:
+            # Overflow bucket has no upper bound
+            return self.max
+        upper = self.MIN_LATENCY * 2 ** (bucket / self.BUCKETS_PER_OCTAVE)
+        return min(upper, self.max)
+
+    def __str__(self) -> str:
+        p50, p95, p99 = (self.percentile(p) * 1000 for p in (50, 95, 99))
+        return f"p50 {p50:.1f}ms, p95 {p95:.1f}ms, p99 {p99:.1f}ms"
+
+
+@dataclass
+class NMEAStreamStats:
+    """NMEA stream counters"""
+
+    # Messages, handed over to the consumer
+    delivered: int = 0
+    # Messages lost because consumer was too slow
+    dropped: int = 0
+    # Maximum number of messages waiting in the stream
+    peak_depth: int = 0
+    # Time from reading the message from the device until the consumer gets
+    # it. Only traced on request.
+    latency: Optional[LatencyHistogram] = None
+    # Short description of the stream subscription, not a counter
+    name: str = field(default="", compare=False)
+
+
+@dataclass
+class DeviceStats:
+    """Ingest counters of a single device
+
+    Totals are counted since the device was first registered and survive
+    reconnects. Rates are averaged over the last few seconds.
+    """
+
+    # Lines and bytes received
+    lines: int = 0
+    bytes: int = 0
+    # Lines that are not valid NMEA sentences (including wrong checksums)
+    invalid: int = 0
+    # Lines with non-ascii data (usually caused by wrong baud rate)
+    decode_errors: int = 0
+    # Lines, lost before reaching the shell (e.g. ingest buffer overrun)
+    dropped: int = 0
+    lines_per_sec: float = 0
+    bytes_per_sec: float = 0
+    # Sentences per second, by datatype
+    datatype_rates: dict[str, float] = field(default_factory=dict)
+    # Time (as in `time.monotonic()`) of the most recent data
+    last_seen: Optional[float] = None
 
 
 class NMEAStream:
@@ -140,10 +347,34 @@ class NMEAStream:
     `DeviceManager.open_nmea()`.
     """
 
+    stats: NMEAStreamStats
+
     @abstractmethod
     async def read(self) -> NMEA:
         """Read next NMEA message"""
 
+    @abstractmethod
+    async def read_batch(
+        self, max_items: int = 100, max_latency: float = 0
+    ) -> list[NMEA]:
+        """Read all available NMEA messages at once, up to `max_items`
+
+        Waits for at least one message. If `max_latency` is set, keeps waiting
+        for up to `max_latency` seconds after the first message, until
+        `max_items` messages are collected. Consumers that process messages
+        in bulk (e.g. write to disk or redraw) wake up once per batch.
+        """
+
+    async def batches(
+        self, max_items: int = 100, max_latency: float = 0
+    ) -> AsyncIterator[list[NMEA]]:
+        """Return (infinite) iterator for batches of NMEA messages
+
+        See `read_batch()` for the meaning of arguments.
+        """
+        while True:
+            yield await self.read_batch(max_items, max_latency)
+
     @abstractmethod
     def __aiter__(self) -> AsyncIterator[NMEA]:
         """Return (infinite) iterator for NMEA messages"""
@@ -153,6 +384,38 @@ class NMEAStream:
         """Return next NMEA message (when available)"""
 
 
+class DeviceEventType(enum.Enum):
+    REGISTERED = "registered"
+    REMOVED = "removed"
+
+
+@dataclass
+class DeviceEvent:
+    """Device was registered or removed"""
+
+    type: DeviceEventType
+    device: Device
+
+
+class DeviceEventStream:
+    """The stream of device events
+
+    Can be obtained with `DeviceManager.open_events()`.
+    """
+
+    @abstractmethod
+    async def read(self) -> DeviceEvent:
+        """Wait for the next device event"""
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator[DeviceEvent]:
+        """Return (infinite) iterator for device events"""
+
+    @abstractmethod
+    async def __anext__(self) -> DeviceEvent:
+        """Return next device event (when available)"""
+
+
 class DeviceManager(Protocol):
     """Device manager
 
@@ -170,12 +433,107 @@ class DeviceManager(Protocol):
         """Enumerate all registred devices."""
 
     @contextmanager
-    def open_nmea(self) -> Generator[NMEAStream, None, None]:
+    def open_nmea(
+        self,
+        datatypes: Optional[Iterable[str]] = None,
+        devices: Optional[Iterable[str]] = None,
+        policy: BackpressurePolicy = BackpressurePolicy.DROP_OLDEST,
+        maxsize: int = 100,
+        timeout: Optional[float] = 1.0,
+        trace_latency: Optional[bool] = None,
+    ) -> Generator[NMEAStream, None, None]:
         """Open new NMEA stream.
 
         Supposed to be used as a context manager with new NMEAStream object.
         NMEA messages from all the registered devices will be sent to this
         stream until context manager exits.
+
+        If `datatypes` is given, only messages of these types (e.g. "GPRMC")
+        are sent to the stream. If `devices` is given, only messages from
+        devices with these ids are sent. Messages nobody is subscribed to are
+        not even parsed, so it is best to ask only for what is needed.
+
+        At most `maxsize` messages are held in the stream. When it is full,
+        `policy` decides what happens with the new messages. For
+        `BackpressurePolicy.BLOCK`, `timeout` is the longest time to wait for
+        consumer (None to wait forever). Counters of delivered and dropped
+        messages are available in `NMEAStream.stats`.
+
+        With `trace_latency`, histogram of latencies between reading the
+        message from the device and handing it over to the consumer is
+        recorded in `NMEAStream.stats.latency`. By default, that is decided
+        by the device manager (see `--trace-latency` command line option).
+        """
+
+    def latest(self, datatype: str, device_id: Optional[str] = None) -> Optional[NMEA]:
+        """Return the most recent message of given datatype.
+
+        If `device_id` is given, return the most recent message from that
+        device only. Return None if no such message was received yet.
+
+        Datatypes are cached on demand: the cache for the datatype starts to
+        fill up after the first call to `latest()` or `wait_for_update()`.
+        That way, messages nobody is interested in are never parsed.
+        """
+
+    async def wait_for_update(
+        self, datatype: str, device_id: Optional[str] = None
+    ) -> NMEA:
+        """Wait for the next message of given datatype and return it."""
+
+    @contextmanager
+    def open_events(self) -> Generator[DeviceEventStream, None, None]:
+        """Open the stream of device events.
+
+        Supposed to be used as a context manager. Events about devices being
+        registered and removed are sent to the stream until context manager
+        exits. Devices, registered before the stream was opened, should be
+        found with `enumerate()`.
+        """
+
+    def stats(self, device_id: str) -> Optional[DeviceStats]:
+        """Return ingest statistics of the device.
+
+        Return None if device was never registered.
+        """
+
+    def stream_stats(self) -> list[NMEAStreamStats]:
+        """Return counters of all open NMEA streams."""
+
+    def notify_input(self) -> None:
+        """Notify that user input has arrived.
+
+        Devices, busy processing incoming data, yield to the event loop as
+        soon as possible, so input is handled and screen is redrawn first.
+        """
+
+    @property
+    def paused(self) -> bool:
+        """True if device manager is paused (see `pause()`)."""
+
+    async def pause(self) -> None:
+        """Release serial ports and suspend device discovery.
+
+        All registered serial devices are closed and removed, so external
+        programs can open the ports. Device maintainers (e.g. serial port
+        discovery) don't open any ports until `resume()` is called.
+        """
+
+    def resume(self) -> None:
+        """Resume device discovery after `pause()`.
+
+        Ports, released by `pause()`, are reopened at the same baud rates,
+        without detection.
+        """
+
+    async def wait_paused(self) -> None:
+        """Wait until device manager is paused."""
+
+    async def wait_resumed(self) -> dict[str, int]:
+        """Wait until device manager is not paused.
+
+        Return baud rates of the serial ports, released by the last `pause()`,
+        by port path. Device maintainers are supposed to reopen those.
         """
 
 
@@ -468,6 +826,12 @@ class OpenVarioOS(Protocol):
     def sync(self) -> None:
         """Flush filesystem caches"""
 
+    async def set_system_time(self, dt: datetime) -> None:
+        """Set system clock to given (naive, UTC) time
+
+        May raise OSError if time can not be set.
+        """
+
     def shut_down(self) -> None:
         """Shut down the system"""
 
@@ -92,7 +92,11 @@ class AppManagerImpl(api.AppManager):
 
 class OpenvarioShellImpl(OpenVarioShell):
     def __init__(
-        self, screen: ScreenManager, config: str, rootfs: Optional[str]
+        self,
+        screen: ScreenManager,
+        config: str,
+        rootfs: Optional[str],
+        trace_latency: bool = False,
     ) -> None:
         self.screen = screen
         if rootfs is None:
@@ -101,7 +105,7 @@ class OpenvarioShellImpl(OpenVarioShell):
             print(f"Simulating Openvario on {rootfs}")
             self.os = ovos.OpenVarioOSSimulator(rootfs)
         self.settings = settings.StoredSettingsImpl.load(config)
-        self.devices = device.DeviceManagerImpl()
+        self.devices = device.DeviceManagerImpl(trace_latency=trace_latency)
         self.processes = process.ProcessManagerImpl()
         self.extensions = ExtensionManagerImpl()
         self.apps = AppManagerImpl(self)
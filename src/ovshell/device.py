@@ -1,33 +1,170 @@
 import asyncio
+import functools
+import sys
+import time
 from contextlib import contextmanager
-from typing import Generator, Optional
+from typing import Awaitable, Callable, Generator, Iterable, Optional, Sequence
 
 from ovshell import api
 
+NMEA_QUEUE_SIZE = 100
+NMEA_BLOCK_TIMEOUT = 1.0
+# Device data rates are averaged over this many seconds
+STATS_WINDOW = 5
+# Device reader yields to the event loop after publishing that many messages
+# or after being busy for that long (in seconds), whichever comes first
+INGEST_BUDGET_MESSAGES = 50
+INGEST_BUDGET_TIME = 0.005
+# Time budget is only checked once per that many messages
+INGEST_CLOCK_INTERVAL = 10
+# Loop iterations to give up after user input: one to let urwid process it
+# and one for the redraw, urwid schedules after that.
+INPUT_YIELD_ROUNDS = 2
+
 
 class InvalidNMEA(ValueError):
     pass
 
 
 def parse_nmea(device_id: str, message: bytes) -> api.NMEA:
-    strmsg = message.decode().strip()
-    if not is_nmea_valid(strmsg):
+    """Parse and validate raw NMEA line, as read from the device.
+
+    The line is processed as bytes: checksum is verified exactly once and
+    fields are only split when consumer accesses them. Raises `InvalidNMEA`
+    if message is not a valid NMEA sentence and `UnicodeDecodeError` if
+    message contains non-ascii data.
+    """
+    if not message.isascii():
+        # Binary garbage usually means wrong baud rate
+        message.decode("ascii")
+
+    end = _datatype_end(message)
+    if end < 0 or not _verify_checksum(message):
         raise InvalidNMEA()
+    return NMEAMessage(device_id, message, _intern_datatype(message[1:end]))
+
+
+def _datatype_end(message: bytes) -> int:
+    """Return the end position of raw NMEA sentence datatype, or -1
+
+    Sentence is not validated, and datatype is not interned, so that garbage
+    doesn't end up in the datatype cache.
+    """
+    if message[:1] != b"$":
+        return -1
+    end = message.find(b",")
+    if end < 0:
+        end = message.find(b"*")
+    return end
+
+
+def check_nmea(message: bytes) -> bool:
+    """Return True if raw line is a valid NMEA sentence with correct checksum"""
+    return _datatype_end(message) >= 0 and _verify_checksum(message)
+
+
+def _verify_checksum(message: bytes) -> bool:
+    star = message.rfind(b"*")
+    chksum = message[star + 1 : star + 3]
+    if star < 0 or len(chksum) != 2 or not chksum.isalnum():
+        return False
+    if message[star + 3 :].strip():
+        # Garbage after the checksum
+        return False
+
+    try:
+        return int(chksum, 16) == _xor_bytes(message[1:star])
+    except ValueError:
+        return False
+
 
-    msg, chksum = strmsg.rsplit("*", 1)
-    parts = msg.split(",")
-    datatype = parts[0][1:]
+_MASK512 = (1 << 512) - 1
+_MASK256 = (1 << 256) - 1
+_MASK128 = (1 << 128) - 1
+_MASK64 = (1 << 64) - 1
 
-    return api.NMEA(
-        device_id=device_id, raw_message=strmsg, datatype=datatype, fields=parts[1:]
-    )
+
+def _xor_bytes(data: bytes) -> int:
+    if len(data) > 128:
+        chk = 0
+        for b in data:
+            chk ^= b
+        return chk
+
+    # NMEA sentences are at most 82 characters long. Instead of xoring byte by
+    # byte in python, treat the data as one big integer and fold it in half
+    # until single byte is left.
+    x = int.from_bytes(data, "little")
+    x = (x >> 512) ^ (x & _MASK512)
+    x = (x >> 256) ^ (x & _MASK256)
+    x = (x >> 128) ^ (x & _MASK128)
+    x = (x >> 64) ^ (x & _MASK64)
+    x ^= x >> 32
+    x ^= x >> 16
+    x ^= x >> 8
+    return x & 0xFF
+
+
+def _intern_datatype(rawtype: bytes) -> str:
+    datatype = _datatypes.get(rawtype)
+    if datatype is None:
+        datatype = sys.intern(rawtype.decode())
+        if len(_datatypes) < MAX_KNOWN_DATATYPES:
+            _datatypes[rawtype] = datatype
+    return datatype
+
+
+MAX_KNOWN_DATATYPES = 256
+_datatypes: dict[bytes, str] = {}
+
+
+class NMEAMessage(api.NMEA):
+    """NMEA message, parsed lazily from raw line
+
+    Holds only the line, as read from the device. `raw_message` and `fields`
+    are decoded on first access.
+    """
+
+    __slots__ = ("_line",)
+
+    def __init__(
+        self,
+        device_id: str,
+        line: bytes,
+        datatype: str,
+        received: Optional[float] = None,
+    ) -> None:
+        self.device_id = device_id
+        self.datatype = datatype
+        self.received = received
+        self._raw_message = None
+        self._fields = None
+        self._line = line
+
+    @property
+    def raw_message(self) -> str:
+        if self._raw_message is None:
+            star = self._line.rfind(b"*")
+            self._raw_message = self._line[: star + 3].decode()
+        return self._raw_message
+
+    @property
+    def fields(self) -> Sequence[str]:
+        if self._fields is None:
+            line = self._line
+            star = line.rfind(b"*")
+            comma = line.find(b",", 1, star)
+            self._fields = (
+                [] if comma < 0 else line[comma + 1 : star].decode().split(",")
+            )
+        return self._fields
 
 
 def nmea_checksum(nmea_str: str) -> str:
     chksum = 0
     for c in nmea_str:
         chksum ^= ord(c)
-    return f"{chksum:2X}"
+    return f"{chksum:02X}"
 
 
 def is_nmea_valid(nmea_msg: str) -> bool:
@@ -45,12 +182,110 @@ def format_nmea(nmea_str: str) -> str:
     return f"${nmea_str}*{chksum}"
 
 
+class CoalescingQueue(asyncio.Queue):
+    """Queue, that holds only the latest NMEA message per device and datatype
+
+    The position in the queue is kept from the oldest pending message of the
+    same type, so frequent sentences do not starve the others.
+    """
+
+    _queue: dict[tuple[str, str], api.NMEA]
+
+    def _init(self, maxsize: int) -> None:
+        self._queue = {}
+
+    def _put(self, item: api.NMEA) -> None:
+        self._queue[(item.device_id, item.datatype)] = item
+
+    def _get(self) -> api.NMEA:
+        key = next(iter(self._queue))
+        return self._queue.pop(key)
+
+    def replace(self, item: api.NMEA) -> bool:
+        """Replace pending message of the same type, if there is one"""
+        key = (item.device_id, item.datatype)
+        if key not in self._queue:
+            return False
+        self._queue[key] = item
+        return True
+
+
 class NMEAStreamImpl(api.NMEAStream):
-    def __init__(self, queue: "asyncio.Queue[api.NMEA]") -> None:
-        self._queue = queue
+    def __init__(
+        self,
+        datatypes: Optional[frozenset[str]] = None,
+        devices: Optional[frozenset[str]] = None,
+        policy: api.BackpressurePolicy = api.BackpressurePolicy.DROP_OLDEST,
+        maxsize: int = NMEA_QUEUE_SIZE,
+        timeout: Optional[float] = NMEA_BLOCK_TIMEOUT,
+        trace_latency: bool = False,
+    ) -> None:
+        self._queue: "asyncio.Queue[api.NMEA]"
+        if policy is api.BackpressurePolicy.COALESCE:
+            self._queue = CoalescingQueue(maxsize=maxsize)
+        else:
+            self._queue = asyncio.Queue(maxsize=maxsize)
+        self.datatypes = datatypes
+        self.devices = devices
+        self.policy = policy
+        self.timeout = timeout
+        self.stats = api.NMEAStreamStats(name=_describe_stream(datatypes, devices))
+        if trace_latency:
+            self.stats.latency = api.LatencyHistogram()
+        self._batch_waiter: Optional[asyncio.Future[None]] = None
+        self._batch_size = 0
 
     async def read(self) -> api.NMEA:
-        return await self._queue.get()
+        nmea = await self._queue.get()
+        self.stats.delivered += 1
+        if self.stats.latency is not None:
+            self._trace_latency([nmea])
+        return nmea
+
+    async def read_batch(
+        self, max_items: int = NMEA_QUEUE_SIZE, max_latency: float = 0
+    ) -> list[api.NMEA]:
+        q = self._queue
+        if max_latency > 0:
+            # Messages stay in the queue until waiting is over, so that
+            # cancelled read doesn't consume anything
+            while q.empty():
+                await self._wait_batch(1)
+            if q.qsize() < max_items:
+                await self._wait_batch(max_items, max_latency)
+            batch = []
+        else:
+            batch = [await q.get()]
+
+        for _ in range(min(q.qsize(), max_items - len(batch))):
+            batch.append(q.get_nowait())
+        self.stats.delivered += len(batch)
+        if self.stats.latency is not None:
+            self._trace_latency(batch)
+        return batch
+
+    def _trace_latency(self, nmeas: list[api.NMEA]) -> None:
+        latency = self.stats.latency
+        assert latency is not None
+        now = time.monotonic()
+        for nmea in nmeas:
+            if nmea.received is not None:
+                latency.record(now - nmea.received)
+
+    async def _wait_batch(self, size: int, timeout: Optional[float] = None) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        timer = None
+        if timeout is not None:
+            timer = loop.call_later(timeout, _wakeup, waiter)
+        self._batch_waiter = waiter
+        self._batch_size = size
+        try:
+            await waiter
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._batch_waiter = None
 
     def __aiter__(self) -> api.NMEAStream:
         return self
@@ -58,23 +293,211 @@ class NMEAStreamImpl(api.NMEAStream):
     async def __anext__(self) -> api.NMEA:
         return await self.read()
 
+    def _put(self, nmea: api.NMEA) -> bool:
+        """Put the message to the stream without waiting.
+
+        Return False if message has to wait for the free space in the stream.
+        """
+        q = self._queue
+        policy = self.policy
+        if policy is api.BackpressurePolicy.COALESCE:
+            assert isinstance(q, CoalescingQueue)
+            if q.replace(nmea):
+                self.stats.dropped += 1
+                return True
+
+        if q.full():
+            if policy is api.BackpressurePolicy.BLOCK:
+                return False
+            self.stats.dropped += 1
+            if policy is api.BackpressurePolicy.DROP_NEWEST:
+                return True
+            q.get_nowait()
+
+        q.put_nowait(nmea)
+        self._update_depth()
+        return True
+
+    async def _put_waiting(self, nmea: api.NMEA) -> None:
+        try:
+            await asyncio.wait_for(self._queue.put(nmea), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.dropped += 1
+            return
+        self._update_depth()
+
+    def _update_depth(self) -> None:
+        depth = self._queue.qsize()
+        if depth > self.stats.peak_depth:
+            self.stats.peak_depth = depth
+        if self._batch_waiter is not None and depth >= self._batch_size:
+            _wakeup(self._batch_waiter)
+
+    def _close(self) -> None:
+        # Release the devices that might be waiting for this stream
+        q = self._queue
+        while not q.empty():
+            q.get_nowait()
+
+
+def _describe_stream(
+    datatypes: Optional[frozenset[str]], devices: Optional[frozenset[str]]
+) -> str:
+    dts = "*" if datatypes is None else ",".join(sorted(datatypes))
+    if devices is None:
+        return dts
+    return f"{dts} from {','.join(sorted(devices))}"
+
+
+def _wakeup(waiter: "asyncio.Future[None]") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class DeviceEventStreamImpl(api.DeviceEventStream):
+    def __init__(self) -> None:
+        self._queue: "asyncio.Queue[api.DeviceEvent]" = asyncio.Queue()
+
+    async def read(self) -> api.DeviceEvent:
+        return await self._queue.get()
+
+    def __aiter__(self) -> api.DeviceEventStream:
+        return self
+
+    async def __anext__(self) -> api.DeviceEvent:
+        return await self.read()
+
+    def _put(self, event: api.DeviceEvent) -> None:
+        self._queue.put_nowait(event)
+
+
+class DeviceCounters:
+    """Rolling counters of data, received from the device
+
+    Rates are counted in per-second buckets, covering the last `STATS_WINDOW`
+    seconds, so upkeep is O(1) per message.
+    """
+
+    def __init__(self) -> None:
+        self.lines = 0
+        self.bytes = 0
+        self.invalid = 0
+        self.decode_errors = 0
+        self.dropped = 0
+        self.last_seen: Optional[float] = None
+        nbuckets = STATS_WINDOW + 1
+        self._lines = [0] * nbuckets
+        self._bytes = [0] * nbuckets
+        self._datatypes: list[dict[str, int]] = [{} for _ in range(nbuckets)]
+        self._first_second: Optional[int] = None
+        self._second = 0
+        self._bucket = 0
+
+    def count_lines(self, lines: list[bytes], now: float) -> None:
+        """Count the lines, received from device at `now`"""
+        self.last_seen = now
+        self._rotate(int(now))
+        bucket = self._bucket
+        nbytes = sum(map(len, lines))
+        self.lines += len(lines)
+        self.bytes += nbytes
+        self._lines[bucket] += len(lines)
+        self._bytes[bucket] += nbytes
+
+    def count_datatype(self, datatype: str) -> None:
+        datatypes = self._datatypes[self._bucket]
+        datatypes[datatype] = datatypes.get(datatype, 0) + 1
+
+    def snapshot(self, now: float) -> api.DeviceStats:
+        second = int(now)
+        self._rotate(second)
+        stats = api.DeviceStats(
+            lines=self.lines,
+            bytes=self.bytes,
+            invalid=self.invalid,
+            decode_errors=self.decode_errors,
+            dropped=self.dropped,
+            last_seen=self.last_seen,
+        )
+        if self._first_second is None:
+            return stats
+
+        # Only complete seconds are counted
+        period = min(second - self._first_second, STATS_WINDOW)
+        if period <= 0:
+            return stats
+        nbuckets = len(self._lines)
+        buckets = [s % nbuckets for s in range(second - period, second)]
+        stats.lines_per_sec = sum(self._lines[b] for b in buckets) / period
+        stats.bytes_per_sec = sum(self._bytes[b] for b in buckets) / period
+        for b in buckets:
+            for datatype, count in self._datatypes[b].items():
+                rate = stats.datatype_rates.get(datatype, 0.0)
+                stats.datatype_rates[datatype] = rate + count / period
+        return stats
+
+    def _rotate(self, second: int) -> None:
+        if second <= self._second:
+            return
+        if self._first_second is None:
+            self._first_second = second
+        nbuckets = len(self._lines)
+        # Clear buckets of the seconds, that passed since last rotation
+        for s in range(max(self._second + 1, second - nbuckets + 1), second + 1):
+            b = s % nbuckets
+            self._lines[b] = 0
+            self._bytes[b] = 0
+            self._datatypes[b].clear()
+        self._second = second
+        self._bucket = second % nbuckets
+
+
+async def _readline_chunk(dev: api.Device) -> list[bytes]:
+    return [await dev.readline()]
+
 
 class DeviceManagerImpl(api.DeviceManager):
     _devices: dict[str, api.Device]
     _handlers: dict[str, "asyncio.Task[None]"]
-    _queues: set["asyncio.Queue[api.NMEA]"]
+    # Open streams, indexed by requested datatype. Streams, that accept all
+    # datatypes are stored under `None` key.
+    _subscribers: dict[Optional[str], set[NMEAStreamImpl]]
+    # Latest messages of tracked datatypes, by datatype and by device
+    _latest: dict[str, Optional[api.NMEA]]
+    _latest_by_device: dict[tuple[str, str], api.NMEA]
+    _update_waiters: dict[str, list["asyncio.Future[api.NMEA]"]]
+    _counters: dict[str, DeviceCounters]
+    _event_streams: set[DeviceEventStreamImpl]
 
-    def __init__(self) -> None:
+    def __init__(self, trace_latency: bool = False) -> None:
+        self.trace_latency = trace_latency
+        self._input_seq = 0
         self._devices = {}
         self._handlers = {}
-        self._queues = set()
+        self._subscribers = {}
+        self._latest = {}
+        self._latest_by_device = {}
+        self._update_waiters = {}
+        self._counters = {}
+        self._event_streams = set()
+        self._paused = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        # Baud rates of serial ports, released by the last pause()
+        self._released: dict[str, int] = {}
 
     def register(self, device: api.Device) -> None:
         if device.id in self._devices:
             # Already registered
             return
         self._devices[device.id] = device
-        self._handlers[device.id] = asyncio.create_task(self._read_device(device))
+        self._counters.setdefault(device.id, DeviceCounters())
+        handler = asyncio.create_task(self._read_device(device))
+        # Reader can be cancelled before it even starts, so device is
+        # unregistered when the task is done, rather than by the reader.
+        handler.add_done_callback(functools.partial(self._unregister, device))
+        self._handlers[device.id] = handler
+        self._emit(api.DeviceEventType.REGISTERED, device)
 
     def enumerate(self) -> list[api.Device]:
         return list(self._devices.values())
@@ -83,37 +506,271 @@ class DeviceManagerImpl(api.DeviceManager):
         return self._devices.get(devid)
 
     @contextmanager
-    def open_nmea(self) -> Generator[api.NMEAStream, None, None]:
-        q: "asyncio.Queue[api.NMEA]" = asyncio.Queue(maxsize=100)
-        self._queues.add(q)
-        yield NMEAStreamImpl(q)
-        self._queues.remove(q)
+    def open_nmea(
+        self,
+        datatypes: Optional[Iterable[str]] = None,
+        devices: Optional[Iterable[str]] = None,
+        policy: api.BackpressurePolicy = api.BackpressurePolicy.DROP_OLDEST,
+        maxsize: int = NMEA_QUEUE_SIZE,
+        timeout: Optional[float] = NMEA_BLOCK_TIMEOUT,
+        trace_latency: Optional[bool] = None,
+    ) -> Generator[api.NMEAStream, None, None]:
+        if trace_latency is None:
+            trace_latency = self.trace_latency
+        stream = NMEAStreamImpl(
+            datatypes=None if datatypes is None else frozenset(datatypes),
+            devices=None if devices is None else frozenset(devices),
+            policy=policy,
+            maxsize=maxsize,
+            timeout=timeout,
+            trace_latency=trace_latency,
+        )
+        keys: list[Optional[str]] = [None]
+        if stream.datatypes is not None:
+            keys = list(stream.datatypes)
+
+        for key in keys:
+            self._subscribers.setdefault(key, set()).add(stream)
+        try:
+            yield stream
+        finally:
+            for key in keys:
+                subscribers = self._subscribers[key]
+                subscribers.remove(stream)
+                if not subscribers:
+                    del self._subscribers[key]
+            stream._close()
+
+    def latest(
+        self, datatype: str, device_id: Optional[str] = None
+    ) -> Optional[api.NMEA]:
+        if datatype not in self._latest:
+            self._latest[sys.intern(datatype)] = None
+            return None
+        if device_id is None:
+            return self._latest[datatype]
+        return self._latest_by_device.get((device_id, datatype))
+
+    async def wait_for_update(
+        self, datatype: str, device_id: Optional[str] = None
+    ) -> api.NMEA:
+        self.latest(datatype)
+        waiters = self._update_waiters.setdefault(datatype, [])
+        while True:
+            fut: "asyncio.Future[api.NMEA]" = asyncio.get_running_loop().create_future()
+            waiters.append(fut)
+            try:
+                nmea = await fut
+            finally:
+                if fut in waiters:
+                    waiters.remove(fut)
+            if device_id is None or nmea.device_id == device_id:
+                return nmea
+
+    @contextmanager
+    def open_events(self) -> Generator[api.DeviceEventStream, None, None]:
+        stream = DeviceEventStreamImpl()
+        self._event_streams.add(stream)
+        try:
+            yield stream
+        finally:
+            self._event_streams.remove(stream)
+
+    def stats(self, device_id: str) -> Optional[api.DeviceStats]:
+        counters = self._counters.get(device_id)
+        if counters is None:
+            return None
+        return counters.snapshot(time.monotonic())
+
+    def stream_stats(self) -> list[api.NMEAStreamStats]:
+        streams: set[NMEAStreamImpl] = set()
+        for subscribers in self._subscribers.values():
+            streams.update(subscribers)
+        return sorted((s.stats for s in streams), key=lambda st: st.name)
+
+    def notify_input(self) -> None:
+        self._input_seq += 1
+
+    @property
+    def paused(self) -> bool:
+        return self._paused.is_set()
+
+    async def pause(self) -> None:
+        if self.paused:
+            return
+        self._paused.set()
+        self._resumed.clear()
+        self._released = {}
+        serial = [d for d in self._devices.values() if isinstance(d, api.SerialDevice)]
+        handlers = [self._handlers[dev.id] for dev in serial]
+        for handler in handlers:
+            handler.cancel()
+        if handlers:
+            await asyncio.wait(handlers)
+        for dev in serial:
+            await dev.close()
+            self._released[dev.path] = dev.baudrate
+
+    def resume(self) -> None:
+        self._paused.clear()
+        self._resumed.set()
+
+    async def wait_paused(self) -> None:
+        await self._paused.wait()
+
+    async def wait_resumed(self) -> dict[str, int]:
+        await self._resumed.wait()
+        return dict(self._released)
 
     async def _read_device(self, dev: api.Device) -> None:
+        readlines: Callable[[], Awaitable[list[bytes]]]
+        if isinstance(dev, api.ChunkedDevice):
+            readlines = dev.readlines
+        else:
+            readlines = functools.partial(_readline_chunk, dev)
+        counters = self._counters[dev.id]
+        verified = isinstance(dev, api.ValidatingDevice)
+        # Reading buffered data does not necessarily suspend the task, so
+        # bursts of data are processed in slices, limited by ingest budget.
+        input_seq = self._input_seq
+        budget = INGEST_BUDGET_MESSAGES
+        deadline = time.monotonic() + INGEST_BUDGET_TIME
+
         try:
             while True:
                 try:
-                    msg = await dev.readline()
+                    lines = await readlines()
                 except OSError:
                     break
-                self._publish(dev, msg)
+                now = time.monotonic()
+                if verified:
+                    assert isinstance(dev, api.ValidatingDevice)
+                    counters.count_lines(lines, dev.received)
+                    self._count_rejected(counters, dev)
+                else:
+                    counters.count_lines(lines, now)
+                if now > deadline:
+                    # Waited for data long enough, start the new slice
+                    budget = INGEST_BUDGET_MESSAGES
+                    deadline = now + INGEST_BUDGET_TIME
+                for msg in lines:
+                    blocked = self._publish(dev, msg, verified)
+                    if blocked is not None:
+                        # Some consumers asked to wait until they catch up
+                        for stream, nmea in blocked:
+                            await stream._put_waiting(nmea)
+
+                    budget -= 1
+                    if input_seq != self._input_seq:
+                        # Let user input take precedence
+                        input_seq = self._input_seq
+                        for _ in range(INPUT_YIELD_ROUNDS):
+                            await asyncio.sleep(0)
+                    elif budget > 0 and (
+                        budget % INGEST_CLOCK_INTERVAL or time.monotonic() < deadline
+                    ):
+                        continue
+                    else:
+                        await asyncio.sleep(0)
+                    budget = INGEST_BUDGET_MESSAGES
+                    deadline = time.monotonic() + INGEST_BUDGET_TIME
         finally:
-            # Unregister the device
-            del self._devices[dev.id]
-            del self._handlers[dev.id]
+            if verified:
+                assert isinstance(dev, api.ValidatingDevice)
+                self._count_rejected(counters, dev)
 
-    def _publish(self, dev: api.Device, msg: bytes) -> None:
-        if not self._queues:
-            return
+    def _unregister(self, dev: api.Device, handler: "asyncio.Task[None]") -> None:
+        del self._devices[dev.id]
+        del self._handlers[dev.id]
+        self._forget_latest(dev.id)
+        self._emit(api.DeviceEventType.REMOVED, dev)
 
-        try:
-            nmea = parse_nmea(dev.id, msg)
-        except UnicodeDecodeError as e:
-            raise OSError from e
-        except InvalidNMEA:
-            return
+    def _count_rejected(
+        self, counters: "DeviceCounters", dev: api.ValidatingDevice
+    ) -> None:
+        invalid, decode_errors, dropped = dev.take_rejected()
+        counters.lines += invalid + decode_errors + dropped
+        counters.invalid += invalid
+        counters.decode_errors += decode_errors
+        counters.dropped += dropped
+
+    def _emit(self, evtype: api.DeviceEventType, dev: api.Device) -> None:
+        event = api.DeviceEvent(evtype, dev)
+        for stream in self._event_streams:
+            stream._put(event)
+
+    def _forget_latest(self, devid: str) -> None:
+        for key in [k for k in self._latest_by_device if k[0] == devid]:
+            del self._latest_by_device[key]
+        for datatype, nmea in self._latest.items():
+            if nmea is not None and nmea.device_id == devid:
+                self._latest[datatype] = None
+
+    def _publish(
+        self, dev: api.Device, msg: bytes, verified: bool = False
+    ) -> Optional[list[tuple[NMEAStreamImpl, api.NMEA]]]:
+        """Dispatch the message to the interested streams
+
+        Return the list of streams, that are full and want the device to wait
+        for them, together with the message to deliver. Checksum of `verified`
+        messages is not checked again.
+        """
+        counters = self._counters.get(dev.id)
+        if counters is None:
+            counters = self._counters[dev.id] = DeviceCounters()
+
+        if not msg.isascii():
+            # Binary garbage usually means wrong baud rate. Drop the device
+            # and let it reconnect.
+            counters.decode_errors += 1
+            raise OSError(f"Non-ascii data received from {dev.id}")
+
+        # Checksum is verified even if nobody is interested in the message,
+        # so that invalid lines are counted for every device.
+        end = _datatype_end(msg)
+        if end < 0 or not (verified or _verify_checksum(msg)):
+            if msg.strip():
+                counters.invalid += 1
+            return None
+        datatype = _intern_datatype(msg[1:end])
+        counters.count_datatype(datatype)
+
+        if not self._subscribers and not self._latest:
+            return None
+
+        streams = self._find_streams(dev.id, datatype)
+        tracked = datatype in self._latest
+        if not streams and not tracked:
+            # Nobody is interested, don't even parse
+            return None
+
+        nmea: api.NMEA = NMEAMessage(dev.id, msg, datatype, counters.last_seen)
+
+        if tracked:
+            self._update_latest(nmea)
+
+        blocked = None
+        for stream in streams:
+            if not stream._put(nmea):
+                if blocked is None:
+                    blocked = []
+                blocked.append((stream, nmea))
+        return blocked
+
+    def _update_latest(self, nmea: api.NMEA) -> None:
+        self._latest[nmea.datatype] = nmea
+        self._latest_by_device[(nmea.device_id, nmea.datatype)] = nmea
+        waiters = self._update_waiters.get(nmea.datatype)
+        if waiters:
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(nmea)
+            waiters.clear()
 
-        for q in self._queues:
-            if q.full():
-                q.get_nowait()
-            q.put_nowait(nmea)
+    def _find_streams(self, devid: str, datatype: str) -> list[NMEAStreamImpl]:
+        found = []
+        for key in (None, datatype):
+            for stream in self._subscribers.get(key, ()):
+                if stream.devices is None or devid in stream.devices:
+                    found.append(stream)
+        return found
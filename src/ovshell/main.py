@@ -24,6 +24,12 @@ parser.add_argument(
     required=False,
     help="Run in simulated mode (on provided root filesystem).",
 )
+parser.add_argument(
+    "--trace-latency",
+    action="store_true",
+    default=bool(os.environ.get("OVSHELL_TRACE_LATENCY")),
+    help="Record latencies of NMEA messages, delivered to consumers.",
+)
 parser.add_argument(
     "--run",
     metavar="APP",
@@ -111,17 +117,24 @@ def run(argv) -> None:
     asyncioloop = asyncio.get_event_loop()
     evl = urwid.AsyncioEventLoop(loop=asyncioloop)
 
+    def input_filter(keys, raw):
+        # Let devices, busy with incoming data, give way to user input
+        shell.devices.notify_input()
+        return debounce_esc(keys, raw)
+
     urwidloop = urwid.MainLoop(
         None,
         palette=palette,
         event_loop=evl,
-        input_filter=debounce_esc,
+        input_filter=input_filter,
         pop_ups=True,
     )
 
     screen = ScreenManagerImpl(urwidloop)
 
-    shell = OpenvarioShellImpl(screen, config=args.config, rootfs=args.sim)
+    shell = OpenvarioShellImpl(
+        screen, config=args.config, rootfs=args.sim, trace_latency=args.trace_latency
+    )
     shell.extensions.load_all(shell)
     shell.apps.install_new_apps()
 
@@ -2,6 +2,8 @@ import asyncio
 import os
 import subprocess
 import sys
+import time
+from datetime import datetime, timezone
 from typing import Optional
 
 from dbus_next.aio import MessageBus
@@ -72,6 +74,11 @@ class OpenVarioOSImpl(api.OpenVarioOS):
     def sync(self) -> None:
         os.sync()
 
+    async def set_system_time(self, dt: datetime) -> None:
+        # Set the clock in-process, without forking anything
+        timestamp = dt.replace(tzinfo=timezone.utc).timestamp()
+        time.clock_settime(time.CLOCK_REALTIME, timestamp)
+
     def shut_down(self) -> None:
         self.sync()
         subprocess.run(["systemctl", "poweroff"])
@@ -90,6 +97,13 @@ class OpenVarioOSSimulator(OpenVarioOSImpl):
         super().__init__()
         self._rootfs = rootfs
 
+    async def set_system_time(self, dt: datetime) -> None:
+        # Leave the host clock alone, run fake `date` from simulated rootfs
+        proc = await self.run(
+            "//bin/date", ["+%F %H:%M:%S", "-s", dt.strftime("%F %H:%M:%S.%f")]
+        )
+        await proc.wait()
+
     def path(self, fname: str) -> str:
         assert fname.startswith("/"), "Absolute path is required"
         if not fname.startswith("//"):
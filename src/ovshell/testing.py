@@ -2,6 +2,7 @@ import asyncio
 import os
 from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import datetime
 from typing import Any, Callable, Coroutine, Generator, Iterable, Iterator, Optional
 from typing import TypeVar
 
@@ -298,6 +299,9 @@ class OpenVarioOSStub(api.OpenVarioOS):
     def sync(self) -> None:
         self._log.append("OS: Sync")
 
+    async def set_system_time(self, dt: datetime) -> None:
+        self._log.append(f"OS: Set system time to {dt}")
+
     def shut_down(self) -> None:
         self._log.append("OS: Shut down")
 
@@ -331,9 +335,34 @@ class OpenVarioOSStub(api.OpenVarioOS):
 class NMEAStreamStub(api.NMEAStream):
     def __init__(self, nmeas: list[api.NMEA]) -> None:
         self._nmeas = list(reversed(nmeas))
+        self.stats = api.NMEAStreamStats()
 
     async def read(self) -> api.NMEA:
-        return self._nmeas.pop()
+        nmea = self._nmeas.pop()
+        self.stats.delivered += 1
+        return nmea
+
+    async def read_batch(
+        self, max_items: int = 100, max_latency: float = 0
+    ) -> list[api.NMEA]:
+        batch = [await self.read()]
+        while self._nmeas and len(batch) < max_items:
+            batch.append(await self.read())
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.read()
+
+
+class DeviceEventStreamStub(api.DeviceEventStream):
+    def __init__(self) -> None:
+        self._queue: "asyncio.Queue[api.DeviceEvent]" = asyncio.Queue()
+
+    async def read(self) -> api.DeviceEvent:
+        return await self._queue.get()
 
     def __aiter__(self):
         return self
@@ -345,28 +374,123 @@ class NMEAStreamStub(api.NMEAStream):
 class DeviceManagerStub(api.DeviceManager):
     _devices: list[api.Device]
     _nmeas: list[api.NMEA]
+    _stats: dict[str, api.DeviceStats]
+    _stream_stats: list[api.NMEAStreamStats]
+    _input_notified: int
 
     def __init__(self, log: list[str]) -> None:
         self._log = log
         self._devices = list()
         self._nmeas = list()
+        self._stats = {}
+        self._stream_stats = []
+        self._input_notified = 0
+        self._paused = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._event_streams: list[DeviceEventStreamStub] = []
 
     def register(self, device: api.Device) -> None:
         self._devices.append(device)
         self._log.append(f"Registered device {device.id}")
+        self._emit(api.DeviceEventType.REGISTERED, device)
 
     def enumerate(self) -> list[api.Device]:
         return self._devices
 
     @contextmanager
-    def open_nmea(self) -> Generator[api.NMEAStream, None, None]:
-        yield NMEAStreamStub(self._nmeas)
+    def open_nmea(
+        self,
+        datatypes: Optional[Iterable[str]] = None,
+        devices: Optional[Iterable[str]] = None,
+        policy: api.BackpressurePolicy = api.BackpressurePolicy.DROP_OLDEST,
+        maxsize: int = 100,
+        timeout: Optional[float] = 1.0,
+        trace_latency: Optional[bool] = None,
+    ) -> Generator[api.NMEAStream, None, None]:
+        nmeas = self._nmeas
+        if datatypes is not None:
+            dtset = set(datatypes)
+            nmeas = [n for n in nmeas if n.datatype in dtset]
+        if devices is not None:
+            devset = set(devices)
+            nmeas = [n for n in nmeas if n.device_id in devset]
+        yield NMEAStreamStub(nmeas)
+
+    def latest(
+        self, datatype: str, device_id: Optional[str] = None
+    ) -> Optional[api.NMEA]:
+        for nmea in reversed(self._nmeas):
+            if nmea.datatype != datatype:
+                continue
+            if device_id is None or nmea.device_id == device_id:
+                return nmea
+        return None
+
+    async def wait_for_update(
+        self, datatype: str, device_id: Optional[str] = None
+    ) -> api.NMEA:
+        nmea = self.latest(datatype, device_id)
+        assert nmea is not None, f"No {datatype} message stubbed"
+        return nmea
+
+    @contextmanager
+    def open_events(self) -> Generator[api.DeviceEventStream, None, None]:
+        stream = DeviceEventStreamStub()
+        self._event_streams.append(stream)
+        try:
+            yield stream
+        finally:
+            self._event_streams.remove(stream)
+
+    def stats(self, device_id: str) -> Optional[api.DeviceStats]:
+        return self._stats.get(device_id)
+
+    def stream_stats(self) -> list[api.NMEAStreamStats]:
+        return self._stream_stats
+
+    def notify_input(self) -> None:
+        self._input_notified += 1
+
+    @property
+    def paused(self) -> bool:
+        return self._paused.is_set()
+
+    async def pause(self) -> None:
+        self._paused.set()
+        self._resumed.clear()
+        self._log.append("Devices paused")
+
+    def resume(self) -> None:
+        self._paused.clear()
+        self._resumed.set()
+        self._log.append("Devices resumed")
+
+    async def wait_paused(self) -> None:
+        await self._paused.wait()
+
+    async def wait_resumed(self) -> dict[str, int]:
+        await self._resumed.wait()
+        return {}
+
+    def stub_set_stream_stats(self, stats: list[api.NMEAStreamStats]) -> None:
+        self._stream_stats = stats
+
+    def stub_set_stats(self, device_id: str, stats: api.DeviceStats) -> None:
+        self._stats[device_id] = stats
 
     def stub_add_nmea(self, nmeas: list[api.NMEA]) -> None:
         self._nmeas.extend(nmeas)
 
     def stub_remove_device(self, devid: str) -> None:
+        removed = [dev for dev in self._devices if dev.id == devid]
         self._devices = [dev for dev in self._devices if dev.id != devid]
+        for dev in removed:
+            self._emit(api.DeviceEventType.REMOVED, dev)
+
+    def _emit(self, evtype: api.DeviceEventType, dev: api.Device) -> None:
+        for stream in self._event_streams:
+            stream._queue.put_nowait(api.DeviceEvent(evtype, dev))
 
 
 class ProcessManagerStub(api.ProcessManager):
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import Optional
+
+import urwid
+
+from ovshell import api, widget
+
+DEVICES_REFRESH_INTERVAL = 1
+
+
+class DevicesApp(api.App):
+    name = "devices"
+    title = "Devices"
+    description = "Show connected devices and data they send"
+    priority = 5
+
+    def __init__(self, shell: api.OpenVarioShell) -> None:
+        self.shell = shell
+
+    def launch(self) -> None:
+        act = DevicesActivity(self.shell)
+        self.shell.screen.push_activity(act)
+
+
+class DevicesActivity(api.Activity):
+    def __init__(self, shell: api.OpenVarioShell) -> None:
+        self.shell = shell
+
+    def create(self) -> urwid.Widget:
+        header = widget.ActivityHeader("Devices")
+        self.devices = urwid.Pile([])
+        self.streams = urwid.Pile([])
+        return urwid.Filler(urwid.Pile([header, self.devices, self.streams]), "top")
+
+    def activate(self) -> None:
+        self.shell.screen.spawn_task(self, self._refresh_periodically())
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            self._refresh()
+            await asyncio.sleep(DEVICES_REFRESH_INTERVAL)
+
+    def _refresh(self) -> None:
+        self._refresh_devices()
+        self._refresh_streams()
+
+    def _refresh_devices(self) -> None:
+        devs = self.shell.devices.enumerate()
+        if not devs:
+            self.devices.contents = [
+                (urwid.Text("No devices connected"), ("pack", None))
+            ]
+            return
+
+        now = time.monotonic()
+        contents = []
+        for dev in sorted(devs, key=lambda d: d.name):
+            stats = self.shell.devices.stats(dev.id)
+            wdg = self._make_device_wdg(dev, stats, now)
+            contents.append((wdg, ("pack", None)))
+        self.devices.contents = contents
+
+    def _refresh_streams(self) -> None:
+        rows = []
+        for stats in self.shell.devices.stream_stats():
+            desc = f"{stats.delivered} delivered, {stats.dropped} dropped"
+            if stats.latency is not None and stats.latency.count:
+                desc += f", latency {stats.latency}"
+            rows.append((stats.name, desc))
+        if not rows:
+            self.streams.contents = []
+            return
+
+        title = urwid.Text(("highlight", "NMEA streams"))
+        self.streams.contents = [
+            (wdg, ("pack", None)) for wdg in [title] + _make_table(rows)
+        ]
+
+    def _make_device_wdg(
+        self, dev: api.Device, stats: Optional[api.DeviceStats], now: float
+    ) -> urwid.Widget:
+        title = urwid.Text([("highlight", dev.name), f" ({dev.id})"])
+        if stats is None:
+            return urwid.Pile([title, urwid.Text("No data"), urwid.Divider()])
+
+        if stats.last_seen is None:
+            last_seen = "never"
+        else:
+            last_seen = f"{now - stats.last_seen:.0f}s ago"
+
+        rows = [
+            (
+                "Rate",
+                f"{stats.lines_per_sec:.1f} lines/s, "
+                f"{stats.bytes_per_sec:.0f} bytes/s",
+            ),
+            ("Received", f"{stats.lines} lines, {stats.bytes} bytes"),
+            (
+                "Errors",
+                f"{stats.invalid} invalid, {stats.decode_errors} decode errors, "
+                f"{stats.dropped} dropped",
+            ),
+            ("Last seen", last_seen),
+        ]
+        rates = sorted(stats.datatype_rates.items())
+        if rates:
+            rows.append(
+                ("Sentences", ", ".join(f"{dt} {rate:.1f}/s" for dt, rate in rates))
+            )
+
+        return urwid.Pile([title] + _make_table(rows) + [urwid.Divider()])
+
+
+def _make_table(rows: list[tuple[str, str]]) -> list[urwid.Widget]:
+    return [
+        urwid.Columns(
+            [("weight", 1, urwid.Text(t)), ("weight", 3, urwid.Text(v))],
+            dividechars=1,
+        )
+        for t, v in rows
+    ]
@@ -1,27 +1,19 @@
-import asyncio
-
 from ovshell import api
 
-DEVICE_POLL_INTERVAL = 1
-
 
 async def show_device_indicators(shell: api.OpenVarioShell) -> None:
-    indicators: set[str] = set()
     screen = shell.screen
 
-    while True:
-        devs = shell.devices.enumerate()
-        # Update existing indicators
-        cur_indicators = set()
-        for dev in devs:
-            screen.set_indicator(dev.id, dev.name, api.IndicatorLocation.RIGHT, 0)
-            cur_indicators.add(dev.id)
+    with shell.devices.open_events() as events:
+        for dev in shell.devices.enumerate():
+            _show_indicator(screen, dev)
 
-        # Clear indicators for removed devices
-        removed = indicators - cur_indicators
-        for indid in removed:
-            screen.remove_indicator(indid)
+        async for event in events:
+            if event.type is api.DeviceEventType.REGISTERED:
+                _show_indicator(screen, event.device)
+            else:
+                screen.remove_indicator(event.device.id)
 
-        indicators = cur_indicators
 
-        await asyncio.sleep(DEVICE_POLL_INTERVAL)
+def _show_indicator(screen: api.ScreenManager, dev: api.Device) -> None:
+    screen.set_indicator(dev.id, dev.name, api.IndicatorLocation.RIGHT, 0)
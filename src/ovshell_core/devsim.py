@@ -1,31 +1,344 @@
 import asyncio
 import os
+import tty
+from dataclasses import dataclass, field
+from typing import NoReturn, Optional
 
 from ovshell import api
+from ovshell_core import serial
 
+# Delay between lines of replayed logs without time information
 SIM_READ_DELAY = 0.1
+# Delay before replay starts over
+SIM_LOOP_DELAY = 1.0
+# Most lines returned at once when replaying as fast as possible
+SIM_MAX_BATCH = 100
+# Number of lines to look for time information in
+SIM_TIMING_PROBE_LINES = 100
+HALF_DAY = 12 * 3600
+DAY = 24 * 3600
+
+# Simulated pseudo-terminals are linked as this device by default. Only
+# built-in serial ports are allowed, so serial device maintainer picks it up.
+SIM_PTY_NAME = "ttyS1"
+# Bytes per second, as on 115200 baud line with 8N1 encoding
+SIM_PTY_RATE = 11520
+# How often data is pushed into pseudo-terminal
+SIM_PTY_TICK = 0.05
+
+
+@dataclass
+class SimulationSpec:
+    """Simulated device, as configured in environment
+
+    Specification looks like `<filename>[,<option>=<value>...]`, multiple
+    specifications are separated by `;`.
+    """
+
+    filename: str
+    options: dict[str, str] = field(default_factory=dict)
+
+
+class NMEAReplay:
+    """Replay of recorded NMEA log, keeping its original timing
+
+    Timing is taken from receive timestamps, recorded in front of each line
+    (`<unix time> <sentence>`), or, if there are none, from RMC and GGA
+    sentences. Lines between two timestamps are returned together, when the
+    time of the first of them comes. Logs without any time information are
+    replayed at `SIM_READ_DELAY` per line.
+
+    Replay runs `speed` times faster than recorded. When `speed` is None, log
+    is replayed as fast as possible, in batches of `SIM_MAX_BATCH` lines.
+    The log is replayed in a loop.
+    """
+
+    def __init__(self, filename: str, speed: Optional[float] = 1.0) -> None:
+        self.filename = filename
+        self.speed = speed
+        self._file = open(filename, "rb")
+        self._timed = self._probe_timing()
+        self._next: Optional[tuple[Optional[float], bytes]] = None
+        # Log time and loop time replay was started at
+        self._origin: Optional[tuple[float, float]] = None
+        self._current: Optional[float] = None
+        self._day_offset = 0.0
+
+    async def readlines(self) -> list[bytes]:
+        lines: list[bytes] = []
+        while len(lines) < SIM_MAX_BATCH:
+            entry = self._peek()
+            if entry is None:
+                # EOF
+                if lines:
+                    break
+                self._rewind()
+                await self._sleep(SIM_LOOP_DELAY)
+                continue
+
+            stamp, line = entry
+            if not self._timed:
+                await self._sleep(SIM_READ_DELAY)
+                self._next = None
+                return [line]
+
+            if stamp is not None and stamp != self._current:
+                if self.speed is None:
+                    # Batches span timestamps, only size limits them
+                    self._current = stamp
+                elif lines:
+                    break
+                else:
+                    await self._wait_for(stamp)
+            self._next = None
+            lines.append(line)
+        if self.speed is None:
+            await asyncio.sleep(0)
+        return lines
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _peek(self) -> Optional[tuple[Optional[float], bytes]]:
+        if self._next is not None:
+            return self._next
+        raw = self._file.readline()
+        if not raw:
+            return None
+        stamp, line = _parse_replay_line(raw)
+        if stamp is not None:
+            stamp += self._day_offset
+            if self._current is not None and stamp < self._current - HALF_DAY:
+                # Sentence times wrap around at midnight
+                self._day_offset += DAY
+                stamp += DAY
+        self._next = (stamp, line)
+        return self._next
+
+    def _rewind(self) -> None:
+        self._file.seek(0)
+        self._next = None
+        self._origin = None
+        self._current = None
+        self._day_offset = 0.0
+
+    def _probe_timing(self) -> bool:
+        try:
+            for _, raw in zip(range(SIM_TIMING_PROBE_LINES), self._file):
+                if _parse_replay_line(raw)[0] is not None:
+                    return True
+            return False
+        finally:
+            self._file.seek(0)
+
+    async def _wait_for(self, stamp: float) -> None:
+        now = asyncio.get_running_loop().time()
+        if self._origin is None or self._current is None or stamp < self._current:
+            # Start of replay, or time went backwards: start counting anew
+            self._origin = (stamp, now)
+        else:
+            assert self.speed is not None
+            logstarted, started = self._origin
+            delay = started + (stamp - logstarted) / self.speed - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._current = stamp
+
+    async def _sleep(self, delay: float) -> None:
+        await asyncio.sleep(delay / self.speed if self.speed is not None else 0)
 
 
 class SimulatedDeviceImpl(api.Device):
-    def __init__(self, filename: str) -> None:
-        self.id = "sim"
+    def __init__(
+        self, filename: str, devid: str = "sim", speed: Optional[float] = 1.0
+    ) -> None:
+        self.id = devid
         self.name = os.path.basename(filename)
         self._filename = filename
-        self._file = open(self._filename, "rb")
+        self._replay = NMEAReplay(filename, speed)
+        self._buffer: list[bytes] = []
 
     async def readline(self) -> bytes:
-        await asyncio.sleep(SIM_READ_DELAY)
-        line = self._file.readline()
-        if not line:
-            # EOF
-            self._file.seek(0)
-            line = self._file.readline()
-        return line
+        while not self._buffer:
+            self._buffer = await self._replay.readlines()
+        return self._buffer.pop(0)
+
+    async def readlines(self) -> list[bytes]:
+        if self._buffer:
+            lines, self._buffer = self._buffer, []
+            return lines
+        return await self._replay.readlines()
 
     def write(self, data: bytes) -> None:
         raise NotImplementedError()  # pragma: nocover
 
 
-def run_simulated_device(shell: api.OpenVarioShell, filename: str) -> None:
-    dev = SimulatedDeviceImpl(filename)
+class SimulatedPty:
+    """Pseudo-terminal, streaming recorded NMEA at given byte rate
+
+    Slave end of pseudo-terminal is linked to `link_path`. When that is in
+    simulated `/dev`, it gets discovered, opened and read by serial device
+    maintainer, just like a real serial port.
+
+    Data is written without blocking. Whatever doesn't fit into terminal
+    buffer is lost, like it would be on a real serial line nobody reads.
+    """
+
+    def __init__(self, filename: str, link_path: str, rate: int) -> None:
+        self.filename = filename
+        self.link_path = link_path
+        self.rate = rate
+        self.written = 0
+        self.dropped = 0
+        self._master = -1
+        self._slave = -1
+
+    def open(self) -> None:
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        if os.path.islink(self.link_path):
+            os.unlink(self.link_path)
+        os.symlink(os.ttyname(self._slave), self.link_path)
+
+    def close(self) -> None:
+        if os.path.islink(self.link_path):
+            os.unlink(self.link_path)
+        for fd in (self._master, self._slave):
+            if fd >= 0:
+                os.close(fd)
+        self._master = self._slave = -1
+
+    async def run(self) -> NoReturn:
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        if not data:
+            raise ValueError(f"Simulation file {self.filename} is empty")
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sent = 0
+        pos = 0
+        while True:
+            await asyncio.sleep(SIM_PTY_TICK)
+            due = int((loop.time() - started) * self.rate) - sent
+            chunk, pos = _take_cyclic(data, pos, due)
+            sent += due
+            self._write(chunk)
+
+    def _write(self, chunk: bytes) -> None:
+        try:
+            written = os.write(self._master, chunk)
+        except BlockingIOError:
+            written = 0
+        self.written += written
+        self.dropped += len(chunk) - written
+
+
+def parse_simulation_specs(value: str) -> list[SimulationSpec]:
+    specs = []
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        filename, *opts = entry.split(",")
+        spec = SimulationSpec(filename.strip())
+        for opt in opts:
+            key, sep, val = opt.partition("=")
+            if not sep or not key.strip():
+                raise ValueError(f"Invalid simulation option: {opt!r}")
+            spec.options[key.strip()] = val.strip()
+        specs.append(spec)
+    return specs
+
+
+def run_simulated_device(
+    shell: api.OpenVarioShell,
+    filename: str,
+    devid: str = "sim",
+    speed: Optional[float] = 1.0,
+) -> None:
+    dev = SimulatedDeviceImpl(filename, devid, speed)
     shell.devices.register(dev)
+
+
+def run_simulated_devices(
+    shell: api.OpenVarioShell, specs: list[SimulationSpec]
+) -> None:
+    """Register simulated devices, replaying given logs
+
+    Devices are identified as `sim`, `sim2`, `sim3` and so on, unless `id`
+    option is given. `speed` option is a replay speed multiplier, or `max`
+    to replay as fast as possible.
+    """
+    for n, spec in enumerate(specs, start=1):
+        devid = spec.options.get("id", "sim" if n == 1 else f"sim{n}")
+        speed = _parse_speed(spec.options.get("speed", "1"))
+        run_simulated_device(shell, spec.filename, devid, speed)
+
+
+def run_simulated_pty(
+    shell: api.OpenVarioShell, spec: SimulationSpec
+) -> "asyncio.Task[NoReturn]":
+    name = spec.options.get("name", SIM_PTY_NAME)
+    devpath = f"//dev/{name}"
+    if devpath not in serial.BUILTIN_DEVICES:
+        # Pseudo-terminals are not listed by port lookup
+        raise ValueError(f"Simulated pseudo-terminal is not a built-in port: {name}")
+    rate = int(spec.options.get("rate", SIM_PTY_RATE))
+    pty = SimulatedPty(spec.filename, shell.os.path(devpath), rate)
+    pty.open()
+    return shell.processes.start(_run_pty(pty))
+
+
+async def _run_pty(pty: SimulatedPty) -> NoReturn:
+    try:
+        await pty.run()
+    finally:
+        pty.close()
+
+
+def _parse_speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError(f"Invalid replay speed: {value}")
+    return speed
+
+
+def _parse_replay_line(raw: bytes) -> tuple[Optional[float], bytes]:
+    """Split optional receive timestamp from the line
+
+    If there is no timestamp, time is taken from the sentence itself.
+    """
+    if raw[:1].isdigit():
+        stamp, _, line = raw.partition(b" ")
+        try:
+            return float(stamp), line
+        except ValueError:
+            return None, raw
+    return _sentence_time(raw), raw
+
+
+def _sentence_time(line: bytes) -> Optional[float]:
+    """Return time of day (in seconds) from RMC and GGA sentences"""
+    if line[:1] != b"$" or line[3:7] not in (b"RMC,", b"GGA,"):
+        return None
+    field = line[7:].split(b",", 1)[0]
+    if len(field) < 6:
+        return None
+    try:
+        return int(field[0:2]) * 3600 + int(field[2:4]) * 60 + float(field[4:])
+    except ValueError:
+        return None
+
+
+def _take_cyclic(data: bytes, pos: int, size: int) -> tuple[bytes, int]:
+    """Take `size` bytes of data from position `pos`, wrapping at the end"""
+    chunks = []
+    while size > 0:
+        chunk = data[pos : pos + size]
+        chunks.append(chunk)
+        size -= len(chunk)
+        pos = (pos + len(chunk)) % len(data)
+    return b"".join(chunks), pos
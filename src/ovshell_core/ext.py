@@ -2,8 +2,9 @@ import os
 from typing import Sequence
 
 from ovshell import api
-from ovshell_core import aboutapp, devindicators, devsim, gpstime, serial, settings
-from ovshell_core import setupapp, upgradeapp
+from ovshell_core import aboutapp, devicesapp, devindicators, devsim, gpstime
+from ovshell_core import ingestproc, loopmon, nmeaserver, serial, settings, setupapp
+from ovshell_core import upgradeapp
 
 
 class CoreExtension(api.Extension):
@@ -30,21 +31,38 @@ class CoreExtension(api.Extension):
             upgradeapp.SystemUpgradeApp(self.shell),
             setupapp.SetupApp(self.shell, self.id),
             aboutapp.AboutApp(self.shell),
+            devicesapp.DevicesApp(self.shell),
         ]
 
     def start(self) -> None:
-        self.shell.processes.start(serial.maintain_serial_devices(self.shell))
+        if self.shell.settings.get(ingestproc.INGEST_PROCESS_SETTING, bool):
+            self.shell.processes.start(ingestproc.run_ingest_process(self.shell))
+        else:
+            self.shell.processes.start(serial.maintain_serial_devices(self.shell))
+
+        if self.shell.settings.get(nmeaserver.NMEA_SERVER_SETTING, list):
+            self.shell.processes.start(nmeaserver.run_nmea_server(self.shell))
 
         gpsstate = gpstime.GPSTimeState()
         self.shell.processes.start(gpstime.gps_time_sync(self.shell, gpsstate))
         self.shell.processes.start(gpstime.clock_indicator(self.shell.screen, gpsstate))
 
-        simfile = os.environ.get("OVSHELL_CORE_SIMULATE_DEVICE")
-        if simfile:
-            devsim.run_simulated_device(self.shell, simfile)
+        simdevs = os.environ.get("OVSHELL_CORE_SIMULATE_DEVICE")
+        if simdevs:
+            specs = devsim.parse_simulation_specs(simdevs)
+            devsim.run_simulated_devices(self.shell, specs)
+
+        simptys = os.environ.get("OVSHELL_CORE_SIMULATE_PTY")
+        if simptys:
+            for spec in devsim.parse_simulation_specs(simptys):
+                devsim.run_simulated_pty(self.shell, spec)
 
         self.shell.processes.start(devindicators.show_device_indicators(self.shell))
 
+        looplog = os.environ.get("OVSHELL_CORE_LOOP_MONITOR")
+        if looplog:
+            self.shell.processes.start(loopmon.monitor_loop(self.shell.screen, looplog))
+
     def _init_settings(self) -> None:
         config = self.shell.settings
         config.setdefault("core.screen_orientation", "0")
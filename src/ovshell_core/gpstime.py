@@ -1,17 +1,44 @@
 import asyncio
-import subprocess
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from typing import Optional
 
 from ovshell import api
 
 TIME_OFF_TOLERANCE = 5  # seconds
-SETDATE_BINARY = "//bin/date"
-CLOCK_POLL_INTERVAL = 1
 
 
 class GPSTimeState:
-    acquired: bool = False
+    """Whether system time was set from GPS
+
+    Consumers can wait for the state to change with `wait_for_change()`.
+    """
+
+    def __init__(self) -> None:
+        self._acquired = False
+        self._changed = asyncio.Event()
+
+    @property
+    def acquired(self) -> bool:
+        return self._acquired
+
+    @acquired.setter
+    def acquired(self, value: bool) -> None:
+        if value != self._acquired:
+            self._acquired = value
+            self._changed.set()
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait for the state to change, for up to `timeout` seconds.
+
+        Return True if state has changed.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
 
 
 async def gps_time_sync(shell: api.OpenVarioShell, gpsstate: GPSTimeState) -> None:
@@ -22,24 +49,40 @@ async def gps_time_sync(shell: api.OpenVarioShell, gpsstate: GPSTimeState) -> No
 
     Be cautious, because there might be other services to sync time (e.g. NTP)
     around, and these should be trusted more than this naive sync.
+
+    Time the message spent in the queue since it was received is added to
+    GPS time.
     """
-    with shell.devices.open_nmea() as nmea_stream:
+    with shell.devices.open_nmea(datatypes=["GPRMC"]) as nmea_stream:
         async for nmea in nmea_stream:
             dt = parse_gps_datetime(nmea)
             if dt is not None:
-                set_system_time(dt, binpath=shell.os.path(SETDATE_BINARY))
+                if nmea.received is not None:
+                    dt += timedelta(seconds=time.monotonic() - nmea.received)
+                await set_system_time(shell.os, dt)
                 break
 
     gpsstate.acquired = True
 
 
 async def clock_indicator(screen: api.ScreenManager, gpsstate: GPSTimeState) -> None:
+    """Show current time on the top bar
+
+    Clock shows only hours and minutes, so it wakes up at the start of each
+    minute, or when GPS time gets acquired. Indicator is only updated when
+    it actually changes, to avoid needless screen redraws.
+    """
+    shown = None
     while True:
         now = datetime.utcnow()
         attr = "ind normal" if gpsstate.acquired else "ind error"
-        clock = now.strftime("%H:%M UTC")
-        screen.set_indicator("clock", (attr, clock), api.IndicatorLocation.LEFT, 0)
-        await asyncio.sleep(CLOCK_POLL_INTERVAL)
+        markup = (attr, now.strftime("%H:%M UTC"))
+        if markup != shown:
+            screen.set_indicator("clock", markup, api.IndicatorLocation.LEFT, 0)
+            shown = markup
+
+        till_next_minute = 60 - now.second - now.microsecond / 1e6
+        await gpsstate.wait_for_change(till_next_minute)
 
 
 def parse_gps_datetime(nmea: api.NMEA) -> Optional[datetime]:
@@ -48,7 +91,7 @@ def parse_gps_datetime(nmea: api.NMEA) -> Optional[datetime]:
 
     rawtime = nmea.fields[0]
     rawdate = nmea.fields[8]
-    if len(rawtime) not in (6, 9) or len(rawdate) != 6:
+    if len(rawtime) < 6 or len(rawdate) != 6:
         return None
 
     year2 = int(rawdate[4:6])
@@ -57,13 +100,16 @@ def parse_gps_datetime(nmea: api.NMEA) -> Optional[datetime]:
     hour = int(rawtime[0:2])
     minute = int(rawtime[2:4])
     second = int(rawtime[4:6])
+    # Fractional seconds, like "123519.25"
+    fraction = rawtime[6:]
+    microsecond = round(float(fraction) * 1e6) if len(fraction) > 1 else 0
 
     year4 = year2 + 1900 if year2 > 90 else year2 + 2000
-    return datetime(year4, month, day, hour, minute, second)
+    return datetime(year4, month, day, hour, minute, second, min(microsecond, 999999))
 
 
-def set_system_time(
-    dt: datetime, now: Optional[datetime] = None, binpath: str = "date"
+async def set_system_time(
+    ovos: api.OpenVarioOS, dt: datetime, now: Optional[datetime] = None
 ) -> bool:
     now = now or datetime.utcnow()
     delta = dt - now
@@ -72,6 +118,5 @@ def set_system_time(
         return False
 
     # Actually set time
-    cmd = [binpath, "+%F %H:%M:%S", "-s", dt.strftime("%F %H:%M:%S")]
-    subprocess.run(cmd, check=True, capture_output=True)
+    await ovos.set_system_time(dt)
     return True
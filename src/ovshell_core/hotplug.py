@@ -0,0 +1,117 @@
+import asyncio
+import ctypes
+import ctypes.util
+import functools
+import os
+from typing import Optional, Sequence
+
+# Constants from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ATTRIB
+
+# Device nodes get their permissions set by udev shortly after they appear.
+# Wait a bit for things to settle before reporting the change.
+HOTPLUG_SETTLE_DELAY = 0.1
+
+
+class HotplugWatcher:
+    """Watches directories for appearing and disappearing devices
+
+    Uses Linux inotify to get notified about changes in given directories
+    (typically, `/dev` and `/sys/class/tty`). If inotify is not available,
+    `active` is False and `wait()` simply sleeps, so callers can fall back to
+    polling.
+    """
+
+    active: bool = False
+
+    def __init__(self, dirs: Sequence[str]) -> None:
+        self._dirs = dirs
+        self._fd: Optional[int] = None
+        self._changed = asyncio.Event()
+
+    def start(self) -> bool:
+        """Start watching. Return True if inotify is available."""
+        fd = _inotify_init()
+        if fd is None:
+            return False
+
+        watched = 0
+        for d in self._dirs:
+            if _inotify_add_watch(fd, d, WATCH_MASK):
+                watched += 1
+
+        if not watched:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._on_readable)
+        self.active = True
+        return True
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self.active = False
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the change in watched directories.
+
+        Return True if change was detected, False if timeout expired.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        await asyncio.sleep(HOTPLUG_SETTLE_DELAY)
+        self._changed.clear()
+        return True
+
+    def _on_readable(self) -> None:
+        assert self._fd is not None
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._changed.set()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_libc() -> Optional[ctypes.CDLL]:
+    libname = ctypes.util.find_library("c")
+    if libname is None:
+        return None
+    try:
+        libc = ctypes.CDLL(libname, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+def _inotify_init() -> Optional[int]:
+    libc = _get_libc()
+    if libc is None:
+        return None
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    return fd if fd >= 0 else None
+
+
+def _inotify_add_watch(fd: int, path: str, mask: int) -> bool:
+    libc = _get_libc()
+    assert libc is not None
+    wd = libc.inotify_add_watch(fd, os.fsencode(path), ctypes.c_uint32(mask))
+    return wd >= 0
@@ -0,0 +1,578 @@
+import asyncio
+import enum
+import mmap
+import multiprocessing
+import os
+import signal
+import struct
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Any, Coroutine, NamedTuple, Optional, cast
+
+from ovshell import api
+from ovshell.device import DeviceManagerImpl, check_nmea
+from ovshell.settings import StoredSettingsImpl
+from ovshell_core import serial
+
+# Read serial ports in a separate process (see `IngestProcess`)
+INGEST_PROCESS_SETTING = "core.serial_ingest_process"
+# Delay before restarting ingest process, if it dies
+INGEST_RESTART_DELAY = 5
+RING_SLOTS = 4096
+RING_SLOT_SIZE = 128
+# How long consumer waits for the ring lock, before giving up on the ring
+# (producer might have died holding it)
+RING_LOCK_TIMEOUT = 0.1
+# Settings, ingest process needs to open serial ports
+WORKER_SETTINGS = [serial.BAUDRATES_SETTING, serial.PINNED_BAUDRATES_SETTING]
+
+# Published and claimed sequence numbers
+_HEADER = struct.Struct("<QQ")
+_HEADER_SIZE = 64
+# Kind, device index, payload length, device record counter, received time
+_SLOT = struct.Struct("<BBHId")
+MAX_PAYLOAD = RING_SLOT_SIZE - _SLOT.size
+
+
+class RecordKind(enum.IntEnum):
+    LINE = 1
+    INVALID = 2
+    DECODE_ERROR = 3
+
+
+class Record(NamedTuple):
+    kind: int
+    device: int
+    received: float
+    payload: bytes
+    # Number of records, put for the device before this one
+    counter: int = 0
+    # Sequence number of the record in the ring
+    seq: int = 0
+
+
+class NMEARing:
+    """Ring buffer of device records in shared memory
+
+    Single producer, single consumer. Memory is mapped before the producer
+    process is forked, so both processes share it. Slots are of fixed size.
+    Header holds two sequence numbers:
+
+    * published - all the slots before it are filled, updated by `publish()`;
+    * claimed - producer may be writing any slot before it. Producer claims
+      slots in chunks, before it starts overwriting them.
+
+    Consumer copies published records and then drops the ones, that might
+    have been overwritten meanwhile according to claimed sequence number.
+    Header is only accessed with process-shared lock held, which orders
+    slot writes and reads against header updates.
+
+    Producer never waits for the consumer: if consumer falls behind more than
+    the whole ring, oldest records are lost and counted in `dropped`.
+    """
+
+    def __init__(self, slots: int = RING_SLOTS) -> None:
+        self.slots = slots
+        self.dropped = 0
+        self._mem = mmap.mmap(-1, _HEADER_SIZE + slots * RING_SLOT_SIZE)
+        self._lock = multiprocessing.get_context("fork").Lock()
+        self._claim_chunk = max(1, slots // 16)
+        self._write_seq = 0
+        self._published = 0
+        self._claimed = 0
+        self._read_seq = 0
+
+    @property
+    def write_seq(self) -> int:
+        """Sequence number of the next record to put"""
+        return self._write_seq
+
+    @property
+    def read_seq(self) -> int:
+        """Sequence number of the next record to read"""
+        return self._read_seq
+
+    def put(
+        self,
+        kind: int,
+        device: int,
+        received: float,
+        payload: bytes,
+        counter: int = 0,
+    ) -> None:
+        assert len(payload) <= MAX_PAYLOAD
+        if self._write_seq >= self._claimed:
+            self._claimed = self._write_seq + self._claim_chunk
+            self._store_header()
+        offset = _HEADER_SIZE + self._write_seq % self.slots * RING_SLOT_SIZE
+        _SLOT.pack_into(
+            self._mem, offset, kind, device, len(payload), counter, received
+        )
+        start = offset + _SLOT.size
+        self._mem[start : start + len(payload)] = payload
+        self._write_seq += 1
+
+    def publish(self) -> None:
+        """Make all the records, put so far, available to the consumer"""
+        self._published = self._write_seq
+        self._store_header()
+
+    def read(self) -> list[Record]:
+        """Return all published records, not read yet"""
+        header = self._load_header()
+        if header is None:
+            return []
+        end, claimed = header
+        seq = max(self._read_seq, end - self.slots, claimed - self.slots)
+
+        mem = self._mem
+        records = []
+        for n in range(seq, end):
+            offset = _HEADER_SIZE + n % self.slots * RING_SLOT_SIZE
+            kind, device, length, counter, received = _SLOT.unpack_from(mem, offset)
+            start = offset + _SLOT.size
+            payload = mem[start : start + length]
+            records.append(Record(kind, device, received, payload, counter, n))
+
+        # Producer might have started overwriting oldest slots while we were
+        # reading them.
+        header = self._load_header()
+        if header is None:
+            records = []
+        else:
+            overwritten = header[1] - self.slots - seq
+            if overwritten > 0:
+                records = records[overwritten:]
+        self.dropped += end - self._read_seq - len(records)
+        self._read_seq = end
+        return records
+
+    def close(self) -> None:
+        self._mem.close()
+
+    def _store_header(self) -> None:
+        with self._lock:
+            _HEADER.pack_into(self._mem, 0, self._published, self._claimed)
+
+    def _load_header(self) -> Optional[tuple[int, int]]:
+        if not self._lock.acquire(timeout=RING_LOCK_TIMEOUT):
+            return None
+        try:
+            return _HEADER.unpack_from(self._mem, 0)
+        finally:
+            self._lock.release()
+
+
+class RingDeviceManager(DeviceManagerImpl):
+    """Device manager of the ingest process
+
+    Instead of dispatching lines to the streams, validates them and puts
+    them to the ring. Consumer is notified by writing to `notify_fd` once
+    per chunk of lines.
+
+    Device registrations and removals must not be lost with the overrun ring
+    records, so they are sent to `events` connection instead, tagged with
+    the ring sequence number they happened at.
+    """
+
+    def __init__(self, ring: NMEARing, notify_fd: int, events: Connection) -> None:
+        super().__init__()
+        self._ring = ring
+        self._notify_fd = notify_fd
+        self._events = events
+        self._indices: dict[str, int] = {}
+        # Counter of the next record of each device
+        self._records: dict[int, int] = {}
+        self._flush_scheduled = False
+
+    def register(self, device: api.Device) -> None:
+        if device.id in self._devices:
+            return
+        free = set(range(256)) - set(self._indices.values())
+        if not free:
+            # Ring records address devices by a single byte
+            raise serial.DeviceOpenError(device.id)
+        index = self._indices[device.id] = min(free)
+        self._records[index] = 0
+        baudrate = getattr(device, "baudrate", 0)
+        self._send_event("added", index, device.id, baudrate)
+        super().register(device)
+
+    def _emit(self, evtype: api.DeviceEventType, dev: api.Device) -> None:
+        if evtype is api.DeviceEventType.REMOVED:
+            self._send_event("removed", self._indices.pop(dev.id))
+        super()._emit(evtype, dev)
+
+    async def close_device(self, device_id: str) -> None:
+        """Stop reading the device and close it
+
+        Device is removed as usual, serial maintainer is free to open it
+        again.
+        """
+        dev = self._devices.get(device_id)
+        if dev is None:
+            return
+        handler = self._handlers[device_id]
+        handler.cancel()
+        await asyncio.wait([handler])
+        if isinstance(dev, api.SerialDevice):
+            await dev.close()
+
+    def _send_event(self, event: str, index: int, *args: Any) -> None:
+        try:
+            self._events.send((event, self._ring.write_seq, index, *args))
+        except OSError:
+            # Main process is gone, worker is about to stop
+            pass
+
+    def _publish(
+        self, dev: api.Device, msg: bytes, verified: bool = False
+    ) -> Optional[list]:
+        index = self._indices[dev.id]
+        received = self._counters[dev.id].last_seen or 0
+        if not msg.isascii():
+            self._put(RecordKind.DECODE_ERROR, index, received, b"")
+            raise OSError(f"Non-ascii data received from {dev.id}")
+
+        msg = msg.rstrip()
+        if len(msg) <= MAX_PAYLOAD and (verified or check_nmea(msg)):
+            self._put(RecordKind.LINE, index, received, msg)
+        elif msg:
+            self._put(RecordKind.INVALID, index, received, b"")
+        return None
+
+    def _put(self, kind: int, device: int, received: float, payload: bytes) -> None:
+        counter = self._records[device]
+        self._records[device] = (counter + 1) & 0xFFFFFFFF
+        self._ring.put(kind, device, received, payload, counter)
+        if not self._flush_scheduled:
+            # Publish everything, device reader puts before it yields
+            asyncio.get_running_loop().call_soon(self._flush)
+            self._flush_scheduled = True
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        self._ring.publish()
+        try:
+            os.write(self._notify_fd, b"\0")
+        except BlockingIOError:
+            # Consumer hasn't woken up yet
+            pass
+        except BrokenPipeError:
+            # Main process is gone, worker is about to stop
+            pass
+
+
+class WorkerSettings(StoredSettingsImpl):
+    """Snapshot of settings for the ingest process
+
+    Changes are never saved: the main process owns the settings file.
+    """
+
+    def save(self) -> None:
+        pass
+
+
+class _WorkerShell:
+    def __init__(
+        self,
+        os: api.OpenVarioOS,
+        settings: api.StoredSettings,
+        devices: api.DeviceManager,
+    ) -> None:
+        self.os = os
+        self.settings = settings
+        self.devices = devices
+
+
+class RingDevice(serial.HandoffDevice):
+    """Serial device, read by the ingest process"""
+
+    def __init__(self, dev_path: str, baudrate: int, ingest: "IngestProcess") -> None:
+        super().__init__(dev_path, baudrate)
+        self._ingest = ingest
+
+    def write(self, data: bytes) -> None:
+        self._ingest.write(self.id, data)
+
+    async def close(self) -> None:
+        if self._ingest.shell.devices.paused:
+            # Device manager releases all the ports, let the worker release
+            # them at once and stop opening new ones.
+            self._ingest.pause()
+        else:
+            self._ingest.close(self.id)
+        await self._wait_closed()
+
+
+class IngestProcess:
+    """Discovers, reads and validates serial devices in a separate process
+
+    Worker process is forked and runs the usual serial port maintenance.
+    Lines it reads are put to `NMEARing` in shared memory and the main
+    process is notified through the pipe. Main process registers `RingDevice`
+    for every device, opened by the worker, so `DeviceManager` works just
+    like with locally opened ports. Device registrations and removals come
+    over the command pipe, so they are never lost. Data, written to devices,
+    is sent to the worker through the same pipe, as well as requests to
+    close single devices and to pause and resume worker's device manager.
+    """
+
+    _process: "Optional[multiprocessing.process.BaseProcess]" = None
+
+    def __init__(self, shell: api.OpenVarioShell) -> None:
+        self.shell = shell
+        self._devices: dict[int, RingDevice] = {}
+        # Counter of the next record, expected from each device
+        self._counters: dict[int, int] = {}
+        # Device events, received ahead of their ring records
+        self._events: deque[tuple[Any, ...]] = deque()
+        self._paused = False
+
+    def start(self) -> None:
+        self._ring = NMEARing()
+        notify_r, notify_w = os.pipe()
+        os.set_blocking(notify_w, False)
+        self._commands, worker_commands = multiprocessing.Pipe()
+        settings = WorkerSettings(
+            {key: self.shell.settings.get(key, dict) for key in WORKER_SETTINGS}
+        )
+        ctx = multiprocessing.get_context("fork")
+        self._process = ctx.Process(
+            target=_run_worker,
+            args=(
+                self._ring,
+                notify_w,
+                worker_commands,
+                self.shell.os,
+                settings,
+                (notify_r, self._commands),
+            ),
+            name="ovshell-ingest",
+            daemon=True,
+        )
+        self._process.start()
+        os.close(notify_w)
+        worker_commands.close()
+
+        os.set_blocking(notify_r, False)
+        self._notify_fd = notify_r
+        loop = asyncio.get_running_loop()
+        loop.add_reader(notify_r, self._on_notify)
+        loop.add_reader(self._commands.fileno(), self._on_notify)
+        self._exited = loop.create_future()
+        loop.add_reader(self._process.sentinel, self._on_exit)
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self._notify_fd)
+        loop.remove_reader(self._commands.fileno())
+        loop.remove_reader(self._process.sentinel)
+        self._commands.close()
+        self._process.terminate()
+        self._process.join()
+        self._process = None
+        os.close(self._notify_fd)
+        self._ring.close()
+        for dev in self._devices.values():
+            dev.deliver([], 0, error=OSError(f"Device {dev.path} is closed"))
+        self._devices.clear()
+
+    async def wait(self) -> None:
+        """Wait until the worker process exits"""
+        await asyncio.shield(self._exited)
+
+    def write(self, device_id: str, data: bytes) -> None:
+        self._commands.send(("write", device_id, data))
+
+    def close(self, device_id: str) -> None:
+        """Make the worker close a single device"""
+        if self._process is None:
+            return
+        self._commands.send(("close", device_id))
+
+    def pause(self) -> None:
+        """Make the worker release the ports (see `DeviceManager.pause()`)"""
+        if self._process is None or self._paused:
+            return
+        self._paused = True
+        self._commands.send(("pause",))
+
+    def resume(self) -> None:
+        if self._process is None or not self._paused:
+            return
+        self._paused = False
+        self._commands.send(("resume",))
+
+    def _on_exit(self) -> None:
+        assert self._process is not None
+        asyncio.get_running_loop().remove_reader(self._process.sentinel)
+        if not self._exited.done():
+            self._exited.set_result(None)
+
+    def _on_notify(self) -> None:
+        try:
+            while os.read(self._notify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        # Every record is published after the event, that registers its
+        # device, so receive the events after reading the ring.
+        records = self._ring.read()
+        self._receive_events()
+
+        # Lines are handed over to each device once per notification
+        batches: dict[int, tuple[list[bytes], list[float], list[int]]] = {}
+        for rec in records:
+            self._apply_events(rec.seq, batches)
+            dev = self._devices.get(rec.device)
+            if dev is None:
+                continue
+            lines, received, rejected = batches.setdefault(
+                rec.device, ([], [rec.received], [0, 0, 0])
+            )
+            # Records of the device, lost with ring overrun
+            expected = self._counters[rec.device]
+            rejected[2] += (rec.counter - expected) & 0xFFFFFFFF
+            self._counters[rec.device] = (rec.counter + 1) & 0xFFFFFFFF
+            if rec.kind == RecordKind.LINE:
+                lines.append(rec.payload)
+            elif rec.kind == RecordKind.INVALID:
+                rejected[0] += 1
+            elif rec.kind == RecordKind.DECODE_ERROR:
+                rejected[1] += 1
+        self._apply_events(self._ring.read_seq, batches)
+
+        for index, (lines, received, rejected) in batches.items():
+            invalid, decode_errors, dropped = rejected
+            self._devices[index].deliver(
+                lines, received[0], invalid, decode_errors, dropped
+            )
+
+    def _receive_events(self) -> None:
+        try:
+            while self._commands.poll():
+                self._events.append(self._commands.recv())
+        except EOFError:
+            # Worker is gone, process sentinel takes care of the rest
+            asyncio.get_running_loop().remove_reader(self._commands.fileno())
+
+    def _apply_events(
+        self, seq: int, batches: dict[int, tuple[list[bytes], list[float], list[int]]]
+    ) -> None:
+        # Apply the events, that happened before the record `seq`
+        while self._events and self._events[0][1] <= seq:
+            event, _, index, *args = self._events.popleft()
+            if event == "added":
+                self._add_device(index, *args)
+            elif event == "removed":
+                dev = self._devices.pop(index)
+                lines, received, rejected = batches.pop(index, ([], [0], [0, 0, 0]))
+                invalid, decode_errors, dropped = rejected
+                error = OSError(f"Device {dev.path} is removed")
+                dev.deliver(lines, received[0], invalid, decode_errors, dropped, error)
+
+    def _add_device(self, index: int, path: str, baudrate: int) -> None:
+        dev = RingDevice(path, baudrate, self)
+        self._devices[index] = dev
+        self._counters[index] = 0
+        serial._remember_baudrate(self.shell.settings, dev)
+        self.shell.devices.register(dev)
+
+
+async def run_ingest_process(shell: api.OpenVarioShell) -> None:
+    """Service to read serial devices in a separate process
+
+    Worker process is restarted if it dies. While device manager is paused,
+    worker is paused too.
+    """
+    while True:
+        await shell.devices.wait_resumed()
+        ingest = IngestProcess(shell)
+        ingest.start()
+        following = asyncio.create_task(_follow_pause(shell.devices, ingest))
+        try:
+            await ingest.wait()
+        finally:
+            following.cancel()
+            ingest.stop()
+        await asyncio.sleep(INGEST_RESTART_DELAY)
+
+
+async def _follow_pause(devices: api.DeviceManager, ingest: IngestProcess) -> None:
+    while True:
+        await devices.wait_paused()
+        ingest.pause()
+        await devices.wait_resumed()
+        ingest.resume()
+
+
+def _run_worker(
+    ring: NMEARing,
+    notify_fd: int,
+    commands: Connection,
+    ovos: api.OpenVarioOS,
+    settings: WorkerSettings,
+    inherited: tuple[int, Connection],
+) -> None:
+    # Close main process ends of the pipes, so worker notices when main
+    # process is gone.
+    notify_r, main_commands = inherited
+    os.close(notify_r)
+    main_commands.close()
+    # Terminal interrupts are for the main process to handle
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(ring, notify_fd, commands, ovos, settings))
+
+
+async def _worker(
+    ring: NMEARing,
+    notify_fd: int,
+    commands: Connection,
+    ovos: api.OpenVarioOS,
+    settings: WorkerSettings,
+) -> None:
+    loop = asyncio.get_running_loop()
+    devman = RingDeviceManager(ring, notify_fd, commands)
+    shell = _WorkerShell(ovos, settings, devman)
+    stopped = loop.create_future()
+    # Pending pause and close commands
+    pending: set[asyncio.Task[None]] = set()
+
+    def spawn(coro: Coroutine[Any, Any, None]) -> None:
+        # Keep the reference until the ports are released
+        task = asyncio.create_task(coro)
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    def on_command() -> None:
+        try:
+            command, *args = commands.recv()
+        except EOFError:
+            # Main process is gone
+            loop.remove_reader(commands.fileno())
+            stopped.set_result(None)
+            return
+        if command == "pause":
+            spawn(devman.pause())
+        elif command == "close":
+            spawn(devman.close_device(*args))
+        elif command == "resume":
+            devman.resume()
+        elif command == "write":
+            device_id, data = args
+            dev = devman.get(device_id)
+            if dev is not None:
+                dev.write(data)
+
+    loop.add_reader(commands.fileno(), on_command)
+    maintainer = asyncio.create_task(
+        serial.maintain_serial_devices(cast(api.OpenVarioShell, shell))
+    )
+    try:
+        await stopped
+    finally:
+        maintainer.cancel()
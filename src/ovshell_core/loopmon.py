@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import inspect
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Optional, TextIO
+
+from ovshell import api
+
+# How often to measure the scheduling delay, seconds
+LOOP_LAG_INTERVAL = 0.1
+# Callbacks, running longer than that (in seconds), are reported as slow
+LOOP_SLOW_THRESHOLD = 0.05
+# How often to update the indicator and write the summary to the log
+LOOP_REPORT_INTERVAL = 10
+# Number of most recent slow callbacks to keep
+LOOP_SLOW_HISTORY = 50
+
+
+@dataclass
+class SlowCallback:
+    name: str
+    duration: float
+    # Wall clock time, when callback has finished
+    at: datetime
+
+
+class LoopMonitor:
+    """Measures event loop lag and catches slow callbacks
+
+    Lag is the delay between the time the monitor wants to wake up and the
+    time it actually does, sampled every `LOOP_LAG_INTERVAL` seconds.
+
+    While installed, every callback, run by asyncio (including steps of the
+    tasks), is timed, and the ones running longer than `LOOP_SLOW_THRESHOLD`
+    are recorded with the name of the callback or the task coroutine.
+
+    Log records are buffered and written out with the periodic report, so
+    the monitor doesn't stall the loop with file writes of its own.
+    """
+
+    _orig_run: Optional[Callable[[asyncio.Handle], None]] = None
+
+    def __init__(self, log: Optional[TextIO] = None) -> None:
+        self.lag = api.LatencyHistogram()
+        # Maximum lag since the last report
+        self.recent_lag = 0.0
+        self.slow: deque[SlowCallback] = deque(maxlen=LOOP_SLOW_HISTORY)
+        self.slow_counts: dict[str, int] = {}
+        self._log = log
+        self._pending: list[str] = []
+
+    def install(self) -> None:
+        assert self._orig_run is None, "Loop monitor is already installed"
+        orig_run = self._orig_run = asyncio.Handle._run
+        monitor = self
+
+        def _run(handle: asyncio.Handle) -> None:
+            started = time.monotonic()
+            orig_run(handle)
+            elapsed = time.monotonic() - started
+            if elapsed > LOOP_SLOW_THRESHOLD:
+                monitor._record_slow(callback_name(handle), elapsed)
+
+        asyncio.Handle._run = _run  # type: ignore[method-assign, assignment]
+
+    def uninstall(self) -> None:
+        if self._orig_run is None:
+            return
+        asyncio.Handle._run = self._orig_run  # type: ignore[method-assign, assignment]
+        self._orig_run = None
+
+    async def run(self, screen: api.ScreenManager) -> None:
+        shown = None
+        next_report = time.monotonic() + LOOP_REPORT_INTERVAL
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            now = time.monotonic()
+            lag = max(now - started - LOOP_LAG_INTERVAL, 0.0)
+            self.lag.record(lag)
+            self.recent_lag = max(self.recent_lag, lag)
+            if now < next_report:
+                continue
+
+            attr = "ind normal"
+            if self.recent_lag > LOOP_SLOW_THRESHOLD:
+                attr = "ind warning"
+            markup = (attr, f"Lag {self.recent_lag * 1000:.0f}ms")
+            if markup != shown:
+                screen.set_indicator("looplag", markup, api.IndicatorLocation.LEFT, 5)
+                shown = markup
+            self._write(
+                f"lag {self.lag}, max {self.recent_lag * 1000:.1f}ms; "
+                f"slow callbacks: {sum(self.slow_counts.values())}"
+            )
+            self.flush()
+            self.recent_lag = 0.0
+            next_report = now + LOOP_REPORT_INTERVAL
+
+    def _record_slow(self, name: str, duration: float) -> None:
+        self.slow.append(SlowCallback(name, duration, datetime.now()))
+        self.slow_counts[name] = self.slow_counts.get(name, 0) + 1
+        self._write(f"slow callback {name} took {duration * 1000:.1f}ms")
+
+    def flush(self) -> None:
+        """Write buffered records to the log"""
+        if self._log is None or not self._pending:
+            return
+        self._log.write("".join(self._pending))
+        self._log.flush()
+        self._pending.clear()
+
+    def _write(self, message: str) -> None:
+        if self._log is None:
+            return
+        now = datetime.now().isoformat(sep=" ", timespec="milliseconds")
+        self._pending.append(f"{now} {message}\n")
+
+
+def callback_name(handle: asyncio.Handle) -> str:
+    """Return human readable name of the callback, scheduled by the handle
+
+    For task steps, that is the qualified name of the task coroutine.
+    """
+    callback: Any = handle._callback  # type: ignore[attr-defined]
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return getattr(coro, "__qualname__", repr(coro))
+
+    while isinstance(callback, functools.partial):
+        callback = callback.func
+    callback = inspect.unwrap(callback)
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+async def monitor_loop(screen: api.ScreenManager, logfile: str) -> None:
+    """Service to monitor event loop, logging stalls to `logfile`"""
+    with open(logfile, "a") as log:
+        monitor = LoopMonitor(log)
+        monitor.install()
+        try:
+            await monitor.run(screen)
+        finally:
+            monitor.uninstall()
+            monitor.flush()
@@ -0,0 +1,215 @@
+"""Local NMEA server
+
+Re-publishes NMEA, read by the shell, to other programs on the same
+machine, so they don't have to open (and detect baud rate of) the serial
+ports themselves. Endpoints are configured with `core.nmea_server` setting,
+a list of strings like:
+
+    "tcp:4353"
+    "tcp:4354,device=/dev/ttyUSB0,policy=coalesce"
+    "pty:/dev/ttyNMEA0,datatypes=GPRMC+PGRMZ,maxsize=200"
+
+TCP endpoints listen on localhost and accept any number of clients.
+Pseudo-terminal endpoints link slave end of the terminal to given path and
+serve whoever opens it. Without "device", endpoint serves merged stream of
+all devices.
+
+Every client gets its own NMEA stream, bounded by "maxsize" messages, and
+"policy" decides what to drop when the client falls behind. Whatever client
+sends is written to the device of the endpoint (or to all devices for the
+merged stream).
+"""
+
+import asyncio
+import os
+import tty
+from dataclasses import dataclass
+from typing import Any, NoReturn, Optional
+
+from ovshell import api
+
+NMEA_SERVER_SETTING = "core.nmea_server"
+NMEA_SERVER_HOST = "127.0.0.1"
+# Default number of messages queued for each client
+CLIENT_QUEUE_SIZE = 100
+
+
+@dataclass
+class Endpoint:
+    # "tcp" or "pty"
+    kind: str
+    # Port number for TCP, link path for pseudo-terminal
+    address: str
+    device: Optional[str] = None
+    datatypes: Optional[list[str]] = None
+    policy: api.BackpressurePolicy = api.BackpressurePolicy.DROP_OLDEST
+    maxsize: int = CLIENT_QUEUE_SIZE
+
+
+class NMEAServer:
+    """Serves NMEA stream on a single endpoint"""
+
+    def __init__(self, devices: api.DeviceManager, endpoint: Endpoint) -> None:
+        self.devices = devices
+        self.endpoint = endpoint
+        self._server: Optional[asyncio.Server] = None
+        self._pty: Optional[tuple[int, int]] = None
+        self._clients: set[asyncio.Task[Any]] = set()
+
+    @property
+    def clients(self) -> int:
+        """Number of connected clients"""
+        return len(self._clients)
+
+    @property
+    def port(self) -> int:
+        """Port, TCP server is listening on"""
+        assert self._server is not None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        if self.endpoint.kind == "tcp":
+            self._server = await asyncio.start_server(
+                self._serve, NMEA_SERVER_HOST, int(self.endpoint.address)
+            )
+        else:
+            await self._start_pty()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in self._clients:
+            task.cancel()
+        if self._pty is not None:
+            if os.path.islink(self.endpoint.address):
+                os.unlink(self.endpoint.address)
+            # Master end is owned (and closed) by the transports
+            os.close(self._pty[1])
+            self._pty = None
+
+    async def _start_pty(self) -> None:
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        link = self.endpoint.address
+        if os.path.islink(link):
+            os.unlink(link)
+        os.symlink(os.ttyname(slave), link)
+        # Slave end is kept open, so that master neither gets hangup when
+        # client closes the terminal, nor errors before anyone opens it.
+        self._pty = (master, slave)
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader),
+            os.fdopen(master, "rb", buffering=0),
+        )
+        transport, protocol = await loop.connect_write_pipe(
+            lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()),
+            os.fdopen(os.dup(master), "wb", buffering=0),
+        )
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+        self._clients.add(asyncio.create_task(self._serve(reader, writer)))
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Don't buffer anything beyond the client stream, so that the drop
+        # policy applies as soon as client stops reading.
+        writer.transport.set_write_buffer_limits(high=0)
+        ep = self.endpoint
+        stream_cm = self.devices.open_nmea(
+            datatypes=ep.datatypes,
+            devices=None if ep.device is None else [ep.device],
+            policy=ep.policy,
+            maxsize=ep.maxsize,
+        )
+        task = asyncio.current_task()
+        assert task is not None
+        self._clients.add(task)
+        try:
+            with stream_cm as stream:
+                sending = asyncio.create_task(self._send(stream, writer))
+                try:
+                    await self._receive(reader)
+                finally:
+                    sending.cancel()
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    async def _send(self, stream: api.NMEAStream, writer: asyncio.StreamWriter) -> None:
+        try:
+            async for batch in stream.batches():
+                writer.write(
+                    b"".join(nmea.raw_message.encode() + b"\r\n" for nmea in batch)
+                )
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _receive(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            try:
+                line = await reader.readline()
+            except ConnectionError:
+                return
+            if not line:
+                return
+            for dev in self._targets():
+                try:
+                    dev.write(line)
+                except (NotImplementedError, OSError):
+                    # Device is read-only (e.g. simulated) or going away
+                    pass
+
+    def _targets(self) -> list[api.Device]:
+        devices = self.devices.enumerate()
+        if self.endpoint.device is None:
+            return devices
+        return [d for d in devices if d.id == self.endpoint.device]
+
+
+def parse_endpoints(config: list[Any]) -> list[Endpoint]:
+    endpoints = []
+    for entry in config:
+        if not isinstance(entry, str):
+            raise ValueError(f"Invalid NMEA server endpoint: {entry!r}")
+        address, *opts = entry.split(",")
+        kind, sep, address = address.partition(":")
+        if not sep or kind not in ("tcp", "pty") or not address:
+            raise ValueError(f"Invalid NMEA server endpoint: {entry!r}")
+        ep = Endpoint(kind, address)
+        for opt in opts:
+            key, sep, val = opt.partition("=")
+            if key == "device":
+                ep.device = val
+            elif key == "datatypes":
+                ep.datatypes = val.split("+")
+            elif key == "policy":
+                ep.policy = api.BackpressurePolicy(val)
+            elif key == "maxsize":
+                ep.maxsize = int(val)
+            else:
+                raise ValueError(f"Invalid NMEA server option: {opt!r}")
+        endpoints.append(ep)
+    return endpoints
+
+
+async def run_nmea_server(shell: api.OpenVarioShell) -> NoReturn:
+    config = shell.settings.get(NMEA_SERVER_SETTING, list) or []
+    servers = []
+    try:
+        for ep in parse_endpoints(config):
+            if ep.kind == "pty":
+                ep.address = shell.os.path(ep.address)
+            server = NMEAServer(shell.devices, ep)
+            await server.start()
+            servers.append(server)
+        # Serve until cancelled
+        forever: asyncio.Future[NoReturn] = asyncio.Future()
+        await forever
+    finally:
+        for server in servers:
+            server.close()
@@ -1,21 +1,52 @@
 import asyncio
+import collections
 import os
-from typing import NoReturn
+import queue
+import selectors
+import threading
+import time
+from typing import Any, Callable, Iterable, NamedTuple, NoReturn, Optional
 
 import serial
 from serial.tools.list_ports import comports
 from serial_asyncio import open_serial_connection
 
 from ovshell import api
+from ovshell.device import check_nmea
+from ovshell_core import hotplug
 
 DEVICE_OPEN_TIMEOUT = 1
 DEVICE_POLL_TIMEOUT = 1
+# With hotplug notifications available, serial ports are rescanned only this
+# often, just in case some notification was missed.
+DEVICE_RESCAN_INTERVAL = 60
 BAUD_DETECTION_INTERVAL = 0.2
+# Devices send data at least once per second. If nothing is received in
+# that time, port is considered silent.
+BAUD_PROBE_TIMEOUT = 2
+# Delays between attempts to open ports that fail or stay silent
+PROBE_BACKOFF_INITIAL = 2
+PROBE_BACKOFF_MAX = 120
+SYSFS_TTY_DIR = "//sys/class/tty"
+DEV_DIR = "//dev"
+READ_CHUNK_SIZE = 4096
+# Longest line to wait for. If there is no line break in that much data, it
+# is not NMEA.
+MAX_LINE_LENGTH = 4096
+# Most data to keep waiting for a slow port. Writes beyond that are dropped.
+MAX_WRITE_BUFFER = 65536
 
 # Built-in devices will not be detected by comports(), list those explicitly.
 BUILTIN_DEVICES = ["//dev/ttyS1", "//dev/ttyS2", "//dev/ttyS3"]
 STANDARD_BAUDRATES = [9600, 14400, 19200, 38400, 57600, 115200]
 
+# Baud rates, detected on each serial port. Tried first on next open.
+BAUDRATES_SETTING = "core.serial_baudrates"
+# Fixed baud rates for serial ports. Speed detection is skipped for these.
+PINNED_BAUDRATES_SETTING = "core.serial_pinned_baudrates"
+# Read serial ports in a dedicated thread (see `IngestThread`)
+INGEST_THREAD_SETTING = "core.serial_ingest_thread"
+
 
 class DeviceOpenError(Exception):
     def __init__(self, path: str) -> None:
@@ -26,6 +57,10 @@ class BaudRateNotDetected(DeviceOpenError):
     pass
 
 
+class DeviceSilent(DeviceOpenError):
+    pass
+
+
 class SerialDeviceImpl(api.SerialDevice):
     def __init__(
         self,
@@ -40,18 +75,54 @@ class SerialDeviceImpl(api.SerialDevice):
         self.baudrate = baudrate
         self._reader = reader
         self._writer = writer
+        self._pending = b""
 
     @staticmethod
-    async def open(dev_path: str) -> "SerialDeviceImpl":
-        for baudrate in STANDARD_BAUDRATES:
+    async def open(
+        dev_path: str, preferred: Optional[int] = None, pinned: Optional[int] = None
+    ) -> "SerialDeviceImpl":
+        """Open serial device and detect its baud rate
+
+        `preferred` baud rate, if given, is tried first. If `pinned` baud rate
+        is given, device is opened at that rate without any detection.
+        """
+        if pinned is not None:
+            try:
+                reader, writer = await open_serial_connection(
+                    url=str(dev_path), baudrate=pinned
+                )
+            except serial.SerialException as e:
+                raise DeviceOpenError(dev_path) from e
+            return SerialDeviceImpl(dev_path, reader, writer, pinned)
+
+        baudrates = STANDARD_BAUDRATES
+        if preferred is not None:
+            baudrates = [preferred] + [b for b in baudrates if b != preferred]
+
+        for baudrate in baudrates:
             try:
                 reader, writer = await open_serial_connection(
                     url=str(dev_path), baudrate=baudrate
                 )
-                data = await reader.readexactly(20)
             except serial.SerialException as e:
                 raise DeviceOpenError(dev_path) from e
 
+            try:
+                data = await asyncio.wait_for(
+                    reader.readexactly(20), BAUD_PROBE_TIMEOUT
+                )
+            except asyncio.TimeoutError as e:
+                # Nothing is sent, no matter what baud rate is set
+                writer.close()
+                raise DeviceSilent(dev_path) from e
+            except (serial.SerialException, asyncio.IncompleteReadError) as e:
+                writer.close()
+                raise DeviceOpenError(dev_path) from e
+            except asyncio.CancelledError:
+                # Port is needed by someone else (see DeviceManager.pause())
+                writer.close()
+                raise
+
             if _is_ascii(data):
                 return SerialDeviceImpl(dev_path, reader, writer, baudrate)
             else:
@@ -64,41 +135,610 @@ class SerialDeviceImpl(api.SerialDevice):
     async def readline(self) -> bytes:
         return await self._reader.readline()
 
+    async def readlines(self) -> list[bytes]:
+        data = self._pending
+        while True:
+            chunk = await self._reader.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise OSError(f"Device {self.path} is closed")
+            data += chunk
+            end = data.rfind(b"\n")
+            if end >= 0:
+                break
+            if len(data) > MAX_LINE_LENGTH:
+                data = b""
+
+        self._pending = data[end + 1 :]
+        return data[:end].splitlines()
+
     def write(self, data: bytes) -> None:
         self._writer.write(data)
 
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+class IngestBatch(NamedTuple):
+    device: "ThreadedSerialDevice"
+    lines: list[bytes]
+    invalid: int
+    decode_errors: int
+    received: float
+    error: Optional[OSError]
+
+
+class IngestThread:
+    """Reads serial ports in a dedicated thread
+
+    A single thread waits for data on all added ports with a selector, splits
+    it into lines and verifies NMEA checksums. Lines, read during one wake-up
+    of the thread, are handed over to the event loop in a single
+    `call_soon_threadsafe()` call, so event loop only dispatches ready lines
+    and busy event loop doesn't delay reading.
+
+    Writes are passed to the thread too, so that only the thread touches the
+    ports, and slow ports don't block the event loop.
+
+    Must be created from the event loop thread.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._selector = selectors.DefaultSelector()
+        self._commands: "queue.SimpleQueue[Callable[[], None]]" = queue.SimpleQueue()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._thread = threading.Thread(
+            target=self._run, name="serial-ingest", daemon=True
+        )
+        self._running = False
+
+    def start(self) -> None:
+        self._running = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread and close all the ports"""
+        if self._running:
+            self._call(self._stop)
+            self._thread.join()
+        self._selector.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+    def add(self, device: "ThreadedSerialDevice") -> None:
+        self._call(lambda: self._add(device))
+
+    def write(self, device: "ThreadedSerialDevice", data: bytes) -> None:
+        """Write the data to the device port, without waiting for it"""
+
+        def write() -> None:
+            if not device._port.is_open:
+                return
+            if len(device._outgoing) + len(data) > MAX_WRITE_BUFFER:
+                # Port doesn't keep up, nothing to do but drop the data
+                return
+            device._outgoing += data
+            batch = self._flush(device, time.monotonic())
+            if batch is not None:
+                self._loop.call_soon_threadsafe(_deliver, [batch])
+
+        self._call(write)
+
+    def remove(self, device: "ThreadedSerialDevice") -> None:
+        """Stop reading the device and close its port
+
+        Device gets an error, once the port is closed.
+        """
+
+        def remove() -> None:
+            self._remove(device)
+            error = OSError(f"Device {device.path} is closed")
+            batch = IngestBatch(device, [], 0, 0, time.monotonic(), error)
+            self._loop.call_soon_threadsafe(_deliver, [batch])
+
+        self._call(remove)
+
+    def _call(self, command: Callable[[], None]) -> None:
+        self._commands.put(command)
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            # Thread is going to wake up anyway
+            pass
+
+    def _run(self) -> None:
+        while self._running:
+            ready = self._selector.select()
+            received = time.monotonic()
+            batches = []
+            for key, events in ready:
+                if key.fd == self._wakeup_r:
+                    self._run_commands()
+                    continue
+                batch = None
+                if events & selectors.EVENT_WRITE:
+                    batch = self._flush(key.data, received)
+                if batch is None and events & selectors.EVENT_READ:
+                    batch = self._read(key.data, received)
+                if batch is not None:
+                    batches.append(batch)
+            if batches:
+                self._loop.call_soon_threadsafe(_deliver, batches)
+
+        # Let the readers of remaining devices know they are gone
+        batches = []
+        for key in list(self._selector.get_map().values()):
+            if key.fd != self._wakeup_r:
+                self._remove(key.data)
+                error = OSError(f"Device {key.data.path} is closed")
+                batches.append(IngestBatch(key.data, [], 0, 0, time.monotonic(), error))
+        if batches:
+            self._loop.call_soon_threadsafe(_deliver, batches)
+
+    def _run_commands(self) -> None:
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while not self._commands.empty():
+            self._commands.get()()
+
+    def _stop(self) -> None:
+        self._running = False
+
+    def _add(self, device: "ThreadedSerialDevice") -> None:
+        self._selector.register(device._port.fileno(), selectors.EVENT_READ, device)
+
+    def _remove(self, device: "ThreadedSerialDevice") -> None:
+        if device._port.is_open:
+            self._selector.unregister(device._port.fileno())
+            device._port.close()
+            device._outgoing.clear()
+
+    def _flush(
+        self, device: "ThreadedSerialDevice", received: float
+    ) -> Optional[IngestBatch]:
+        """Write out as much of pending data as port accepts"""
+        if not device._port.is_open:
+            return None
+        fd = device._port.fileno()
+        try:
+            written = os.write(fd, device._outgoing)
+        except BlockingIOError:
+            written = 0
+        except OSError as e:
+            self._remove(device)
+            return IngestBatch(device, [], 0, 0, received, e)
+        del device._outgoing[:written]
+        # Wait for the port to accept the rest
+        events = selectors.EVENT_READ
+        if device._outgoing:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(fd, events, device)
+        return None
+
+    def _read(
+        self, device: "ThreadedSerialDevice", received: float
+    ) -> Optional[IngestBatch]:
+        try:
+            chunk = os.read(device._port.fileno(), READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            self._remove(device)
+            return IngestBatch(device, [], 0, 0, received, e)
+        if not chunk:
+            self._remove(device)
+            error = OSError(f"Device {device.path} is closed")
+            return IngestBatch(device, [], 0, 0, received, error)
+
+        data = device._buffer + chunk
+        end = data.rfind(b"\n")
+        if end < 0:
+            device._buffer = data if len(data) <= MAX_LINE_LENGTH else b""
+            return None
+        device._buffer = data[end + 1 :]
+
+        lines: list[bytes] = []
+        invalid = 0
+        for line in data[:end].splitlines():
+            if not line.isascii():
+                # Binary garbage usually means wrong baud rate. Drop the
+                # device and let it reconnect.
+                self._remove(device)
+                error = OSError(f"Non-ascii data received from {device.path}")
+                return IngestBatch(device, lines, invalid, 1, received, error)
+            if check_nmea(line):
+                lines.append(line)
+            elif line.strip():
+                invalid += 1
+        return IngestBatch(device, lines, invalid, 0, received, None)
+
+
+def _deliver(batches: list[IngestBatch]) -> None:
+    for batch in batches:
+        batch.device.deliver(
+            batch.lines,
+            batch.received,
+            batch.invalid,
+            batch.decode_errors,
+            error=batch.error,
+        )
+
+
+class HandoffDevice(api.SerialDevice, api.ValidatingDevice):
+    """Serial device, read and validated outside of the event loop
+
+    Reading side hands lines over by calling `deliver()` on the event loop
+    thread.
+    """
+
+    received: float = 0
+
+    def __init__(self, dev_path: str, baudrate: int) -> None:
+        self.path = dev_path
+        self.id = dev_path
+        self.name = os.path.basename(dev_path)
+        self.baudrate = baudrate
+        # Lines, handed over to the event loop, but not yet read
+        self._lines: collections.deque[bytes] = collections.deque()
+        self._invalid = 0
+        self._decode_errors = 0
+        self._dropped = 0
+        self._error: Optional[OSError] = None
+        self._waiter: Optional[asyncio.Future[None]] = None
+
+    async def readline(self) -> bytes:
+        await self._wait()
+        return self._lines.popleft() + b"\r\n"
+
+    async def readlines(self) -> list[bytes]:
+        await self._wait()
+        lines = list(self._lines)
+        self._lines.clear()
+        return lines
+
+    def take_rejected(self) -> tuple[int, int, int]:
+        rejected = (self._invalid, self._decode_errors, self._dropped)
+        self._invalid = self._decode_errors = self._dropped = 0
+        return rejected
+
+    def deliver(
+        self,
+        lines: list[bytes],
+        received: float,
+        invalid: int = 0,
+        decode_errors: int = 0,
+        dropped: int = 0,
+        error: Optional[OSError] = None,
+    ) -> None:
+        """Hand over the lines, read at `received` time.
+
+        `dropped` counts the lines, lost on the way from the reading side.
+        If `error` is given, it is raised from `readlines()` once all the
+        lines are read.
+        """
+        if not self._lines:
+            self.received = received
+        self._lines.extend(lines)
+        self._invalid += invalid
+        self._decode_errors += decode_errors
+        self._dropped += dropped
+        if error is not None:
+            self._error = error
+        if self._waiter is not None:
+            self._waiter.set_result(None)
+            self._waiter = None
+
+    async def _wait_closed(self) -> None:
+        """Wait until the reading side reports an error, dropping the lines"""
+        try:
+            while True:
+                await self.readlines()
+        except OSError:
+            pass
+
+    async def _wait(self) -> None:
+        while not self._lines:
+            if self._error is not None:
+                raise self._error
+            # Device reader and `_wait_closed()` can wait at the same time
+            if self._waiter is None:
+                self._waiter = asyncio.get_running_loop().create_future()
+            await asyncio.shield(self._waiter)
+
+
+class ThreadedSerialDevice(HandoffDevice):
+    """Serial device, read by `IngestThread`"""
+
+    def __init__(
+        self, dev_path: str, port: serial.Serial, baudrate: int, ingest: IngestThread
+    ) -> None:
+        super().__init__(dev_path, baudrate)
+        self._port = port
+        self._ingest = ingest
+        # Incomplete line and data waiting to be written, owned by the
+        # ingest thread
+        self._buffer = b""
+        self._outgoing = bytearray()
+
+    @staticmethod
+    def open(
+        dev_path: str, baudrate: int, ingest: IngestThread
+    ) -> "ThreadedSerialDevice":
+        port = serial.Serial(dev_path, baudrate, timeout=0)
+        dev = ThreadedSerialDevice(dev_path, port, baudrate, ingest)
+        ingest.add(dev)
+        return dev
+
+    def write(self, data: bytes) -> None:
+        self._ingest.write(self, data)
+
+    async def close(self) -> None:
+        self._ingest.remove(self)
+        await self._wait_closed()
+
+
+class ProbeScheduler:
+    """Schedules attempts to open serial ports
+
+    Ports that fail to open or stay silent are retried with exponentially
+    growing delay. The delay is reset when the port's sysfs entry (or device
+    node) changes, which happens when device is re-plugged.
+    """
+
+    _failures: dict[str, int]
+    _next_probe: dict[str, float]
+    _signatures: dict[str, tuple]
+
+    def __init__(self, sysfs_dir: str) -> None:
+        self.sysfs_dir = sysfs_dir
+        self._failures = {}
+        self._next_probe = {}
+        self._signatures = {}
+
+    def is_due(self, path: str) -> bool:
+        if path not in self._next_probe:
+            return True
+        if self._signature(path) != self._signatures.get(path):
+            # Port has changed, give it a fresh start
+            self.reset(path)
+            return True
+        return time.monotonic() >= self._next_probe[path]
+
+    def failed(self, path: str) -> None:
+        failures = self._failures.get(path, 0)
+        delay = min(PROBE_BACKOFF_INITIAL * 2**failures, PROBE_BACKOFF_MAX)
+        self._failures[path] = failures + 1
+        self._next_probe[path] = time.monotonic() + delay
+        self._signatures[path] = self._signature(path)
+
+    def reset(self, path: str) -> None:
+        self._failures.pop(path, None)
+        self._next_probe.pop(path, None)
+        self._signatures.pop(path, None)
+
+    def next_probe(self) -> Optional[float]:
+        """Return the time (as in `time.monotonic()`) of the earliest retry"""
+        return min(self._next_probe.values(), default=None)
+
+    def retain(self, paths: Iterable[str]) -> None:
+        """Forget about all ports except the given ones"""
+        for path in set(self._next_probe) - set(paths):
+            self.reset(path)
+
+    def _signature(self, path: str) -> tuple:
+        sysfs_entry = os.path.join(self.sysfs_dir, os.path.basename(path))
+        return (_stat_signature(sysfs_entry), _stat_signature(path))
+
+
+def _stat_signature(path: str) -> Optional[tuple[int, int]]:
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_ctime_ns)
+
 
 async def maintain_serial_devices(shell: api.OpenVarioShell) -> NoReturn:
-    os_devs: set[str]
-    opening = {}
+    os_devs: set[str] = set()
+    opening: dict[str, asyncio.Task[api.SerialDevice]] = {}
     builtins = [shell.os.path(dev) for dev in BUILTIN_DEVICES]
-    while True:
-        os_devs = {d.device for d in comports(include_links=False)}
-        os_devs.update(d for d in builtins if os.path.exists(d))
+    scheduler = ProbeScheduler(shell.os.path(SYSFS_TTY_DIR))
+    watcher = hotplug.HotplugWatcher(
+        [shell.os.path(DEV_DIR), shell.os.path(SYSFS_TTY_DIR)]
+    )
+    watcher.start()
+    ingest = None
+    if shell.settings.get(INGEST_THREAD_SETTING, bool):
+        ingest = IngestThread()
+        ingest.start()
+    changed = True
+    last_scan = 0.0
+    try:
+        with shell.devices.open_events() as events:
+            while True:
+                if shell.devices.paused:
+                    released = await _suspend(shell, opening)
+                    # Reopen released ports at known baud rates right away
+                    for dp, baudrate in released.items():
+                        opening[dp] = asyncio.create_task(
+                            _open_device(shell.settings, dp, ingest, baudrate)
+                        )
+                    changed = True
+
+                now = time.monotonic()
+                if changed or now - last_scan >= DEVICE_RESCAN_INTERVAL:
+                    os_devs = {d.device for d in comports(include_links=False)}
+                    os_devs.update(d for d in builtins if os.path.exists(d))
+                    scheduler.retain(os_devs)
+                    last_scan = now
+
+                registered_devs = [
+                    d.path
+                    for d in shell.devices.enumerate()
+                    if isinstance(d, (SerialDeviceImpl, ThreadedSerialDevice))
+                ]
+
+                for dp in os_devs:
+                    if dp in opening or dp in registered_devs:
+                        continue
+                    if scheduler.is_due(dp):
+                        opening[dp] = asyncio.create_task(
+                            _open_device(shell.settings, dp, ingest)
+                        )
+
+                if opening:
+                    await _open_pending(shell, opening, scheduler)
+
+                if watcher.active:
+                    # Sleep until ports change, registered device disappears
+                    # (and needs reopening) or some port is due for retry.
+                    timeout = _next_wakeup(last_scan, scheduler, bool(opening))
+                    changed = await _wait_for_changes(
+                        watcher, events, shell.devices, timeout
+                    )
+                else:
+                    await asyncio.sleep(DEVICE_POLL_TIMEOUT)
+                    changed = True
+    finally:
+        watcher.close()
+        if ingest is not None:
+            ingest.stop()
+
+
+def _next_wakeup(last_scan: float, scheduler: ProbeScheduler, opening: bool) -> float:
+    now = time.monotonic()
+    timeout = last_scan + DEVICE_RESCAN_INTERVAL - now
+    next_probe = scheduler.next_probe()
+    if next_probe is not None:
+        timeout = min(timeout, next_probe - now)
+    if opening:
+        timeout = min(timeout, DEVICE_POLL_TIMEOUT)
+    return max(timeout, DEVICE_POLL_TIMEOUT)
+
+
+async def _wait_for_changes(
+    watcher: hotplug.HotplugWatcher,
+    events: api.DeviceEventStream,
+    devices: api.DeviceManager,
+    timeout: float,
+) -> bool:
+    """Wait for hotplug notification, device event or device manager pause.
 
-        registered_devs = [
-            d.path for d in shell.devices.enumerate() if isinstance(d, SerialDeviceImpl)
-        ]
+    Return True if ports have changed and need to be rescanned.
+    """
+    hotplugged = asyncio.ensure_future(watcher.wait(timeout))
+    device_event = asyncio.ensure_future(events.read())
+    paused = asyncio.ensure_future(devices.wait_paused())
+    try:
+        await asyncio.wait(
+            [hotplugged, device_event, paused], return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        hotplugged.cancel()
+        device_event.cancel()
+        paused.cancel()
+    return hotplugged.done() and not hotplugged.cancelled() and hotplugged.result()
 
-        for dp in os_devs:
-            if dp not in opening and dp not in registered_devs:
-                opening[dp] = asyncio.create_task(SerialDeviceImpl.open(dp))
 
-        if not opening:
-            await asyncio.sleep(DEVICE_POLL_TIMEOUT)
+async def _suspend(
+    shell: api.OpenVarioShell, opening: dict[str, "asyncio.Task[api.SerialDevice]"]
+) -> dict[str, int]:
+    """Abandon ports being opened and wait until device manager is resumed
+
+    Return baud rates of the ports, released by the pause.
+    """
+    for task in opening.values():
+        task.cancel()
+    if opening:
+        await asyncio.wait(opening.values())
+    opening.clear()
+    return await shell.devices.wait_resumed()
+
+
+async def _open_pending(
+    shell: api.OpenVarioShell,
+    opening: dict[str, "asyncio.Task[api.SerialDevice]"],
+    scheduler: ProbeScheduler,
+) -> None:
+    pending = asyncio.ensure_future(
+        asyncio.wait(opening.values(), timeout=DEVICE_OPEN_TIMEOUT)
+    )
+    paused = asyncio.ensure_future(shell.devices.wait_paused())
+    try:
+        await asyncio.wait([pending, paused], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        pending.cancel()
+        paused.cancel()
+    for dp, task in list(opening.items()):
+        if not task.done():
+            continue
+        del opening[dp]
+        try:
+            dev = task.result()
+        except DeviceOpenError:
+            scheduler.failed(dp)
             continue
+        if shell.devices.paused:
+            # Opened just before the pause, give it up
+            await dev.close()
+            continue
+        try:
+            shell.devices.register(dev)
+        except DeviceOpenError:
+            # Device manager can't take any more devices
+            await dev.close()
+            scheduler.failed(dp)
+            continue
+        scheduler.reset(dp)
+        _remember_baudrate(shell.settings, dev)
+
+
+async def _open_device(
+    settings: api.StoredSettings,
+    dev_path: str,
+    ingest: Optional[IngestThread] = None,
+    baudrate: Optional[int] = None,
+) -> api.SerialDevice:
+    """Open serial device, detecting its baud rate
+
+    If `baudrate` is given, device is opened at that rate without detection.
+    """
+    known = settings.get(BAUDRATES_SETTING, dict) or {}
+    pinned = settings.get(PINNED_BAUDRATES_SETTING, dict) or {}
+    if baudrate is None:
+        baudrate = _baudrate_or_none(pinned.get(dev_path))
+    dev = await SerialDeviceImpl.open(
+        dev_path, preferred=_baudrate_or_none(known.get(dev_path)), pinned=baudrate
+    )
+    if ingest is None:
+        return dev
+
+    # Baud rate is detected, reopen the port for the ingest thread
+    dev._writer.close()
+    await dev._writer.wait_closed()
+    try:
+        return ThreadedSerialDevice.open(dev_path, dev.baudrate, ingest)
+    except serial.SerialException as e:
+        raise DeviceOpenError(dev_path) from e
+
+
+def _remember_baudrate(settings: api.StoredSettings, dev: api.SerialDevice) -> None:
+    known = settings.get(BAUDRATES_SETTING, dict) or {}
+    if known.get(dev.path) == dev.baudrate:
+        return
+    known[dev.path] = dev.baudrate
+    settings.set(BAUDRATES_SETTING, known, save=True)
 
-        for task in asyncio.as_completed(opening.values(), timeout=DEVICE_OPEN_TIMEOUT):
-            try:
-                dev = await task
-                del opening[str(dev.path)]
-                shell.devices.register(dev)
-            except asyncio.TimeoutError:
-                break
-            except DeviceOpenError as e:
-                del opening[e.path]
 
-        await asyncio.sleep(DEVICE_POLL_TIMEOUT)
+def _baudrate_or_none(value: Any) -> Optional[int]:
+    return value if isinstance(value, int) and value > 0 else None
 
 
 def _is_ascii(data: bytes) -> bool:
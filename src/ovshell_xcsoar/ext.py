@@ -1,11 +1,18 @@
+import asyncio
 import os
-import subprocess
+from collections import deque
 from typing import Sequence
 
 import urwid
 
 from ovshell import api
 
+# Number of last lines of XCSoar error output to show, if it fails
+STDERR_TAIL_LINES = 50
+# Hand serial ports over to XCSoar while it runs. Disable, when XCSoar reads
+# devices some other way (e.g. through local NMEA server).
+SERIAL_HANDOFF_SETTING = "xcsoar.serial_handoff"
+
 
 class XCSoarExtension(api.Extension):
     title = "XCSoar"
@@ -31,6 +38,9 @@ class XCSoarApp(api.App):
         self.shell.apps.pin(appinfo)
 
     def launch(self) -> None:
+        self.shell.processes.start(self._run())
+
+    async def _run(self) -> None:
         env = self._prep_environment()
         cmdline = self._make_commandline()
         modal_opts = api.ModalOptions(
@@ -39,27 +49,32 @@ class XCSoarApp(api.App):
             valign="middle",
             height="pack",
         )
+        handoff = self.shell.settings.get(SERIAL_HANDOFF_SETTING, bool, True)
+        message = urwid.Text("Running XCSoar...")
+        self.shell.screen.push_dialog("XCSoar", message).no_buttons()
+        self.shell.screen.draw()
         try:
-            message = urwid.Text("Running XCSoar...")
-            self.shell.screen.push_dialog("XCSoar", message).no_buttons()
-            self.shell.screen.draw()
             try:
-                completed = subprocess.run(cmdline, capture_output=True, env=env)
+                if handoff:
+                    await self.shell.devices.pause()
+                with self.shell.screen.suspended():
+                    returncode, stderr = await run_app(cmdline, env)
             finally:
                 message.set_text("Finishing XCSoar...")
                 self.shell.screen.draw()
                 self.shell.os.sync()
                 self.shell.screen.pop_activity()
+                if handoff:
+                    self.shell.devices.resume()
         except FileNotFoundError as e:
             self.shell.screen.push_modal(
                 AppOutputActivity(self.shell, str(e)), modal_opts
             )
             return
 
-        if completed.returncode != 0:
+        if returncode != 0:
             self.shell.screen.push_modal(
-                AppOutputActivity(self.shell, completed.stderr.decode("utf-8")),
-                modal_opts,
+                AppOutputActivity(self.shell, stderr), modal_opts
             )
 
     def _prep_environment(self) -> dict[str, str]:
@@ -76,6 +91,37 @@ class XCSoarApp(api.App):
         return [binary, "-fly"]
 
 
+async def run_app(cmdline: Sequence[str], env: dict[str, str]) -> tuple[int, str]:
+    """Run external application, that takes over the screen
+
+    Event loop keeps running meanwhile. Only the last `STDERR_TAIL_LINES`
+    lines of error output are kept. Return exit code and the error output.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmdline,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+    )
+    assert proc.stderr is not None
+    tail: deque[bytes] = deque(maxlen=STDERR_TAIL_LINES)
+    try:
+        while True:
+            try:
+                line = await proc.stderr.readline()
+            except ValueError:
+                # Overly long line is skipped
+                continue
+            if not line:
+                break
+            tail.append(line)
+        returncode = await proc.wait()
+    except asyncio.CancelledError:
+        proc.terminate()
+        raise
+    return returncode, b"".join(tail).decode("utf-8", errors="replace")
+
+
 class AppOutputActivity(api.Activity):
     def __init__(self, shell: api.OpenVarioShell, message: str) -> None:
         self.shell = shell
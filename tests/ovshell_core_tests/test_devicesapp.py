@@ -0,0 +1,112 @@
+import asyncio
+
+from ovshell import api, testing
+from ovshell_core import devicesapp
+from tests.fixtures.urwid import UrwidMock
+
+
+class SampleDevice(api.Device):
+    def __init__(self, id: str, name: str) -> None:
+        self.id = id
+        self.name = name
+
+    async def readline(self) -> bytes:
+        return b""
+
+    def write(self, data: bytes) -> None:
+        pass
+
+
+class TestDevicesApp:
+    def test_launch(self, ovshell: testing.OpenVarioShellStub) -> None:
+        # GIVEN
+        app = devicesapp.DevicesApp(ovshell)
+
+        # WHEN
+        app.launch()
+
+        # THEN
+        act = ovshell.screen.stub_top_activity()
+        assert isinstance(act, devicesapp.DevicesActivity)
+
+
+class TestDevicesActivity:
+    async def test_no_devices(self, ovshell: testing.OpenVarioShellStub) -> None:
+        # GIVEN
+        urwid_mock = UrwidMock()
+        act = devicesapp.DevicesActivity(ovshell)
+        ovshell.screen.push_activity(act)
+
+        # WHEN
+        w = act.create()
+        act.activate()
+        await asyncio.sleep(0)
+
+        # THEN
+        rendered = urwid_mock.render(w)
+        assert "No devices connected" in rendered
+
+    async def test_device_stats(
+        self, ovshell: testing.OpenVarioShellStub, monkeypatch
+    ) -> None:
+        # GIVEN
+        monkeypatch.setattr("ovshell_core.devicesapp.DEVICES_REFRESH_INTERVAL", 0.01)
+        urwid_mock = UrwidMock()
+        ovshell.devices.register(SampleDevice("/dev/ttyS1", "ttyS1"))
+        ovshell.devices.register(SampleDevice("sim", "sim.nmea"))
+        act = devicesapp.DevicesActivity(ovshell)
+        ovshell.screen.push_activity(act)
+        w = act.create()
+        act.activate()
+        await asyncio.sleep(0)
+        rendered = urwid_mock.render(w)
+        assert "No data" in rendered
+
+        # WHEN
+        ovshell.devices.stub_set_stats(
+            "/dev/ttyS1",
+            api.DeviceStats(
+                lines=120,
+                bytes=4000,
+                invalid=3,
+                decode_errors=1,
+                dropped=5,
+                lines_per_sec=2,
+                bytes_per_sec=80,
+                datatype_rates={"PFLAU": 1, "GPRMC": 1},
+            ),
+        )
+        await asyncio.sleep(0.02)
+
+        # THEN
+        rendered = urwid_mock.render(w)
+        assert "ttyS1 (/dev/ttyS1)" in rendered
+        assert "2.0 lines/s, 80 bytes/s" in rendered
+        assert "3 invalid, 1 decode errors, 5 dropped" in rendered
+        assert "GPRMC 1.0/s, PFLAU 1.0/s" in rendered
+        assert "never" in rendered
+
+    async def test_stream_stats(self, ovshell: testing.OpenVarioShellStub) -> None:
+        # GIVEN
+        urwid_mock = UrwidMock()
+        latency = api.LatencyHistogram()
+        latency.record(0.002)
+        ovshell.devices.stub_set_stream_stats(
+            [
+                api.NMEAStreamStats(delivered=10, dropped=2, name="GPRMC"),
+                api.NMEAStreamStats(delivered=5, latency=latency, name="*"),
+            ]
+        )
+        act = devicesapp.DevicesActivity(ovshell)
+        ovshell.screen.push_activity(act)
+
+        # WHEN
+        w = act.create()
+        act.activate()
+        await asyncio.sleep(0)
+
+        # THEN
+        rendered = urwid_mock.render(w)
+        assert "NMEA streams" in rendered
+        assert "10 delivered, 2 dropped" in rendered
+        assert "5 delivered, 0 dropped, latency p50 2.0ms" in rendered
@@ -16,9 +16,8 @@ class SampleDevice(api.Device):
         pass
 
 
-async def test_nodevs(ovshell: testing.OpenVarioShellStub, monkeypatch) -> None:
+async def test_nodevs(ovshell: testing.OpenVarioShellStub) -> None:
     # GIVEN
-    monkeypatch.setattr("ovshell_core.devindicators.DEVICE_POLL_INTERVAL", 0.01)
 
     # WHEN
     task = asyncio.create_task(devindicators.show_device_indicators(ovshell))
@@ -32,9 +31,8 @@ async def test_nodevs(ovshell: testing.OpenVarioShellStub, monkeypatch) -> None:
     assert task.cancelled()
 
 
-async def test_dev_indicators(ovshell: testing.OpenVarioShellStub, monkeypatch) -> None:
+async def test_dev_indicators(ovshell: testing.OpenVarioShellStub) -> None:
     # GIVEN
-    monkeypatch.setattr("ovshell_core.devindicators.DEVICE_POLL_INTERVAL", 0.01)
     dev = SampleDevice("sample", "Sample")
     ovshell.devices.register(dev)
 
@@ -52,11 +50,8 @@ async def test_dev_indicators(ovshell: testing.OpenVarioShellStub, monkeypatch)
     assert task.cancelled()
 
 
-async def test_remove_indicators(
-    ovshell: testing.OpenVarioShellStub, monkeypatch
-) -> None:
+async def test_remove_indicators(ovshell: testing.OpenVarioShellStub) -> None:
     # GIVEN
-    monkeypatch.setattr("ovshell_core.devindicators.DEVICE_POLL_INTERVAL", 0.01)
     ovshell.devices.register(SampleDevice("sample1", "Sample 1"))
     ovshell.devices.register(SampleDevice("sample2", "Sample 2"))
 
@@ -66,13 +61,32 @@ async def test_remove_indicators(
 
     # WHEN
     ovshell.devices.stub_remove_device("sample1")
-    await asyncio.sleep(0.02)
+    await asyncio.sleep(0)
 
     # THEN
     assert len(ovshell.screen.stub_list_indicators()) == 1
-    ind = ovshell.screen.stub_get_indicator("sample")
+    ind = ovshell.screen.stub_get_indicator("sample1")
     assert ind is None
 
     task.cancel()
     await asyncio.sleep(0)
     assert task.cancelled()
+
+
+async def test_add_indicators(ovshell: testing.OpenVarioShellStub) -> None:
+    # GIVEN
+    task = asyncio.create_task(devindicators.show_device_indicators(ovshell))
+    await asyncio.sleep(0)
+    assert ovshell.screen.stub_list_indicators() == []
+
+    # WHEN
+    ovshell.devices.register(SampleDevice("sample", "Sample"))
+    await asyncio.sleep(0)
+
+    # THEN
+    ind = ovshell.screen.stub_get_indicator("sample")
+    assert ind is not None
+
+    task.cancel()
+    await asyncio.sleep(0)
+    assert task.cancelled()
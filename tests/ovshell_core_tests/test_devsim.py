@@ -1,5 +1,8 @@
+import asyncio
 import os
 
+import pytest
+
 from ovshell import testing
 from ovshell_core import devsim
 
@@ -25,6 +28,7 @@ async def test_SimulatedDeviceImpl_readline_infinite(
     # GIVEN
     samplefile = os.path.join(HERE, "samples", "sample.nmea")
     monkeypatch.setattr("ovshell_core.devsim.SIM_READ_DELAY", 0)
+    monkeypatch.setattr("ovshell_core.devsim.SIM_LOOP_DELAY", 0)
     dev = devsim.SimulatedDeviceImpl(samplefile)
 
     # WHEN
@@ -39,3 +43,205 @@ async def test_SimulatedDeviceImpl_readline_infinite(
     assert line1.startswith(b"$POV")
     assert line2.startswith(b"$GPRMC")
     assert line1 == line3
+
+
+async def test_run_simulated_devices(ovshell: testing.OpenVarioShellStub) -> None:
+    # GIVEN
+    samplefile = os.path.join(HERE, "samples", "sample.nmea")
+    specs = devsim.parse_simulation_specs(
+        f"{samplefile};{samplefile},speed=max;{samplefile},id=flarm,speed=10"
+    )
+
+    # WHEN
+    devsim.run_simulated_devices(ovshell, specs)
+
+    # THEN
+    devs = ovshell.devices.enumerate()
+    assert [d.id for d in devs] == ["sim", "sim2", "flarm"]
+
+
+def test_run_simulated_devices_bad_speed(
+    ovshell: testing.OpenVarioShellStub,
+) -> None:
+    specs = devsim.parse_simulation_specs("sample.nmea,speed=0")
+    with pytest.raises(ValueError):
+        devsim.run_simulated_devices(ovshell, specs)
+
+
+async def test_NMEAReplay_sentence_time(tmp_path, event_loop) -> None:
+    # GIVEN
+    log = tmp_path / "flight.nmea"
+    log.write_bytes(
+        b"$GPRMC,120000.00,A,4801.86153,N,01056.69289,E,,,270520,,,A*00\r\n"
+        b"$POV,E,-1.79*00\r\n"
+        b"$GPGGA,120000.00,4801.86153,N,01056.69289,E,1,08,,,M,,M,,*00\r\n"
+        b"$GPRMC,120001.00,A,4801.86153,N,01056.69289,E,,,270520,,,A*00\r\n"
+        b"$GPRMC,120002.50,A,4801.86153,N,01056.69289,E,,,270520,,,A*00\r\n"
+    )
+    replay = devsim.NMEAReplay(str(log), speed=10)
+
+    # WHEN
+    started = event_loop.time()
+    first = await replay.readlines()
+    second = await replay.readlines()
+    third = await replay.readlines()
+    elapsed = event_loop.time() - started
+
+    # THEN
+    # Lines, sent in the same second come together
+    assert [line[:6] for line in first] == [b"$GPRMC", b"$POV,E", b"$GPGGA"]
+    assert second[0].startswith(b"$GPRMC,120001")
+    assert third[0].startswith(b"$GPRMC,120002")
+    # 2.5 seconds of the log, replayed 10x faster
+    assert 0.25 <= elapsed < 0.4
+
+
+async def test_NMEAReplay_receive_timestamps(tmp_path, event_loop) -> None:
+    # GIVEN
+    log = tmp_path / "flight.nmea"
+    log.write_bytes(
+        b"1590581971.00 $POV,E,-1.79*00\r\n"
+        b"1590581971.00 $PGRMZ,1000,f,3*00\r\n"
+        b"1590581971.20 $POV,E,-1.80*00\r\n"
+    )
+    replay = devsim.NMEAReplay(str(log), speed=2)
+
+    # WHEN
+    started = event_loop.time()
+    first = await replay.readlines()
+    second = await replay.readlines()
+    elapsed = event_loop.time() - started
+
+    # THEN
+    # Timestamps are stripped from the lines
+    assert first == [b"$POV,E,-1.79*00\r\n", b"$PGRMZ,1000,f,3*00\r\n"]
+    assert second == [b"$POV,E,-1.80*00\r\n"]
+    assert 0.1 <= elapsed < 0.2
+
+
+async def test_NMEAReplay_midnight(tmp_path, event_loop) -> None:
+    # GIVEN
+    log = tmp_path / "flight.nmea"
+    log.write_bytes(
+        b"$GPRMC,235959.00,A,4801.86153,N,01056.69289,E,,,270520,,,A*00\r\n"
+        b"$GPRMC,000000.00,A,4801.86153,N,01056.69289,E,,,280520,,,A*00\r\n"
+    )
+    replay = devsim.NMEAReplay(str(log), speed=10)
+
+    # WHEN
+    started = event_loop.time()
+    await replay.readlines()
+    await replay.readlines()
+    elapsed = event_loop.time() - started
+
+    # THEN
+    assert 0.1 <= elapsed < 0.2
+
+
+async def test_NMEAReplay_max_speed(tmp_path, monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.devsim.SIM_MAX_BATCH", 3)
+    log = tmp_path / "flight.nmea"
+    log.write_bytes(
+        b"$GPRMC,120000.00,A,4801.86153,N,01056.69289,E,,,270520,,,A*00\r\n"
+        + b"$POV,E,-1.79*00\r\n" * 4
+        + b"$GPRMC,130000.00,A,4801.86153,N,01056.69289,E,,,270520,,,A*00\r\n"
+    )
+    replay = devsim.NMEAReplay(str(log), speed=None)
+
+    # WHEN
+    batches = [await replay.readlines() for _ in range(3)]
+
+    # THEN
+    # Hour of the log is replayed instantly, in full batches, regardless of
+    # timestamps. Then replay starts over.
+    assert [len(b) for b in batches] == [3, 3, 3]
+    assert batches[1][2].startswith(b"$GPRMC,130000")
+    assert batches[2][0].startswith(b"$GPRMC,120000")
+
+
+def test_parse_simulation_specs() -> None:
+    # WHEN
+    specs = devsim.parse_simulation_specs("one.nmea; two.nmea,name=ttyS2, rate=960;")
+
+    # THEN
+    assert specs == [
+        devsim.SimulationSpec("one.nmea"),
+        devsim.SimulationSpec("two.nmea", {"name": "ttyS2", "rate": "960"}),
+    ]
+
+
+def test_parse_simulation_specs_invalid() -> None:
+    with pytest.raises(ValueError):
+        devsim.parse_simulation_specs("one.nmea,rate")
+
+
+async def test_run_simulated_pty(
+    ovshell: testing.OpenVarioShellStub, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.devsim.SIM_PTY_TICK", 0.01)
+    os.mkdir(ovshell.os.path("//dev"))
+    samplefile = os.path.join(HERE, "samples", "sample.nmea")
+    spec = devsim.SimulationSpec(samplefile, {"name": "ttyS2", "rate": "10000"})
+
+    # WHEN
+    task = devsim.run_simulated_pty(ovshell, spec)
+    await asyncio.sleep(0.05)
+
+    # THEN
+    # Simulated device is linked into /dev and streams sample data
+    linkpath = ovshell.os.path("//dev/ttyS2")
+    assert os.path.islink(linkpath)
+    fd = os.open(linkpath, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        data = os.read(fd, 4096)
+    finally:
+        os.close(fd)
+    with open(samplefile, "rb") as f:
+        sample = f.read()
+    assert data.startswith(sample)
+
+    # Link is removed when simulation stops
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not os.path.exists(linkpath)
+
+
+def test_run_simulated_pty_not_builtin(ovshell: testing.OpenVarioShellStub) -> None:
+    # GIVEN
+    samplefile = os.path.join(HERE, "samples", "sample.nmea")
+    spec = devsim.SimulationSpec(samplefile, {"name": "ttyUSB0"})
+
+    # WHEN, THEN
+    # Serial device maintainer would never look at this device
+    with pytest.raises(ValueError):
+        devsim.run_simulated_pty(ovshell, spec)
+    assert not os.path.lexists(ovshell.os.path("//dev/ttyUSB0"))
+
+
+async def test_SimulatedPty_overflow(tmp_path, monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.devsim.SIM_PTY_TICK", 0.01)
+    samplefile = os.path.join(HERE, "samples", "sample.nmea")
+    pty = devsim.SimulatedPty(samplefile, str(tmp_path / "ttyS1"), 1000000)
+    pty.open()
+
+    # WHEN
+    # Nobody reads the data
+    task = asyncio.create_task(pty.run())
+    await asyncio.sleep(0.1)
+    task.cancel()
+    pty.close()
+
+    # THEN
+    assert pty.written > 0
+    assert pty.dropped > 0
+    assert not os.path.exists(tmp_path / "ttyS1")
+
+
+def test_take_cyclic() -> None:
+    assert devsim._take_cyclic(b"abc", 0, 2) == (b"ab", 2)
+    assert devsim._take_cyclic(b"abc", 2, 5) == (b"cabca", 1)
+    assert devsim._take_cyclic(b"abc", 1, 0) == (b"", 1)
@@ -1,7 +1,10 @@
 import asyncio
+import time
 from datetime import datetime
 from unittest import mock
 
+import pytest
+
 from ovshell import api, testing
 from ovshell_core import gpstime
 
@@ -13,7 +16,6 @@ async def test_clock_indicator(
     datetime_mock = mock.Mock()
     datetime_mock.utcnow.return_value = datetime(2020, 6, 2, 12, 32, 54)
     monkeypatch.setattr("ovshell_core.gpstime.datetime", datetime_mock)
-    monkeypatch.setattr("ovshell_core.gpstime.CLOCK_POLL_INTERVAL", 0.01)
     state = gpstime.GPSTimeState()
 
     # WHEN
@@ -26,7 +28,7 @@ async def test_clock_indicator(
     assert clockind.location == api.IndicatorLocation.LEFT
 
     state.acquired = True
-    await asyncio.sleep(0.02)
+    await asyncio.sleep(0.01)
     clockind = ovshell.screen.stub_get_indicator("clock")
     assert clockind is not None
     assert clockind.markup == ("ind normal", "12:32 UTC")
@@ -35,11 +37,60 @@ async def test_clock_indicator(
     task.cancel()
 
 
-async def test_gps_time_sync(ovshell: testing.OpenVarioShellStub, monkeypatch) -> None:
+async def test_clock_indicator_minute_aligned(
+    ovshell: testing.OpenVarioShellStub, monkeypatch
+) -> None:
     # GIVEN
-    subpr_mock = mock.Mock()
-    monkeypatch.setattr("ovshell_core.gpstime.subprocess", subpr_mock)
+    datetime_mock = mock.Mock()
+    datetime_mock.utcnow.return_value = datetime(2020, 6, 2, 12, 32, 59, 980000)
+    monkeypatch.setattr("ovshell_core.gpstime.datetime", datetime_mock)
+    set_indicator = mock.Mock(wraps=ovshell.screen.set_indicator)
+    monkeypatch.setattr(ovshell.screen, "set_indicator", set_indicator)
+    state = gpstime.GPSTimeState()
+    # Clock sleeps until the test wakes it up
+    timeouts: list[float] = []
+    wakeups: asyncio.Queue[None] = asyncio.Queue()
+
+    async def wait_for_change(timeout: float) -> bool:
+        timeouts.append(timeout)
+        await wakeups.get()
+        return False
+
+    monkeypatch.setattr(state, "wait_for_change", wait_for_change)
+
+    async def wake_up_at(now: datetime) -> None:
+        waits = len(timeouts)
+        datetime_mock.utcnow.return_value = now
+        wakeups.put_nowait(None)
+        while len(timeouts) == waits:
+            await asyncio.sleep(0)
+
+    # WHEN
+    task = asyncio.create_task(gpstime.clock_indicator(ovshell.screen, state))
+    await asyncio.sleep(0)
+    assert set_indicator.call_count == 1
+    # Clock sleeps until the start of next minute
+    assert timeouts == [pytest.approx(0.02)]
+
+    await wake_up_at(datetime(2020, 6, 2, 12, 33, 0, 1000))
+
+    # THEN
+    assert set_indicator.call_count == 2
+    clockind = ovshell.screen.stub_get_indicator("clock")
+    assert clockind is not None
+    assert clockind.markup == ("ind error", "12:33 UTC")
+    assert timeouts[-1] == pytest.approx(59.999)
+
+    # Nothing changes for the rest of the minute
+    await wake_up_at(datetime(2020, 6, 2, 12, 33, 30))
+    assert set_indicator.call_count == 2
+    assert timeouts[-1] == pytest.approx(30)
+
+    task.cancel()
+
 
+async def test_gps_time_sync(ovshell: testing.OpenVarioShellStub) -> None:
+    # GIVEN
     gprmc_fields = "225446,A,4916.45,N,12311.12,W,000.5,054.7,191194,020.3"
     ovshell.devices.stub_add_nmea(
         [
@@ -55,12 +106,25 @@ async def test_gps_time_sync(ovshell: testing.OpenVarioShellStub, monkeypatch) -
 
     # THEN
     assert state.acquired is True
-    datebin = ovshell.os.path("//bin/date")
-    subpr_mock.run.assert_called_with(
-        [datebin, "+%F %H:%M:%S", "-s", "1994-11-19 22:54:46"],
-        check=True,
-        capture_output=True,
+    assert ovshell.get_stub_log() == ["OS: Set system time to 1994-11-19 22:54:46"]
+
+
+async def test_gps_time_sync_latency(ovshell: testing.OpenVarioShellStub) -> None:
+    # GIVEN
+    # Message was received 1.5 seconds ago
+    gprmc_fields = "225446.25,A,4916.45,N,12311.12,W,000.5,054.7,191194,020.3"
+    received = time.monotonic() - 1.5
+    ovshell.devices.stub_add_nmea(
+        [api.NMEA("", "", "GPRMC", gprmc_fields.split(","), received)]
     )
+    state = gpstime.GPSTimeState()
+
+    # WHEN
+    await gpstime.gps_time_sync(ovshell, state)
+
+    # THEN
+    [logline] = ovshell.get_stub_log()
+    assert logline.startswith("OS: Set system time to 1994-11-19 22:54:47.75")
 
 
 def test_parse_gps_datetime_correct() -> None:
@@ -86,6 +150,17 @@ def test_parse_gps_datetime_longtime() -> None:
     assert dt == datetime(2020, 5, 27, 12, 19, 31)
 
 
+def test_parse_gps_datetime_fraction() -> None:
+    gprmc_fields = "121931.375,A,4801.86153,N,01056.69289,E,53.587,8.64,270520,,,A"
+    nmea = api.NMEA("", "", "GPRMC", gprmc_fields.split(","))
+
+    # WHEN
+    dt = gpstime.parse_gps_datetime(nmea)
+
+    # THEN
+    assert dt == datetime(2020, 5, 27, 12, 19, 31, 375000)
+
+
 def test_parse_gps_datetime_bad_sentence() -> None:
     # GIVEN
     gprmc_fields = "225446,A,4916.45,N,12311.12,W,000.5,054.7,191194,020.3"
@@ -110,22 +185,19 @@ def test_parse_gps_datetime_notime() -> None:
     assert dt is None
 
 
-def test_set_system_time_tolerable_offset() -> None:
+async def test_set_system_time_tolerable_offset(
+    ovshell: testing.OpenVarioShellStub,
+) -> None:
     newtime = datetime(2020, 5, 29, 1, 1, 2)
     now = datetime(2020, 5, 29, 1, 1, 1)
-    assert gpstime.set_system_time(newtime, now) is False
+    assert await gpstime.set_system_time(ovshell.os, newtime, now) is False
+    assert ovshell.get_stub_log() == []
 
 
-def test_set_system_time_now(monkeypatch) -> None:
+async def test_set_system_time_now(ovshell: testing.OpenVarioShellStub) -> None:
     # GIVEN
-    subpr_mock = mock.Mock()
-    monkeypatch.setattr("ovshell_core.gpstime.subprocess", subpr_mock)
     newtime = datetime(2003, 5, 29, 1, 1, 1)
 
     # WHEN, THEN
-    assert gpstime.set_system_time(newtime) is True
-    subpr_mock.run.assert_called_with(
-        ["date", "+%F %H:%M:%S", "-s", "2003-05-29 01:01:01"],
-        check=True,
-        capture_output=True,
-    )
+    assert await gpstime.set_system_time(ovshell.os, newtime) is True
+    assert ovshell.get_stub_log() == ["OS: Set system time to 2003-05-29 01:01:01"]
@@ -0,0 +1,46 @@
+import asyncio
+
+from ovshell_core import hotplug
+
+
+async def test_HotplugWatcher_create(tmp_path, monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.hotplug.HOTPLUG_SETTLE_DELAY", 0)
+    devdir = tmp_path / "dev"
+    devdir.mkdir()
+    watcher = hotplug.HotplugWatcher([str(devdir), str(tmp_path / "missing")])
+    assert watcher.start()
+    assert watcher.active
+
+    # WHEN, THEN
+    assert await watcher.wait(0.01) is False
+
+    (devdir / "ttyUSB0").touch()
+    assert await watcher.wait(1) is True
+
+    (devdir / "ttyUSB0").unlink()
+    assert await watcher.wait(1) is True
+    assert await watcher.wait(0.01) is False
+
+    watcher.close()
+    assert not watcher.active
+
+
+async def test_HotplugWatcher_no_dirs(tmp_path) -> None:
+    # GIVEN
+    watcher = hotplug.HotplugWatcher([str(tmp_path / "missing")])
+
+    # WHEN, THEN
+    assert watcher.start() is False
+    assert not watcher.active
+    watcher.close()
+
+
+async def test_HotplugWatcher_no_inotify(tmp_path, monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.hotplug._inotify_init", lambda: None)
+    watcher = hotplug.HotplugWatcher([str(tmp_path)])
+
+    # WHEN, THEN
+    assert watcher.start() is False
+    assert await watcher.wait(0.01) is False
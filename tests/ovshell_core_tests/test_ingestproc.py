@@ -0,0 +1,315 @@
+import asyncio
+import multiprocessing
+import os
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from ovshell import api, device, testing
+from ovshell_core import ingestproc, serial
+from ovshell_core.ingestproc import RecordKind
+
+
+class DeviceStub(api.Device):
+    def __init__(self, id: str, lines: list[bytes]) -> None:
+        self.id = id
+        self.name = id
+        self.baudrate = 9600
+        self._lines = lines
+
+    async def readline(self) -> bytes:
+        await asyncio.sleep(0)
+        if not self._lines:
+            raise OSError()
+        return self._lines.pop(0)
+
+    def write(self, data: bytes) -> None:
+        pass
+
+
+@pytest.fixture
+def pty_path() -> Iterator[tuple[int, str]]:
+    master, slave = os.openpty()
+    try:
+        yield master, os.ttyname(slave)
+    finally:
+        os.close(slave)
+        os.close(master)
+
+
+def test_NMEARing() -> None:
+    # GIVEN
+    ring = ingestproc.NMEARing(slots=4)
+    ring.put(RecordKind.INVALID, 1, 12, b"", 7)
+    ring.put(RecordKind.LINE, 1, 12.5, b"$PGRMZ,2,f,3*19", 8)
+    assert ring.read() == []
+
+    # WHEN
+    ring.publish()
+    records = ring.read()
+
+    # THEN
+    assert records == [
+        (RecordKind.INVALID, 1, 12, b"", 7, 0),
+        (RecordKind.LINE, 1, 12.5, b"$PGRMZ,2,f,3*19", 8, 1),
+    ]
+    assert ring.read() == []
+    assert ring.dropped == 0
+
+
+def test_NMEARing_overrun() -> None:
+    # GIVEN
+    ring = ingestproc.NMEARing(slots=4)
+
+    # WHEN
+    for n in range(6):
+        ring.put(RecordKind.LINE, 0, n, b"line%d" % n)
+    ring.publish()
+    records = ring.read()
+
+    # THEN
+    assert [r.payload for r in records] == [b"line2", b"line3", b"line4", b"line5"]
+    assert ring.dropped == 2
+
+
+def test_NMEARing_unpublished_overrun() -> None:
+    # GIVEN
+    ring = ingestproc.NMEARing(slots=8)
+    for n in range(5):
+        ring.put(RecordKind.LINE, 0, n, b"line%d" % n)
+    ring.publish()
+
+    # WHEN
+    # Producer goes on without publishing and reuses the oldest slots
+    for n in range(5, 10):
+        ring.put(RecordKind.LINE, 0, n, b"line%d" % n)
+    records = ring.read()
+
+    # THEN
+    # Published records in the reused slots are not returned
+    assert [r.payload for r in records] == [b"line2", b"line3", b"line4"]
+    assert ring.dropped == 2
+
+
+def test_NMEARing_overwritten_while_reading(monkeypatch) -> None:
+    # GIVEN
+    ring = ingestproc.NMEARing(slots=8)
+    for n in range(8):
+        ring.put(RecordKind.LINE, 0, n, b"line%d" % n)
+    ring.publish()
+    load_header = ring._load_header
+    loads = 0
+
+    def interleaved_load_header():
+        nonlocal loads
+        loads += 1
+        if loads == 2:
+            # Producer puts more records, while consumer copies the slots
+            for n in range(8, 11):
+                ring.put(RecordKind.LINE, 0, n, b"torn%d" % n)
+        return load_header()
+
+    monkeypatch.setattr(ring, "_load_header", interleaved_load_header)
+
+    # WHEN
+    records = ring.read()
+
+    # THEN
+    assert [r.payload for r in records] == [b"line%d" % n for n in range(3, 8)]
+    assert ring.dropped == 3
+
+
+async def test_RingDeviceManager() -> None:
+    # GIVEN
+    ring = ingestproc.NMEARing()
+    notify_r, notify_w = os.pipe()
+    events, worker_events = multiprocessing.Pipe()
+    devman = ingestproc.RingDeviceManager(ring, notify_w, worker_events)
+    dev = DeviceStub("/dev/ttyS1", [b"$PGRMZ,2,f,3*19\r\n", b"garbage\r\n", b"\r\n"])
+
+    # WHEN
+    with devman.open_events() as devevents:
+        devman.register(dev)
+        await devevents.read()
+        await devevents.read()
+    await asyncio.sleep(0)
+
+    # THEN
+    assert os.read(notify_r, 100)
+    records = ring.read()
+    assert [(r.kind, r.device, r.payload, r.counter) for r in records] == [
+        (RecordKind.LINE, 0, b"$PGRMZ,2,f,3*19", 0),
+        (RecordKind.INVALID, 0, b"", 1),
+    ]
+    assert records[0].received > 0
+    # Registrations and removals are sent along with ring position
+    assert events.recv() == ("added", 0, 0, "/dev/ttyS1", 9600)
+    assert events.recv() == ("removed", 2, 0)
+    assert not events.poll()
+    os.close(notify_r)
+    os.close(notify_w)
+
+
+def test_RingDeviceManager_full() -> None:
+    # GIVEN
+    ring = ingestproc.NMEARing()
+    notify_r, notify_w = os.pipe()
+    events, worker_events = multiprocessing.Pipe()
+    devman = ingestproc.RingDeviceManager(ring, notify_w, worker_events)
+    devman._indices = {f"/dev/tty{n}": n for n in range(256)}
+
+    # WHEN
+    with pytest.raises(serial.DeviceOpenError):
+        devman.register(DeviceStub("/dev/ttyS1", []))
+
+    # THEN
+    assert devman.enumerate() == []
+    assert not events.poll()
+    os.close(notify_r)
+    os.close(notify_w)
+
+
+async def test_IngestProcess_overrun(ovshell: testing.OpenVarioShellStub, monkeypatch):
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    monkeypatch.setattr(ovshell, "devices", devman)
+    ingest = ingestproc.IngestProcess(ovshell)
+    ingest._ring = ring = ingestproc.NMEARing(slots=4)
+    ingest._commands, worker_events = multiprocessing.Pipe()
+    notify_r, notify_w = os.pipe()
+    os.set_blocking(notify_r, False)
+    ingest._notify_fd = notify_r
+    worker = ingestproc.RingDeviceManager(ring, notify_w, worker_events)
+    dev = DeviceStub("/dev/ttyS1", [b"$PGRMZ,2,f,3*19\r\n"] * 10)
+
+    # WHEN
+    # Worker reads the whole device, before main process wakes up
+    with worker.open_events() as devevents:
+        worker.register(dev)
+        await devevents.read()
+        await devevents.read()
+    await asyncio.sleep(0)
+    with devman.open_events() as devevents:
+        ingest._on_notify()
+        added = await devevents.read()
+        removed = await devevents.read()
+
+    # THEN
+    # Lifecycle events survive the ring overrun, lost lines are counted
+    assert added.type == api.DeviceEventType.REGISTERED
+    assert removed.type == api.DeviceEventType.REMOVED
+    assert ring.dropped == 6
+    stats = devman.stats("/dev/ttyS1")
+    assert stats is not None
+    assert stats.lines == 10
+    assert stats.dropped == 6
+    os.close(notify_r)
+    os.close(notify_w)
+
+
+async def test_IngestProcess(
+    ovshell: testing.OpenVarioShellStub, monkeypatch, pty_path: tuple[int, str]
+) -> None:
+    # GIVEN
+    master, path = pty_path
+    # Worker process inherits patched port lookup
+    monkeypatch.setattr(
+        "ovshell_core.serial.comports", lambda include_links: [mock.Mock(device=path)]
+    )
+    ovshell.settings.set(serial.PINNED_BAUDRATES_SETTING, {path: 19200})
+    devman = device.DeviceManagerImpl()
+    monkeypatch.setattr(ovshell, "devices", devman)
+    ingest = ingestproc.IngestProcess(ovshell)
+
+    with devman.open_nmea() as stream:
+        # WHEN
+        ingest.start()
+        try:
+            nmea = None
+            for _ in range(100):
+                os.write(master, b"garbage\r\n$PGRMZ,2,f,3*19\r\n")
+                try:
+                    nmea = await asyncio.wait_for(stream.read(), 0.1)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+            # THEN
+            assert nmea is not None
+            assert nmea.raw_message == "$PGRMZ,2,f,3*19"
+            assert nmea.received is not None
+
+            dev = devman.get(path)
+            assert isinstance(dev, ingestproc.RingDevice)
+            assert dev.baudrate == 19200
+            stats = devman.stats(path)
+            assert stats is not None
+            assert stats.invalid >= 1
+
+            # Writes are passed to the worker
+            dev.write(b"hello")
+            await asyncio.sleep(0.1)
+            assert os.read(master, 100).endswith(b"hello")
+
+            # Pause is passed to the worker, that releases the ports
+            following = asyncio.create_task(ingestproc._follow_pause(devman, ingest))
+            await asyncio.wait_for(devman.pause(), 1)
+            assert devman.get(path) is None
+            devman.resume()
+            for _ in range(100):
+                if devman.get(path) is not None:
+                    break
+                await asyncio.sleep(0.01)
+            following.cancel()
+            dev = devman.get(path)
+            assert isinstance(dev, ingestproc.RingDevice)
+            assert dev.baudrate == 19200
+        finally:
+            ingest.stop()
+
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert devman.get(path) is None
+
+
+async def test_IngestProcess_close_device(
+    ovshell: testing.OpenVarioShellStub, monkeypatch, pty_path: tuple[int, str]
+) -> None:
+    # GIVEN
+    master1, path1 = pty_path
+    master2, slave2 = os.openpty()
+    path2 = os.ttyname(slave2)
+    monkeypatch.setattr(
+        "ovshell_core.serial.comports",
+        lambda include_links: [mock.Mock(device=path1), mock.Mock(device=path2)],
+    )
+    ovshell.settings.set(serial.PINNED_BAUDRATES_SETTING, {path1: 9600, path2: 9600})
+    devman = device.DeviceManagerImpl()
+    monkeypatch.setattr(ovshell, "devices", devman)
+    ingest = ingestproc.IngestProcess(ovshell)
+    ingest.start()
+    try:
+        for _ in range(100):
+            if devman.get(path1) and devman.get(path2):
+                break
+            await asyncio.sleep(0.01)
+        dev1 = devman.get(path1)
+        assert isinstance(dev1, ingestproc.RingDevice)
+
+        with devman.open_nmea(devices=[path2]) as stream:
+            # WHEN
+            await asyncio.wait_for(dev1.close(), 1)
+
+            # THEN
+            # Worker is not paused, other device keeps flowing
+            assert not ingest._paused
+            os.write(master2, b"$PGRMZ,2,f,3*19\r\n")
+            nmea = await asyncio.wait_for(stream.read(), 1)
+            assert nmea.device_id == path2
+    finally:
+        ingest.stop()
+        os.close(slave2)
+        os.close(master2)
+    for _ in range(10):
+        await asyncio.sleep(0)
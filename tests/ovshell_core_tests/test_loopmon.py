@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import io
+import time
+
+from ovshell import testing
+from ovshell_core import loopmon
+
+
+class ClockStub:
+    """Monotonic clock, that only moves when told to"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+clock = ClockStub()
+
+
+async def _block(duration: float) -> None:
+    clock.now += duration
+
+
+def _block_cb(duration: float) -> None:
+    clock.now += duration
+
+
+async def test_slow_callbacks(monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.loopmon.LOOP_SLOW_THRESHOLD", 0.01)
+    monkeypatch.setattr("ovshell_core.loopmon.time", clock)
+    log = io.StringIO()
+    monitor = loopmon.LoopMonitor(log)
+    monitor.install()
+
+    # WHEN
+    try:
+        await asyncio.create_task(_block(0.02))
+        asyncio.get_running_loop().call_soon(functools.partial(_block_cb, 0.03))
+        await asyncio.sleep(0)
+        # Fast callbacks are not reported
+        await asyncio.create_task(_block(0.005))
+    finally:
+        monitor.uninstall()
+    await asyncio.create_task(_block(0.02))
+
+    # THEN
+    assert [s.name for s in monitor.slow] == ["_block", "_block_cb"]
+    assert [round(s.duration, 3) for s in monitor.slow] == [0.02, 0.03]
+    assert monitor.slow_counts == {"_block": 1, "_block_cb": 1}
+    # Records are written out on flush only
+    assert log.getvalue() == ""
+    monitor.flush()
+    assert "slow callback _block took 20.0ms" in log.getvalue()
+    assert "slow callback _block_cb took 30.0ms" in log.getvalue()
+
+
+async def test_monitor_loop(
+    ovshell: testing.OpenVarioShellStub, monkeypatch, tmp_path
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.loopmon.LOOP_LAG_INTERVAL", 0.01)
+    monkeypatch.setattr("ovshell_core.loopmon.LOOP_SLOW_THRESHOLD", 0.05)
+    monkeypatch.setattr("ovshell_core.loopmon.LOOP_REPORT_INTERVAL", 0.1)
+    logfile = tmp_path / "loopmon.log"
+    orig_run = asyncio.Handle._run
+    task = asyncio.create_task(loopmon.monitor_loop(ovshell.screen, str(logfile)))
+    await asyncio.sleep(0.05)
+
+    # WHEN
+    time.sleep(0.1)
+    await asyncio.sleep(0.1)
+
+    # THEN
+    ind = ovshell.screen.stub_get_indicator("looplag")
+    assert ind is not None
+    assert ind.markup[0] == "ind warning"
+    assert "Lag " in ind.markup[1]
+
+    task.cancel()
+    await asyncio.sleep(0)
+    assert task.cancelled()
+    assert asyncio.Handle._run is orig_run
+
+    log = logfile.read_text()
+    assert "slow callback test_monitor_loop took" in log
+    assert "lag p50 " in log
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import socket
+
+import pytest
+
+from ovshell import api, device, testing
+from ovshell_core import nmeaserver
+from ovshell_core.nmeaserver import Endpoint
+
+
+class ReadOnlyDeviceStub(api.Device):
+    def __init__(self, id: str) -> None:
+        self.id = id
+        self.name = id
+
+    async def readline(self) -> bytes:
+        raise OSError()
+
+    def write(self, data: bytes) -> None:
+        raise NotImplementedError()
+
+
+class DeviceStub(api.Device):
+    def __init__(self, id: str) -> None:
+        self.id = id
+        self.name = id
+        self.written: list[bytes] = []
+        self.lines: asyncio.Queue[bytes] = asyncio.Queue()
+
+    async def readline(self) -> bytes:
+        line = await self.lines.get()
+        if not line:
+            raise OSError()
+        return line
+
+    def write(self, data: bytes) -> None:
+        self.written.append(data)
+
+
+def test_parse_endpoints() -> None:
+    # WHEN
+    endpoints = nmeaserver.parse_endpoints(
+        [
+            "tcp:4353",
+            "pty:/dev/ttyNMEA0,device=/dev/ttyS1,policy=coalesce",
+            "tcp:4354,datatypes=GPRMC+PGRMZ,maxsize=10",
+        ]
+    )
+
+    # THEN
+    assert endpoints == [
+        Endpoint("tcp", "4353"),
+        Endpoint(
+            "pty",
+            "/dev/ttyNMEA0",
+            device="/dev/ttyS1",
+            policy=api.BackpressurePolicy.COALESCE,
+        ),
+        Endpoint("tcp", "4354", datatypes=["GPRMC", "PGRMZ"], maxsize=10),
+    ]
+
+
+@pytest.mark.parametrize(
+    "config",
+    [[4353], ["4353"], ["udp:4353"], ["tcp:1,policy=bogus"], ["tcp:1,speed=2"]],
+)
+def test_parse_endpoints_invalid(config) -> None:
+    with pytest.raises(ValueError):
+        nmeaserver.parse_endpoints(config)
+
+
+async def test_NMEAServer_tcp() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev1 = DeviceStub("one")
+    dev2 = DeviceStub("two")
+    devman.register(dev1)
+    devman.register(dev2)
+    merged = nmeaserver.NMEAServer(devman, Endpoint("tcp", "0"))
+    single = nmeaserver.NMEAServer(devman, Endpoint("tcp", "0", device="two"))
+    await merged.start()
+    await single.start()
+
+    try:
+        mreader, mwriter = await asyncio.open_connection("127.0.0.1", merged.port)
+        sreader, swriter = await asyncio.open_connection("127.0.0.1", single.port)
+        while merged.clients + single.clients < 2:
+            await asyncio.sleep(0)
+
+        # WHEN
+        dev1.lines.put_nowait(b"$PGRMZ,2,f,3*19\r\n")
+        dev2.lines.put_nowait(b"$PGRMZ,3,f,3*18\r\n")
+
+        # THEN
+        assert await mreader.readline() == b"$PGRMZ,2,f,3*19\r\n"
+        assert await mreader.readline() == b"$PGRMZ,3,f,3*18\r\n"
+        assert await sreader.readline() == b"$PGRMZ,3,f,3*18\r\n"
+
+        # Client writes are passed to the devices of the endpoint
+        swriter.write(b"$PFLX0,LXWP0,1*3E\r\n")
+        mwriter.write(b"$PFLX2*6D\r\n")
+        await asyncio.sleep(0.05)
+        assert dev1.written == [b"$PFLX2*6D\r\n"]
+        assert dev2.written == [b"$PFLX0,LXWP0,1*3E\r\n", b"$PFLX2*6D\r\n"]
+
+        # Disconnected client closes its stream
+        mwriter.close()
+        while merged.clients:
+            await asyncio.sleep(0)
+        assert len(devman.stream_stats()) == 1
+        swriter.close()
+    finally:
+        merged.close()
+        single.close()
+        dev1.lines.put_nowait(b"")
+        dev2.lines.put_nowait(b"")
+        await asyncio.sleep(0)
+
+
+async def test_NMEAServer_readonly_device() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    readonly = ReadOnlyDeviceStub("sim")
+    dev = DeviceStub("one")
+    server = nmeaserver.NMEAServer(devman, Endpoint("tcp", "0"))
+    await server.start()
+
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        while not server.clients:
+            await asyncio.sleep(0)
+        devman.register(dev)
+        devman.register(readonly)
+
+        # WHEN
+        writer.write(b"$PFLX2*6D\r\n")
+        writer.write(b"$PFLX0,LXWP0,1*3E\r\n")
+        await asyncio.sleep(0.05)
+
+        # THEN
+        # Read-only device is skipped, client keeps being served
+        assert dev.written == [b"$PFLX2*6D\r\n", b"$PFLX0,LXWP0,1*3E\r\n"]
+        assert server.clients == 1
+        writer.close()
+    finally:
+        server.close()
+        dev.lines.put_nowait(b"")
+        await asyncio.sleep(0)
+
+
+async def test_NMEAServer_slow_client() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one")
+    devman.register(dev)
+    server = nmeaserver.NMEAServer(devman, Endpoint("tcp", "0", maxsize=5))
+    await server.start()
+
+    try:
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.connect(("127.0.0.1", server.port))
+        reader, writer = await asyncio.open_connection(sock=sock)
+        while not server.clients:
+            await asyncio.sleep(0)
+
+        # WHEN
+        # Client doesn't read anything, while device produces plenty
+        line = device.format_nmea("GPGGA," + "0" * 100).encode() + b"\r\n"
+        for _ in range(20000):
+            dev.lines.put_nowait(line)
+        while not dev.lines.empty():
+            await asyncio.sleep(0)
+
+        # THEN
+        [stats] = devman.stream_stats()
+        assert stats.dropped > 0
+        assert stats.peak_depth <= 5
+        writer.close()
+    finally:
+        server.close()
+        dev.lines.put_nowait(b"")
+        await asyncio.sleep(0)
+
+
+async def test_run_nmea_server_pty(
+    ovshell: testing.OpenVarioShellStub, monkeypatch, tmp_path
+) -> None:
+    # GIVEN
+    link = tmp_path / "ttyNMEA0"
+    devman = device.DeviceManagerImpl()
+    monkeypatch.setattr(ovshell, "devices", devman)
+    dev = DeviceStub("one")
+    devman.register(dev)
+    ovshell.settings.set(nmeaserver.NMEA_SERVER_SETTING, [f"pty:{link}"])
+    task = asyncio.create_task(nmeaserver.run_nmea_server(ovshell))
+    while not devman.stream_stats():
+        await asyncio.sleep(0.01)
+
+    # WHEN
+    fd = os.open(link, os.O_RDWR | os.O_NOCTTY)
+    try:
+        dev.lines.put_nowait(b"$PGRMZ,2,f,3*19\r\n")
+        os.write(fd, b"$PFLX2*6D\r\n")
+        await asyncio.sleep(0.05)
+
+        # THEN
+        assert os.read(fd, 100) == b"$PGRMZ,2,f,3*19\r\n"
+        assert dev.written == [b"$PFLX2*6D\r\n"]
+    finally:
+        os.close(fd)
+        task.cancel()
+        dev.lines.put_nowait(b"")
+        while devman.stream_stats():
+            await asyncio.sleep(0)
+
+    assert not link.exists()
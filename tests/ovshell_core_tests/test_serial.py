@@ -1,13 +1,14 @@
 import asyncio
+import os
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
-from typing import AsyncIterator, Coroutine, Optional
+from typing import AsyncIterator, Callable, Coroutine, Iterator, Optional
 from unittest import mock
 
 import pytest
 from serial import SerialException
 
-from ovshell import testing
+from ovshell import device, testing
 from ovshell_core import serial
 
 
@@ -30,12 +31,14 @@ class SerialConnecitionOpenerStub:
     def __init__(self) -> None:
         self.reader = mock.Mock(asyncio.StreamReader)
         self.writer = mock.Mock(asyncio.StreamWriter)
+        self.opened: list[tuple[str, int]] = []
 
     async def open_serial_connection(
         self, url: str, baudrate: int
     ) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
         if self.open_raises is not None:
             raise self.open_raises
+        self.opened.append((url, baudrate))
         return self.reader, self.writer
 
 
@@ -55,6 +58,7 @@ def serial_testbed(monkeypatch) -> SerialTestbed:
     monkeypatch.setattr("ovshell_core.serial.DEVICE_POLL_TIMEOUT", 0.01)
     monkeypatch.setattr("ovshell_core.serial.DEVICE_OPEN_TIMEOUT", 0.01)
     monkeypatch.setattr("ovshell_core.serial.BAUD_DETECTION_INTERVAL", 0)
+    monkeypatch.setattr("ovshell_core.serial.BAUD_PROBE_TIMEOUT", 0.01)
     monkeypatch.setattr(
         "ovshell_core.serial.open_serial_connection",
         serial_opener.open_serial_connection,
@@ -77,6 +81,20 @@ async def task_started(coro: Coroutine) -> AsyncIterator:
             pass
 
 
+async def until(predicate: Callable[[], bool], timeout: float = 1) -> None:
+    """Wait until the predicate comes true"""
+
+    async def poll() -> None:
+        while not predicate():
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def devices_registered(ovshell: testing.OpenVarioShellStub, n: int = 1):
+    return lambda: len(ovshell.devices.enumerate()) == n
+
+
 async def test_maintain_serial_devices_no_devs(
     ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed
 ) -> None:
@@ -114,8 +132,7 @@ async def test_maintain_serial_devices_reconnect(
     maintainer = serial.maintain_serial_devices(ovshell)
     async with task_started(maintainer):
         # Device is detected
-        await asyncio.sleep(0.02)
-        assert len(ovshell.devices.enumerate()) == 1
+        await until(devices_registered(ovshell))
 
         # ttyFAKE is gone
         ovshell.devices.stub_remove_device("/dev/ttyFAKE")
@@ -125,8 +142,7 @@ async def test_maintain_serial_devices_reconnect(
 
         # ttyFAKE reappears
         serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
-        await asyncio.sleep(0.02)
-        assert len(ovshell.devices.enumerate()) == 1
+        await until(devices_registered(ovshell))
 
 
 async def test_maintain_serial_devices_opened(
@@ -136,7 +152,7 @@ async def test_maintain_serial_devices_opened(
     maintainer = serial.maintain_serial_devices(ovshell)
     async with task_started(maintainer):
         # WHEN
-        await asyncio.sleep(0.01)
+        await until(devices_registered(ovshell))
 
     # THEN
     # One device registered
@@ -150,6 +166,285 @@ async def test_maintain_serial_devices_opened(
     assert dev.baudrate == 9600
 
 
+async def test_maintain_serial_devices_remember_baudrate(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed
+) -> None:
+    # GIVEN
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    serial_testbed.serial_opener.reader.readexactly.side_effect = [
+        b"\0" * 20,
+        b"X" * 20,
+    ]
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        # WHEN
+        await until(devices_registered(ovshell))
+
+    # THEN
+    assert ovshell.settings.get("core.serial_baudrates", dict) == {
+        "/dev/ttyFAKE": 14400
+    }
+
+
+async def test_maintain_serial_devices_known_baudrate(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed
+) -> None:
+    # GIVEN
+    ovshell.settings.set("core.serial_baudrates", {"/dev/ttyFAKE": 115200})
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        # WHEN
+        await until(devices_registered(ovshell))
+
+    # THEN
+    assert serial_testbed.serial_opener.opened == [("/dev/ttyFAKE", 115200)]
+    devs = ovshell.devices.enumerate()
+    assert len(devs) == 1
+    assert isinstance(devs[0], serial.SerialDeviceImpl)
+    assert devs[0].baudrate == 115200
+
+
+async def test_maintain_serial_devices_pinned_baudrate(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed
+) -> None:
+    # GIVEN
+    ovshell.settings.set("core.serial_pinned_baudrates", {"/dev/ttyFAKE": 38400})
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        # WHEN
+        await until(devices_registered(ovshell))
+
+    # THEN
+    assert serial_testbed.serial_opener.opened == [("/dev/ttyFAKE", 38400)]
+    assert not serial_testbed.serial_opener.reader.readexactly.called
+    devs = ovshell.devices.enumerate()
+    assert len(devs) == 1
+    assert isinstance(devs[0], serial.SerialDeviceImpl)
+    assert devs[0].baudrate == 38400
+
+
+async def test_maintain_serial_devices_backoff(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.serial.PROBE_BACKOFF_INITIAL", 10)
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    serial_testbed.serial_opener.open_raises = SerialException("File not found")
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        # WHEN
+        await asyncio.sleep(0.01)
+        serial_testbed.serial_opener.open_raises = None
+        await asyncio.sleep(0.05)
+
+    # THEN
+    # Device is not retried until backoff interval passes
+    assert len(ovshell.devices.enumerate()) == 0
+
+
+async def test_maintain_serial_devices_register_refused(
+    ovshell: testing.OpenVarioShellStub,
+    serial_testbed: SerialTestbed,
+    monkeypatch,
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.serial.PROBE_BACKOFF_INITIAL", 10)
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    register = mock.Mock(side_effect=serial.DeviceOpenError("/dev/ttyFAKE"))
+    monkeypatch.setattr(ovshell.devices, "register", register)
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        # WHEN
+        await until(lambda: register.called)
+        await asyncio.sleep(0.05)
+
+    # THEN
+    # Device is closed and not reopened until backoff interval passes
+    register.assert_called_once()
+    assert serial_testbed.serial_opener.opened == [("/dev/ttyFAKE", 9600)]
+    serial_testbed.serial_opener.writer.close.assert_called()
+
+
+async def test_maintain_serial_devices_hotplug(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.serial.DEVICE_POLL_TIMEOUT", 10)
+    monkeypatch.setattr("ovshell_core.hotplug.HOTPLUG_SETTLE_DELAY", 0)
+    devdir = ovshell.os.path("//dev")
+    os.mkdir(devdir)
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        await asyncio.sleep(0.01)
+        assert len(ovshell.devices.enumerate()) == 0
+
+        # WHEN
+        # Builtin device appears
+        with open(os.path.join(devdir, "ttyS1"), "w"):
+            pass
+        await until(devices_registered(ovshell))
+
+        # THEN
+        devs = ovshell.devices.enumerate()
+        assert devs[0].id == os.path.join(devdir, "ttyS1")
+
+
+async def test_maintain_serial_devices_reopen_on_removal(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.serial.DEVICE_POLL_TIMEOUT", 10)
+    os.mkdir(ovshell.os.path("//dev"))
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        await until(devices_registered(ovshell))
+
+        # WHEN
+        # Device is removed without any hotplug notification (e.g. on read
+        # error)
+        ovshell.devices.stub_remove_device("/dev/ttyFAKE")
+        await until(devices_registered(ovshell))
+
+        # THEN
+        # Maintainer wakes up and reopens it
+        assert len(serial_testbed.serial_opener.opened) == 2
+
+
+async def test_maintain_serial_devices_pause(
+    ovshell: testing.OpenVarioShellStub, serial_testbed: SerialTestbed, monkeypatch
+) -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    monkeypatch.setattr(ovshell, "devices", devman)
+    ovshell.settings.set(serial.BAUDRATES_SETTING, {"/dev/ttyFAKE": 57600})
+    serial_testbed.lookup.stub_set_devices(["/dev/ttyFAKE"])
+    opener = serial_testbed.serial_opener
+
+    async def no_data(n: int) -> bytes:
+        await asyncio.sleep(10)
+        return b""
+
+    opener.reader.read.side_effect = no_data
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        await until(lambda: bool(devman.enumerate()))
+        assert [d.id for d in devman.enumerate()] == ["/dev/ttyFAKE"]
+        assert len(opener.opened) == 1
+
+        # WHEN
+        await devman.pause()
+        await asyncio.sleep(0.05)
+
+        # THEN
+        # Port is closed and not reopened while paused
+        assert opener.writer.wait_closed.called
+        assert devman.enumerate() == []
+        assert len(opener.opened) == 1
+
+        # Port is reopened at the same baud rate, without detection
+        opener.reader.readexactly.reset_mock()
+        devman.resume()
+        await until(lambda: bool(devman.enumerate()))
+        assert [d.id for d in devman.enumerate()] == ["/dev/ttyFAKE"]
+        assert opener.opened[1:] == [("/dev/ttyFAKE", 57600)]
+        assert not opener.reader.readexactly.called
+
+        for dev in devman.enumerate():
+            devman._handlers[dev.id].cancel()
+        await asyncio.sleep(0)
+
+
+async def test_SerialDeviceImpl_silent(serial_testbed: SerialTestbed) -> None:
+    # GIVEN
+    async def silence(n: int) -> bytes:
+        await asyncio.sleep(10)
+        return b""
+
+    serial_testbed.serial_opener.reader.readexactly.side_effect = silence
+
+    # WHEN, THEN
+    with pytest.raises(serial.DeviceSilent):
+        await serial.SerialDeviceImpl.open("/dev/ttyFAKE")
+    # Only one baud rate was tried
+    assert len(serial_testbed.serial_opener.opened) == 1
+    assert serial_testbed.serial_opener.writer.close.called
+
+
+def test_ProbeScheduler_backoff(tmp_path, monkeypatch) -> None:
+    # GIVEN
+    now = 1000.0
+    monkeypatch.setattr("ovshell_core.serial.time.monotonic", lambda: now)
+    devpath = str(tmp_path / "ttyS2")
+    sched = serial.ProbeScheduler(str(tmp_path / "sys"))
+    assert sched.is_due(devpath)
+
+    # WHEN, THEN
+    sched.failed(devpath)
+    assert not sched.is_due(devpath)
+    now += 2
+    assert sched.is_due(devpath)
+
+    sched.failed(devpath)
+    now += 2
+    assert not sched.is_due(devpath)
+    now += 2
+    assert sched.is_due(devpath)
+
+    for _ in range(20):
+        sched.failed(devpath)
+    now += 119
+    assert not sched.is_due(devpath)
+    now += 1
+    assert sched.is_due(devpath)
+
+
+def test_ProbeScheduler_reset_on_change(tmp_path) -> None:
+    # GIVEN
+    devpath = tmp_path / "ttyUSB0"
+    sysfs = tmp_path / "sys"
+    sysfs.mkdir()
+    sched = serial.ProbeScheduler(str(sysfs))
+    sched.failed(str(devpath))
+    assert not sched.is_due(str(devpath))
+
+    # WHEN
+    # Device is plugged in
+    (sysfs / "ttyUSB0").mkdir()
+
+    # THEN
+    assert sched.is_due(str(devpath))
+
+
+def test_ProbeScheduler_retain(tmp_path) -> None:
+    sched = serial.ProbeScheduler(str(tmp_path))
+    sched.failed("/dev/ttyUSB0")
+    sched.failed("/dev/ttyUSB1")
+
+    sched.retain(["/dev/ttyUSB1"])
+
+    assert sched.is_due("/dev/ttyUSB0")
+    assert not sched.is_due("/dev/ttyUSB1")
+
+
+async def test_SerialDeviceImpl_baud_preferred(serial_testbed: SerialTestbed) -> None:
+    # GIVEN
+    serial_testbed.serial_opener.reader.readexactly.side_effect = [
+        b"\xff" * 20,
+        b"X" * 20,
+    ]
+
+    # WHEN
+    dev = await serial.SerialDeviceImpl.open("/dev/ttyFAKE", preferred=57600)
+
+    # THEN
+    # Preferred rate did not work, so we fall back to detection
+    assert dev.baudrate == 9600
+    assert [b for _, b in serial_testbed.serial_opener.opened] == [57600, 9600]
+
+
 async def test_SerialDeviceImpl_baud_autodetect(serial_testbed: SerialTestbed) -> None:
     # GIVEN
     serial_testbed.serial_opener.reader.readexactly.side_effect = [
@@ -196,6 +491,38 @@ async def test_SerialDeviceImpl_readline(serial_testbed: SerialTestbed) -> None:
     assert data == b"hello\r\n"
 
 
+async def test_SerialDeviceImpl_readlines(serial_testbed: SerialTestbed) -> None:
+    # GIVEN
+    dev = await serial.SerialDeviceImpl.open("/dev/ttyFAKE")
+    serial_testbed.serial_opener.reader.read.side_effect = [
+        b"one\r\ntwo\r\nthr",
+        b"ee",
+        b"\r\nfour",
+        b"",
+    ]
+
+    # WHEN, THEN
+    assert await dev.readlines() == [b"one", b"two"]
+    assert await dev.readlines() == [b"three"]
+    with pytest.raises(OSError):
+        await dev.readlines()
+
+
+async def test_SerialDeviceImpl_readlines_garbage(
+    serial_testbed: SerialTestbed, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_core.serial.MAX_LINE_LENGTH", 10)
+    dev = await serial.SerialDeviceImpl.open("/dev/ttyFAKE")
+    serial_testbed.serial_opener.reader.read.side_effect = [
+        b"garbage" * 2,
+        b"one\r\n",
+    ]
+
+    # WHEN, THEN
+    assert await dev.readlines() == [b"one"]
+
+
 async def test_SerialDeviceImpl_write(serial_testbed: SerialTestbed) -> None:
     # GIVEN
     dev = await serial.SerialDeviceImpl.open("/dev/ttyFAKE")
@@ -205,3 +532,127 @@ async def test_SerialDeviceImpl_write(serial_testbed: SerialTestbed) -> None:
 
     # THEN
     assert serial_testbed.serial_opener.writer.write.called_with(b"hello")
+
+
+@pytest.fixture
+def pty_path() -> Iterator[tuple[int, str]]:
+    master, slave = os.openpty()
+    try:
+        yield master, os.ttyname(slave)
+    finally:
+        os.close(slave)
+        os.close(master)
+
+
+async def test_maintain_serial_devices_ingest_thread(
+    ovshell: testing.OpenVarioShellStub,
+    serial_testbed: SerialTestbed,
+    pty_path: tuple[int, str],
+) -> None:
+    # GIVEN
+    _, path = pty_path
+    ovshell.settings.set(serial.INGEST_THREAD_SETTING, True)
+    serial_testbed.lookup.stub_set_devices([path])
+    maintainer = serial.maintain_serial_devices(ovshell)
+    async with task_started(maintainer):
+        # WHEN
+        await until(devices_registered(ovshell))
+
+        # THEN
+        devs = ovshell.devices.enumerate()
+        dev = devs[0]
+        assert isinstance(dev, serial.ThreadedSerialDevice)
+        assert dev.path == path
+        assert dev.baudrate == 9600
+
+
+async def test_ThreadedSerialDevice_readlines(pty_path: tuple[int, str]) -> None:
+    # GIVEN
+    master, path = pty_path
+    ingest = serial.IngestThread()
+    ingest.start()
+    dev = serial.ThreadedSerialDevice.open(path, 9600, ingest)
+    devman = device.DeviceManagerImpl()
+
+    with devman.open_nmea() as stream:
+        devman.register(dev)
+
+        # WHEN
+        os.write(master, b"$PGRMZ,2,f,3*19\r\n$PGRMZ,1,f,3*00\r\n\r\n$PGRMZ,")
+        nmea = await asyncio.wait_for(stream.read(), 1)
+        os.write(master, b"3,f,3*18\r\n")
+        nmea2 = await asyncio.wait_for(stream.read(), 1)
+
+    # THEN
+    assert nmea.raw_message == "$PGRMZ,2,f,3*19"
+    assert nmea2.raw_message == "$PGRMZ,3,f,3*18"
+    assert nmea.received is not None
+    stats = devman.stats(dev.id)
+    assert stats is not None
+    assert stats.lines == 3
+    assert stats.invalid == 1
+
+    ingest.stop()
+    assert not dev._port.is_open
+    await until(lambda: devman.get(dev.id) is None)
+
+
+async def test_ThreadedSerialDevice_binary(pty_path: tuple[int, str]) -> None:
+    # GIVEN
+    master, path = pty_path
+    ingest = serial.IngestThread()
+    ingest.start()
+    dev = serial.ThreadedSerialDevice.open(path, 9600, ingest)
+
+    # WHEN
+    os.write(master, b"\xff\xfe\r\n")
+
+    # THEN
+    with pytest.raises(OSError):
+        await asyncio.wait_for(dev.readlines(), 1)
+    assert dev.take_rejected() == (0, 1, 0)
+    assert not dev._port.is_open
+    ingest.stop()
+
+
+async def test_ThreadedSerialDevice_write(pty_path: tuple[int, str]) -> None:
+    # GIVEN
+    master, path = pty_path
+    ingest = serial.IngestThread()
+    ingest.start()
+    dev = serial.ThreadedSerialDevice.open(path, 9600, ingest)
+    os.set_blocking(master, False)
+    received = b""
+
+    def receive() -> bool:
+        nonlocal received
+        try:
+            received += os.read(master, 4096)
+        except BlockingIOError:
+            pass
+        return received.endswith(b"\n")
+
+    # WHEN
+    dev.write(b"$POV,E,1*00\r\n")
+
+    # THEN
+    await until(receive)
+    assert received.replace(b"\r\n", b"\n") == b"$POV,E,1*00\n"
+
+    # Writes to the closed device are dropped
+    await dev.close()
+    dev.write(b"$POV,E,2*00\r\n")
+    ingest.stop()
+
+
+async def test_ThreadedSerialDevice_readline() -> None:
+    # GIVEN
+    dev = serial.ThreadedSerialDevice("/dev/ttyTEST", mock.Mock(), 9600, mock.Mock())
+
+    # WHEN
+    dev.deliver([b"$POV,E,1*00", b"$POV,E,2*00", b"$POV,E,3*00"], 1.0)
+
+    # THEN
+    assert await dev.readline() == b"$POV,E,1*00\r\n"
+    assert await dev.readlines() == [b"$POV,E,2*00", b"$POV,E,3*00"]
+    assert not dev._lines
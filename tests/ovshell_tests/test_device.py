@@ -1,4 +1,5 @@
 import asyncio
+import time
 
 import pytest
 
@@ -33,9 +34,36 @@ class DeviceStub(api.Device):
         self._delay = delay
 
 
+class ChunkedDeviceStub(DeviceStub):
+    async def readlines(self) -> list[bytes]:
+        if not self._stream:
+            raise OSError()
+        await asyncio.sleep(self._delay)
+        lines = list(reversed(self._stream))
+        self._stream = []
+        return lines
+
+
+class SerialDeviceStub(DeviceStub, api.SerialDevice):
+    closed = False
+
+    def __init__(self, path: str, baudrate: int) -> None:
+        super().__init__(path, path)
+        self.path = path
+        self.baudrate = baudrate
+
+    async def readline(self) -> bytes:
+        await asyncio.sleep(10)
+        return b""
+
+    async def close(self) -> None:
+        self.closed = True
+
+
 def test_nmea_checksum() -> None:
     assert nmea_checksum("PGRMZ,+51.1,m,3") == "10"
     assert nmea_checksum("PFLAU,0,0,0,1,0,,0,,,") == "4F"
+    assert nmea_checksum("PTEST,P0") == "0A"
 
 
 def test_format_nmea() -> None:
@@ -50,6 +78,15 @@ def test_is_nmea_valid() -> None:
     assert not is_nmea_valid("$PGRMZ,+51.1,m,3*11")
 
 
+def test_check_nmea() -> None:
+    assert device.check_nmea(b"$PGRMZ,+51.1,m,3*10")
+    assert device.check_nmea(b"$PGRMZ,+51.1,m,3*10\r\n")
+    assert not device.check_nmea(b"PGRMZ,+51.1,m,3*10")
+    assert not device.check_nmea(b"$PGRMZ,+51.1,m,3")
+    assert not device.check_nmea(b"$PGRMZ,+51.1,m,3*11")
+    assert not device.check_nmea(b"$PGRMZ,+51.1,m,3*10garbage")
+
+
 def test_parse_nmea() -> None:
     nmea = parse_nmea("devid", b"$PGRMZ,+51.1,m,3*10\r\n")
     assert nmea.device_id == "devid"
@@ -58,6 +95,91 @@ def test_parse_nmea() -> None:
     assert nmea.fields == ["+51.1", "m", "3"]
 
 
+def test_parse_nmea_lazy() -> None:
+    nmea = parse_nmea("devid", b"$PGRMZ,+51.1,m,3*10\r\n")
+    assert isinstance(nmea, api.NMEA)
+    assert nmea == api.NMEA(
+        "devid", "$PGRMZ,+51.1,m,3*10", "PGRMZ", ["+51.1", "m", "3"]
+    )
+    assert not hasattr(nmea, "__dict__")
+
+    # Datatype strings are shared between messages
+    other = parse_nmea("devid", b"$PGRMZ,+52.1,m,3*13\r\n")
+    assert other.datatype is nmea.datatype
+    assert other != nmea
+
+
+def test_NMEA_compat() -> None:
+    nmea = api.NMEA("devid", "$PGRMZ,+51.1,m,3*10", "PGRMZ", ["+51.1", "m", "3"])
+    assert nmea.device_id == "devid"
+    assert nmea.raw_message == "$PGRMZ,+51.1,m,3*10"
+    assert nmea.datatype == "PGRMZ"
+    assert nmea.fields == ["+51.1", "m", "3"]
+    assert repr(nmea) == (
+        "NMEA(device_id='devid', raw_message='$PGRMZ,+51.1,m,3*10', "
+        "datatype='PGRMZ', fields=['+51.1', 'm', '3'])"
+    )
+
+
+def test_parse_nmea_checksum_leading_zero() -> None:
+    nmea = parse_nmea("devid", b"$PTEST,P0*0A\r\n")
+    assert nmea.datatype == "PTEST"
+    assert nmea.fields == ["P0"]
+
+    nmea = parse_nmea("devid", b"$PTEST,P1*0b\r\n")
+    assert nmea.raw_message == "$PTEST,P1*0b"
+
+
+def test_parse_nmea_no_fields() -> None:
+    nmea = parse_nmea("devid", b"$PTEST*46\n")
+    assert nmea.datatype == "PTEST"
+    assert nmea.fields == []
+    assert len(nmea.fields) == 0
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        b"PGRMZ,+51.1,m,3*10\r\n",
+        b"$PGRMZ,+51.1,m,3\r\n",
+        b"$PGRMZ,+51.1,m,3*11\r\n",
+        b"$PGRMZ,+51.1,m,3*1\r\n",
+        b"$PGRMZ,+51.1,m,3*ZZ\r\n",
+        b"$PGRMZ,+51.1,m,3*10garbage\r\n",
+        b"",
+    ],
+)
+def test_parse_nmea_invalid(message: bytes) -> None:
+    with pytest.raises(device.InvalidNMEA):
+        parse_nmea("devid", message)
+
+
+def test_parse_nmea_binary() -> None:
+    with pytest.raises(UnicodeDecodeError):
+        parse_nmea("devid", b"$PGRMZ,\xff*10\r\n")
+
+
+def test_datatype_cache_invalid(monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell.device._datatypes", {})
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    # WHEN
+    # Noise, read while probing baud rate
+    for n in range(10):
+        line = b"$G%dX,~~,~*00\r\n" % n
+        devman._publish(dev, line)
+        assert not device.check_nmea(line)
+        with pytest.raises(device.InvalidNMEA):
+            parse_nmea("one", line)
+    devman._publish(dev, b"$PGRMZ,+51.1,m,3*10\r\n")
+
+    # THEN
+    # Only valid sentences make it to the datatype cache
+    assert list(device._datatypes) == [b"PGRMZ"]
+
+
 def test_DeviceManagerImpl_open_nmea_empty() -> None:
     # GIVEN
     devman = device.DeviceManagerImpl()
@@ -172,3 +294,644 @@ async def test_DeviceManagerImpl_bad_nmea() -> None:
 
     assert nmea.device_id == "one"
     assert nmea.raw_message == "$PGRMZ,+51.1,m,3*10"
+
+
+async def test_DeviceManagerImpl_open_nmea_datatypes() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream(
+        [
+            b"$PFLAU,0,0,0,1,0,,0,,,*4F",
+            b"$BAD,nmea",
+            b"$PGRMZ,+51.1,m,3*10",
+            b"$PGRMZ,+52.1,m,3*13",
+        ]
+    )
+
+    # WHEN
+    with devman.open_nmea(datatypes=["PGRMZ"]) as pgrmz_stream:
+        with devman.open_nmea(datatypes=["PFLAU", "GPRMC"]) as pflau_stream:
+            devman.register(dev)
+            pgrmz1 = await pgrmz_stream.read()
+            pgrmz2 = await pgrmz_stream.read()
+            pflau = await pflau_stream.read()
+
+    # THEN
+    assert pgrmz1.raw_message == "$PGRMZ,+51.1,m,3*10"
+    assert pgrmz2.raw_message == "$PGRMZ,+52.1,m,3*13"
+    assert pflau.datatype == "PFLAU"
+    assert devman._subscribers == {}
+
+
+async def test_DeviceManagerImpl_open_nmea_devices() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev1 = DeviceStub("one", "One")
+    dev1.stub_set_stream([b"$PGRMZ,+51.1,m,3*10"] * 3)
+    dev2 = DeviceStub("two", "Two")
+    dev2.stub_set_stream([b"$PFLAU,0,0,0,1,0,,0,,,*4F"] * 3)
+
+    # WHEN
+    with devman.open_nmea(devices=["two"]) as nmea_stream:
+        devman.register(dev1)
+        devman.register(dev2)
+        nmea = await nmea_stream.read()
+
+    # THEN
+    assert nmea.device_id == "two"
+
+
+def test_DeviceManagerImpl_publish_not_parsed(monkeypatch) -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    parsed = []
+    monkeypatch.setattr(
+        "ovshell.device.NMEAMessage", lambda *args: parsed.append(args)  # type: ignore
+    )
+
+    # WHEN
+    with devman.open_nmea(datatypes=["GPRMC"]):
+        with devman.open_nmea(datatypes=["PGRMZ"], devices=["two"]):
+            devman._publish(dev, b"$PGRMZ,+51.1,m,3*10\r\n")
+            devman._publish(dev, b"$PFLAU,0,0,0,1,0,,0,,,*4F\r\n")
+
+    # THEN
+    assert parsed == []
+
+
+def test_DeviceManagerImpl_publish_invalid_unsubscribed() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    # WHEN
+    with devman.open_nmea(datatypes=["GPRMC"]):
+        devman._publish(dev, b"$PGRMZ,+51.1,m,3*11\r\n")
+    devman._publish(dev, b"$PGRMZ,+51.1,m,3*11\r\n")
+    devman._publish(dev, b"$PGRMZ,+51.1,m,3*10\r\n")
+
+    # THEN
+    # Checksums are verified, even if nobody subscribed to the sentence
+    stats = devman.stats("one")
+    assert stats is not None
+    assert stats.invalid == 2
+
+
+def _pgrmz(alt: int) -> bytes:
+    return format_nmea(f"PGRMZ,{alt},m,3").encode() + b"\r\n"
+
+
+async def test_DeviceManagerImpl_policy_drop_oldest() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    # WHEN
+    with devman.open_nmea(maxsize=2) as stream:
+        for alt in range(5):
+            devman._publish(dev, _pgrmz(alt))
+        nmeas = [await stream.read(), await stream.read()]
+
+    # THEN
+    assert [n.fields[0] for n in nmeas] == ["3", "4"]
+    assert stream.stats == api.NMEAStreamStats(delivered=2, dropped=3, peak_depth=2)
+
+
+async def test_DeviceManagerImpl_policy_drop_newest() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    # WHEN
+    policy = api.BackpressurePolicy.DROP_NEWEST
+    with devman.open_nmea(maxsize=2, policy=policy) as stream:
+        for alt in range(5):
+            devman._publish(dev, _pgrmz(alt))
+        nmeas = [await stream.read(), await stream.read()]
+
+    # THEN
+    assert [n.fields[0] for n in nmeas] == ["0", "1"]
+    assert stream.stats == api.NMEAStreamStats(delivered=2, dropped=3, peak_depth=2)
+
+
+async def test_DeviceManagerImpl_policy_coalesce() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    # WHEN
+    policy = api.BackpressurePolicy.COALESCE
+    with devman.open_nmea(policy=policy) as stream:
+        devman._publish(dev, _pgrmz(1))
+        devman._publish(dev, b"$PFLAU,0,0,0,1,0,,0,,,*4F\r\n")
+        devman._publish(dev, _pgrmz(2))
+        devman._publish(dev, _pgrmz(3))
+        nmeas = [await stream.read(), await stream.read()]
+
+    # THEN
+    assert [n.datatype for n in nmeas] == ["PGRMZ", "PFLAU"]
+    assert nmeas[0].fields[0] == "3"
+    assert stream.stats == api.NMEAStreamStats(delivered=2, dropped=2, peak_depth=2)
+
+
+async def test_DeviceManagerImpl_policy_block() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(alt).strip() for alt in range(4)])
+
+    # WHEN
+    policy = api.BackpressurePolicy.BLOCK
+    with devman.open_nmea(maxsize=1, policy=policy, timeout=None) as stream:
+        devman.register(dev)
+        await asyncio.sleep(0.01)
+        # Device is waiting for us
+        assert len(dev._stream) == 2
+        nmeas = [await stream.read() for _ in range(4)]
+
+    # THEN
+    assert [n.fields[0] for n in nmeas] == ["0", "1", "2", "3"]
+    assert stream.stats == api.NMEAStreamStats(delivered=4, dropped=0, peak_depth=1)
+
+
+async def test_DeviceManagerImpl_policy_block_timeout() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(alt).strip() for alt in range(3)])
+
+    # WHEN
+    policy = api.BackpressurePolicy.BLOCK
+    with devman.open_nmea(maxsize=1, policy=policy, timeout=0.01) as stream:
+        devman.register(dev)
+        await asyncio.sleep(0.05)
+        nmea = await stream.read()
+
+    # THEN
+    assert nmea.fields[0] == "0"
+    assert stream.stats == api.NMEAStreamStats(delivered=1, dropped=2, peak_depth=1)
+
+
+async def test_DeviceManagerImpl_latest() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev1 = DeviceStub("one", "One")
+    dev2 = DeviceStub("two", "Two")
+
+    # WHEN, THEN
+    assert devman.latest("PGRMZ") is None
+    devman._publish(dev1, _pgrmz(1))
+    devman._publish(dev2, _pgrmz(2))
+    devman._publish(dev1, b"$PFLAU,0,0,0,1,0,,0,,,*4F\r\n")
+
+    latest = devman.latest("PGRMZ")
+    assert latest is not None
+    assert latest.device_id == "two"
+    latest = devman.latest("PGRMZ", "one")
+    assert latest is not None
+    assert latest.fields[0] == "1"
+    assert devman.latest("PGRMZ", "three") is None
+
+    # PFLAU was not requested before, so it is not tracked
+    assert devman.latest("PFLAU") is None
+
+
+async def test_DeviceManagerImpl_latest_device_removed(task_running) -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    devman.latest("PGRMZ")
+    dev.stub_set_stream([b"$PGRMZ,+51.1,m,3*10"])
+
+    # WHEN
+    devman.register(dev)
+    nmea = await devman.wait_for_update("PGRMZ")
+    assert nmea.device_id == "one"
+    await asyncio.sleep(0.01)
+
+    # THEN
+    assert devman.enumerate() == []
+    assert devman.latest("PGRMZ") is None
+    assert devman.latest("PGRMZ", "one") is None
+
+
+async def test_DeviceManagerImpl_wait_for_update() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev1 = DeviceStub("one", "One")
+    dev2 = DeviceStub("two", "Two")
+    waiter = asyncio.create_task(devman.wait_for_update("PGRMZ", "two"))
+    await asyncio.sleep(0)
+
+    # WHEN
+    devman._publish(dev1, _pgrmz(1))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    devman._publish(dev2, _pgrmz(2))
+
+    # THEN
+    nmea = await waiter
+    assert nmea.device_id == "two"
+    assert devman._update_waiters["PGRMZ"] == []
+
+
+async def test_DeviceManagerImpl_wait_for_update_cancel() -> None:
+    devman = device.DeviceManagerImpl()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(devman.wait_for_update("PGRMZ"), 0.01)
+    assert devman._update_waiters["PGRMZ"] == []
+
+
+async def test_NMEAStreamImpl_read_batch() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    with devman.open_nmea() as stream:
+        for alt in range(5):
+            devman._publish(dev, _pgrmz(alt))
+
+        # WHEN
+        batch1 = await stream.read_batch(max_items=3)
+        batch2 = await stream.read_batch(max_items=3)
+
+    # THEN
+    assert [n.fields[0] for n in batch1] == ["0", "1", "2"]
+    assert [n.fields[0] for n in batch2] == ["3", "4"]
+    assert stream.stats.delivered == 5
+
+
+async def test_NMEAStreamImpl_read_batch_latency() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    with devman.open_nmea() as stream:
+        devman._publish(dev, _pgrmz(0))
+
+        # WHEN
+        reader = asyncio.create_task(stream.read_batch(max_items=3, max_latency=10))
+        await asyncio.sleep(0)
+        devman._publish(dev, _pgrmz(1))
+        await asyncio.sleep(0)
+        assert not reader.done()
+        # Batch is full, no need to wait any more
+        devman._publish(dev, _pgrmz(2))
+        batch = await asyncio.wait_for(reader, 1)
+
+        # Latency runs out with incomplete batch
+        devman._publish(dev, _pgrmz(3))
+        batch2 = await stream.read_batch(max_items=3, max_latency=0.01)
+
+    # THEN
+    assert [n.fields[0] for n in batch] == ["0", "1", "2"]
+    assert [n.fields[0] for n in batch2] == ["3"]
+
+
+async def test_NMEAStreamImpl_read_batch_cancelled() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+
+    with devman.open_nmea() as stream:
+        reader = asyncio.create_task(stream.read_batch(max_items=3, max_latency=10))
+        await asyncio.sleep(0)
+        devman._publish(dev, _pgrmz(0))
+        await asyncio.sleep(0)
+
+        # WHEN
+        # Reader gives up while waiting for the batch to fill up
+        reader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await reader
+        devman._publish(dev, _pgrmz(1))
+        batch = await stream.read_batch(max_items=3, max_latency=0.01)
+
+    # THEN
+    # Cancelled read doesn't consume messages
+    assert [n.fields[0] for n in batch] == ["0", "1"]
+    assert stream.stats.delivered == 2
+    assert stream.stats.dropped == 0
+
+
+async def test_NMEAStreamImpl_batches() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(alt).strip() for alt in range(4)])
+
+    # WHEN
+    batches = []
+    with devman.open_nmea() as stream:
+        devman.register(dev)
+        async for batch in stream.batches(max_items=2, max_latency=0.01):
+            batches.append([n.fields[0] for n in batch])
+            if len(batches) == 2:
+                break
+
+    # THEN
+    assert batches == [["0", "1"], ["2", "3"]]
+
+
+async def test_DeviceManagerImpl_chunked_device() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = ChunkedDeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(alt).strip() for alt in range(3)])
+    assert isinstance(dev, api.ChunkedDevice)
+
+    # WHEN
+    with devman.open_nmea() as stream:
+        devman.register(dev)
+        batch = await stream.read_batch(max_latency=0.01)
+
+    # THEN
+    assert [n.fields[0] for n in batch] == ["0", "1", "2"]
+    assert not isinstance(DeviceStub("two", "Two"), api.ChunkedDevice)
+
+
+async def test_DeviceManagerImpl_stats() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = ChunkedDeviceStub("one", "One")
+    dev.stub_set_stream(
+        [_pgrmz(1).strip(), b"$PGRMZ,+51.1,m,3*11", b"garbage", b"\xff\xfe"]
+    )
+    assert devman.stats("one") is None
+
+    # WHEN
+    with devman.open_nmea() as stream:
+        devman.register(dev)
+        await stream.read()
+        await asyncio.sleep(0)
+
+    # THEN
+    # Device is dropped after binary garbage, but stats are kept
+    assert devman.get("one") is None
+    stats = devman.stats("one")
+    assert stats is not None
+    assert stats.lines == 4
+    assert stats.bytes == len(_pgrmz(1).strip()) + 19 + 7 + 2
+    assert stats.invalid == 2
+    assert stats.decode_errors == 1
+    assert stats.last_seen is not None
+
+
+def test_DeviceCounters_rates() -> None:
+    # GIVEN
+    counters = device.DeviceCounters()
+
+    # WHEN
+    # Two lines per second for 10 seconds, last 3 seconds also with GPRMC
+    for sec in range(100, 110):
+        counters.count_lines([b"$PGRMZ", b"$POV"], sec + 0.5)
+        counters.count_datatype("PGRMZ")
+        counters.count_datatype("POV")
+        if sec >= 107:
+            counters.count_lines([b"$GPRMC"], sec + 0.6)
+            counters.count_datatype("GPRMC")
+
+    # THEN
+    # Current second is incomplete and is not counted
+    stats = counters.snapshot(109.9)
+    assert stats.lines == 23
+    assert stats.lines_per_sec == pytest.approx(2.4)
+    assert stats.bytes_per_sec == pytest.approx(12.4)
+    assert stats.datatype_rates == pytest.approx(
+        {"PGRMZ": 1.0, "POV": 1.0, "GPRMC": 0.4}
+    )
+
+    # Rates decay when device goes silent
+    assert counters.snapshot(112.0).lines_per_sec == pytest.approx(1.8)
+    assert counters.snapshot(200.0).lines_per_sec == 0
+    assert counters.snapshot(200.0).datatype_rates == {}
+    assert counters.snapshot(200.0).lines == 23
+
+
+def test_DeviceCounters_startup() -> None:
+    # GIVEN
+    counters = device.DeviceCounters()
+    assert counters.snapshot(100.0).lines_per_sec == 0
+
+    # WHEN
+    counters.count_lines([b"$POV"] * 10, 100.0)
+    counters.count_lines([b"$POV"] * 10, 101.0)
+
+    # THEN
+    # Rate is averaged over seconds device is active
+    assert counters.snapshot(101.5).lines_per_sec == 10
+    assert counters.snapshot(102.0).lines_per_sec == 10
+
+
+async def test_DeviceManagerImpl_open_events() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(1).strip()])
+
+    # WHEN
+    with devman.open_events() as events:
+        devman.register(dev)
+        registered = await events.read()
+        removed = await asyncio.wait_for(events.read(), timeout=1)
+
+    # THEN
+    assert registered == api.DeviceEvent(api.DeviceEventType.REGISTERED, dev)
+    assert removed == api.DeviceEvent(api.DeviceEventType.REMOVED, dev)
+    assert devman._event_streams == set()
+
+
+async def test_DeviceManagerImpl_received_time() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(1).strip()])
+
+    # WHEN
+    with devman.open_nmea() as stream:
+        started = time.monotonic()
+        devman.register(dev)
+        nmea = await stream.read()
+
+    # THEN
+    assert nmea.received is not None
+    assert started <= nmea.received <= time.monotonic()
+
+
+def test_LatencyHistogram() -> None:
+    # GIVEN
+    hist = api.LatencyHistogram()
+
+    # WHEN
+    for _ in range(90):
+        hist.record(0.001)
+    for _ in range(9):
+        hist.record(0.01)
+    hist.record(0.5)
+
+    # THEN
+    assert hist.count == 100
+    assert hist.max == 0.5
+    # Percentiles are approximate, within a quarter of octave
+    assert 0.001 <= hist.percentile(50) < 0.0012
+    assert 0.01 <= hist.percentile(95) < 0.012
+    assert 0.01 <= hist.percentile(99) < 0.012
+    assert hist.percentile(100) == 0.5
+    assert str(hist) == "p50 1.1ms, p95 10.2ms, p99 10.2ms"
+
+
+def test_LatencyHistogram_bounds() -> None:
+    hist = api.LatencyHistogram()
+    assert hist.percentile(99) == 0.0
+    hist.record(0)
+    hist.record(3600)
+    assert hist.percentile(50) == api.LatencyHistogram.MIN_LATENCY
+    assert hist.percentile(100) == 3600
+
+
+async def test_DeviceManagerImpl_trace_latency() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl(trace_latency=True)
+    dev = DeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(1).strip(), _pgrmz(2).strip()])
+
+    # WHEN
+    with devman.open_nmea() as stream, devman.open_nmea(
+        trace_latency=False
+    ) as untraced:
+        devman.register(dev)
+        await stream.read()
+        await stream.read_batch()
+
+    # THEN
+    assert stream.stats.latency is not None
+    assert stream.stats.latency.count == 2
+    assert untraced.stats.latency is None
+
+
+async def test_DeviceManagerImpl_stream_stats() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+
+    # WHEN
+    with devman.open_nmea(["GPRMC", "GPGGA"]), devman.open_nmea(
+        devices=["sim"]
+    ), devman.open_nmea(["PGRMZ"]):
+        names = [st.name for st in devman.stream_stats()]
+
+    # THEN
+    assert names == ["* from sim", "GPGGA,GPRMC", "PGRMZ"]
+    assert devman.stream_stats() == []
+
+
+async def test_DeviceManagerImpl_ingest_budget(monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell.device.INGEST_BUDGET_MESSAGES", 3)
+    monkeypatch.setattr("ovshell.device.INGEST_BUDGET_TIME", 10)
+    devman = device.DeviceManagerImpl()
+    dev = ChunkedDeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(alt).strip() for alt in range(10)])
+
+    with devman.open_nmea() as stream:
+        # WHEN
+        devman.register(dev)
+        # Let device read the chunk
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        # THEN
+        # Device yielded after exhausting its budget
+        assert stream.stats.peak_depth == 3
+        await asyncio.sleep(0)
+        assert stream.stats.peak_depth == 6
+
+        while devman.get("one") is not None:
+            await asyncio.sleep(0)
+
+
+async def test_DeviceManagerImpl_notify_input(monkeypatch) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell.device.INGEST_BUDGET_MESSAGES", 3)
+    monkeypatch.setattr("ovshell.device.INGEST_BUDGET_TIME", 10)
+    devman = device.DeviceManagerImpl()
+    dev = ChunkedDeviceStub("one", "One")
+    dev.stub_set_stream([_pgrmz(alt).strip() for alt in range(10)])
+
+    with devman.open_nmea() as stream:
+        devman.register(dev)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert stream.stats.peak_depth == 3
+
+        # WHEN
+        devman.notify_input()
+
+        # THEN
+        # Device yields right after the next message, for two loop iterations
+        await asyncio.sleep(0)
+        assert stream.stats.peak_depth == 4
+        await asyncio.sleep(0)
+        assert stream.stats.peak_depth == 4
+        await asyncio.sleep(0)
+        assert stream.stats.peak_depth == 7
+
+        while devman.get("one") is not None:
+            await asyncio.sleep(0)
+
+
+async def test_DeviceManagerImpl_pause() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    serdev = SerialDeviceStub("/dev/ttyS1", 38400)
+    simdev = DeviceStub("sim", "Sim")
+    simdev.stub_set_stream([_pgrmz(1)] * 100)
+    simdev.stub_set_delay(0.01)
+    devman.register(serdev)
+    devman.register(simdev)
+    resumed = asyncio.create_task(devman.wait_resumed())
+    await asyncio.sleep(0)
+    assert resumed.done()
+    assert not devman.paused
+
+    # WHEN
+    await devman.pause()
+
+    # THEN
+    # Only serial devices are released
+    assert devman.paused
+    assert serdev.closed
+    assert devman.enumerate() == [simdev]
+    await asyncio.wait_for(devman.wait_paused(), 1)
+
+    resumed = asyncio.create_task(devman.wait_resumed())
+    await asyncio.sleep(0)
+    assert not resumed.done()
+
+    devman.resume()
+    assert await resumed == {"/dev/ttyS1": 38400}
+    assert not devman.paused
+
+    devman._handlers["sim"].cancel()
+    await asyncio.sleep(0)
+
+
+async def test_DeviceManagerImpl_pause_just_registered() -> None:
+    # GIVEN
+    devman = device.DeviceManagerImpl()
+    serdev = SerialDeviceStub("/dev/ttyS1", 38400)
+    devman.register(serdev)
+
+    # WHEN
+    # Device reader is cancelled before it gets to run
+    await devman.pause()
+    devman.resume()
+    reopened = SerialDeviceStub("/dev/ttyS1", 38400)
+    devman.register(reopened)
+
+    # THEN
+    assert serdev.closed
+    assert devman.enumerate() == [reopened]
+    devman._handlers["/dev/ttyS1"].cancel()
+    await asyncio.sleep(0)
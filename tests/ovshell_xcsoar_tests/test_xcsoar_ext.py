@@ -1,6 +1,16 @@
+import asyncio
 import os
 
-from ovshell_xcsoar.ext import XCSoarProfile
+import pytest
+
+from ovshell import testing
+from ovshell_xcsoar.ext import (
+    SERIAL_HANDOFF_SETTING,
+    AppOutputActivity,
+    XCSoarApp,
+    XCSoarProfile,
+    run_app,
+)
 
 SAMPLE_PROFILE = """
 FriendsYellow="26CC5B,2CD854,"
@@ -69,3 +79,94 @@ def test_xcsoarprofile_no_write_without_change(tmp_path) -> None:
 
     # THEN
     assert os.path.getmtime(prf_fname) == 0
+
+
+async def test_xcsoarapp_launch(
+    ovshell: testing.OpenVarioShellStub, monkeypatch, tmp_path
+) -> None:
+    # GIVEN
+    binary = tmp_path / "xcsoar"
+    binary.write_text("#!/bin/sh\necho 'no display' >&2\nexit 1\n")
+    binary.chmod(0o755)
+    monkeypatch.setenv("XCSOAR_BIN", str(binary))
+    app = XCSoarApp(ovshell)
+
+    # WHEN
+    app.launch()
+    while "Devices resumed" not in ovshell.get_stub_log():
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0)
+
+    # THEN
+    # Serial ports are handed over to XCSoar for the time it runs
+    log = ovshell.get_stub_log()
+    assert log.index("Devices paused") < log.index("Devices resumed")
+    assert not ovshell.devices.paused
+    act = ovshell.screen.stub_top_activity()
+    assert isinstance(act, AppOutputActivity)
+    assert act.message == "no display\n"
+
+
+async def test_xcsoarapp_launch_no_handoff(
+    ovshell: testing.OpenVarioShellStub, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setenv("XCSOAR_BIN", "/bin/true")
+    ovshell.settings.set(SERIAL_HANDOFF_SETTING, False)
+    app = XCSoarApp(ovshell)
+
+    # WHEN
+    app.launch()
+    await asyncio.sleep(0)
+    while ovshell.screen.stub_dialog() is not None:
+        await asyncio.sleep(0.01)
+
+    # THEN
+    # XCSoar reads devices some other way, ports are not handed over
+    assert "Devices paused" not in ovshell.get_stub_log()
+
+
+async def test_xcsoarapp_launch_pause_fails(
+    ovshell: testing.OpenVarioShellStub, monkeypatch
+) -> None:
+    # GIVEN
+    monkeypatch.setenv("XCSOAR_BIN", "/bin/true")
+
+    async def pause() -> None:
+        raise OSError("Port is stuck")
+
+    monkeypatch.setattr(ovshell.devices, "pause", pause)
+    app = XCSoarApp(ovshell)
+
+    # WHEN
+    with pytest.raises(OSError):
+        await app._run()
+
+    # THEN
+    # Dialog is gone and devices are resumed
+    assert ovshell.screen.stub_dialog() is None
+    assert "Devices resumed" in ovshell.get_stub_log()
+
+
+async def test_run_app(monkeypatch, tmp_path) -> None:
+    # GIVEN
+    monkeypatch.setattr("ovshell_xcsoar.ext.STDERR_TAIL_LINES", 3)
+    script = "for n in $(seq 1000); do echo line $n >&2; done; sleep 0.1; exit 3"
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    # WHEN
+    task = asyncio.create_task(ticker())
+    returncode, stderr = await run_app(["/bin/sh", "-c", script], dict(os.environ))
+    task.cancel()
+
+    # THEN
+    # Event loop is not blocked while application runs
+    assert ticks > 3
+    assert returncode == 3
+    assert stderr == "line 998\nline 999\nline 1000\n"